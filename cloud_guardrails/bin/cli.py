@@ -4,12 +4,86 @@
 # Licensed under the BSD 3-Clause license.
 # For full license text, see the LICENSE file in the repo root
 # or https://opensource.org/licenses/BSD-3-Clause
+import importlib
 import click
-from cloud_guardrails import command
 from cloud_guardrails.bin.version import __version__
 
+# Each command's module is only imported when that command runs. The short help is repeated here so that
+# 'cloud-guardrails --help' doesn't have to import every command just to list them.
+COMMANDS = {
+    "create-config-file": (
+        "cloud_guardrails.command.create_config_file", "create_config_file",
+        "Create a config file to specify which policies to select or exclude."
+    ),
+    "create-parameters-file": (
+        "cloud_guardrails.command.create_parameters_file", "create_parameters_file",
+        "Create a YAML file containing Policy Parameters and default values."
+    ),
+    "describe-policy": (
+        "cloud_guardrails.command.describe_policy", "describe_policy",
+        "Get metadata about a Policy, given the policy name or ID."
+    ),
+    "generate-terraform": (
+        "cloud_guardrails.command.generate_terraform", "generate_terraform",
+        "Generate Terraform to deploy built-in Azure Policies rapidly."
+    ),
+    "list-policies": (
+        "cloud_guardrails.command.list_policies", "list_policies",
+        "List available built-in Azure Policies."
+    ),
+    "list-services": (
+        "cloud_guardrails.command.list_services", "list_services",
+        "List services supported by Azure Built-in policies"
+    ),
+    "query": (
+        "cloud_guardrails.command.query", "query",
+        "Select built-in Azure Policies with a query over their attributes."
+    ),
+    "search-policies": (
+        "cloud_guardrails.command.search_policies", "search_policies",
+        "Search built-in Azure Policies by keyword."
+    ),
+}
 
-@click.group()
+
+class LazyGroup(click.Group):
+    """A click group that imports a command's module only when the command is invoked"""
+
+    def __init__(self, *args, lazy_commands: dict = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx: click.Context) -> list:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str):
+        if cmd_name in self.commands:
+            return self.commands[cmd_name]
+        if cmd_name not in self.lazy_commands:
+            return None
+        module_name, attribute_name, short_help = self.lazy_commands[cmd_name]
+        command = getattr(importlib.import_module(module_name), attribute_name)
+        self.add_command(command, name=cmd_name)
+        return command
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        # Same layout as click.Group.format_commands, but uses the short help from lazy_commands
+        limit = formatter.width - 6 - max(len(cmd_name) for cmd_name in self.list_commands(ctx))
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            if cmd_name in self.commands:
+                command = self.commands[cmd_name]
+                if command.hidden:
+                    continue
+                rows.append((cmd_name, command.get_short_help_str(limit)))
+            else:
+                rows.append((cmd_name, self.lazy_commands[cmd_name][2]))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 @click.version_option(version=__version__)
 def cloud_guardrails():
     """
@@ -17,14 +91,6 @@ def cloud_guardrails():
     """
 
 
-cloud_guardrails.add_command(command.create_parameters_file.create_parameters_file)
-cloud_guardrails.add_command(command.create_config_file.create_config_file)
-cloud_guardrails.add_command(command.describe_policy.describe_policy)
-cloud_guardrails.add_command(command.generate_terraform.generate_terraform)
-cloud_guardrails.add_command(command.list_policies.list_policies)
-cloud_guardrails.add_command(command.list_services.list_services)
-
-
 def main():
     """
     Generates Azure Policies based on requirements and transforms them into Terraform.
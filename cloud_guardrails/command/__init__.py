@@ -1,6 +0,0 @@
-from cloud_guardrails.command import create_parameters_file
-from cloud_guardrails.command import create_config_file
-from cloud_guardrails.command import describe_policy
-from cloud_guardrails.command import generate_terraform
-from cloud_guardrails.command import list_policies
-from cloud_guardrails.command import list_services
@@ -8,7 +8,6 @@ Supply a Policy's display name or a policy ID and get some metadata about the po
 """
 import logging
 import json
-import ruamel.yaml
 import click
 from cloud_guardrails import set_log_level
 from click_option_group import optgroup, RequiredMutuallyExclusiveOptionGroup
@@ -40,6 +39,7 @@ def describe_policy(display_name: str, policy_id: str, fmt: str, verbosity: bool
     results_json = policy_definition.json()
     results_json.pop("id", None)
     if fmt == "yaml":
+        import ruamel.yaml
         results_str = ruamel.yaml.dump(results_json, Dumper=ruamel.yaml.RoundTripDumper)
         print()
         print(results_str)
@@ -14,12 +14,11 @@ from cloud_guardrails import set_log_level
 from cloud_guardrails.shared import utils, validate
 from cloud_guardrails.shared.config import get_default_config, get_config_from_file
 from cloud_guardrails.terraform.guardrails import TerraformGuardrails
+from cloud_guardrails.iam_definition.policy_query import PolicyQuery
+from cloud_guardrails.shared.exclusion_decisions import print_exclusion_report, write_exclusion_report
 
 logger = logging.getLogger(__name__)
 
-supported_services_argument_values = utils.get_service_names()
-supported_services_argument_values.append("all")
-
 
 @click.command(
     name="generate-terraform",
@@ -29,6 +28,7 @@ supported_services_argument_values.append("all")
 @optgroup.group("Azure Policy selection", help="")
 @optgroup.option("--service", "-s", type=str, default="all", help="Services supported by Azure Policy definitions. Defaults to 'all' for all services.", callback=validate.click_validate_supported_azure_service)
 @optgroup.option("--exclude-services", "exclude_services", type=str, help="Exclude specific services (comma-separated) without using a config file.", callback=validate.click_validate_comma_separated_excluded_services)
+@optgroup.option("--where", "-w", "where", type=str, required=False, help="Only select the policies that match this query, like 'effect = deny and not preview'. See the query command.", callback=validate.click_validate_query)
 @optgroup.option("--enforce", "-e", "enforcement_mode", is_flag=True, default=False, help="Enforce the security guardrails using 'Deny' mode instead of 'Audit' mode.")
 # Config file and Parameters file options
 @optgroup.group("Configuration", help="")
@@ -38,6 +38,8 @@ supported_services_argument_values.append("all")
 @optgroup.group("Output file options", help="")
 @optgroup.option("--output", "-o", "output_directory", type=click.Path(exists=False, file_okay=False, dir_okay=True), default=os.getcwd(), help="Specify the *directory* to save the Terraform output. Defaults to current directory.")
 @optgroup.option("--no-summary", "-n", is_flag=True, help="Do not generate markdown or CSV summary files associated with the Terraform output")
+@optgroup.option("--explain", is_flag=True, default=False, help="Explain why policies were left out. Add -v to list every one of them.")
+@optgroup.option("--explain-file", "explain_file", type=click.Path(exists=False), required=False, help="Write why each policy was left out to this JSON file")
 # Parameter options - Select policies with no parameters, optional parameters, or required parameters.
 @optgroup.group("Parameter Options", cls=RequiredMutuallyExclusiveOptionGroup, help="")
 @optgroup.option("--no-params", is_flag=True, default=False, help="Only generate policies that do NOT require parameters")
@@ -51,9 +53,12 @@ supported_services_argument_values.append("all")
 def generate_terraform(
     service: str,
     exclude_services: list,
+    where: PolicyQuery,
     config_file: str,
     parameters_config_file: str,
     no_summary: bool,
+    explain: bool,
+    explain_file: str,
     output_directory: str,
     no_params: bool,
     params_optional: bool,
@@ -96,21 +101,38 @@ def generate_terraform(
         params_required=params_required,
         category=category,
         enforcement_mode=enforcement_mode,
-        verbosity=verbosity
+        verbosity=verbosity,
+        where=where
     )
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
     output_file = os.path.join(output_directory, terraform.file_name)
-    terraform.create_terraform_file(output_file=output_file)
-    # if not result:
-    #     raise Exception("The configuration you've provided does not match any Azure Policies. Consider opening up your configuration and try again.")
-    provider_file = os.path.join(output_directory, "provider.tf")
-    terraform.create_terraform_provider_file(output_file=provider_file)
+    # The Markdown and CSV summaries don't depend on the Terraform, so write them while the Terraform is rendered
+    summary_files = None
+    if not no_summary and terraform.policy_id_pairs():
+        summary_files = terraform.create_summary_files(directory=output_directory, background=True)
+    try:
+        terraform.create_terraform_file(output_file=output_file)
+        # if not result:
+        #     raise Exception("The configuration you've provided does not match any Azure Policies. Consider opening up your configuration and try again.")
+        provider_file = os.path.join(output_directory, "provider.tf")
+        terraform.create_terraform_provider_file(output_file=provider_file)
+    except Exception:
+        # Skip the summaries if they haven't started yet. Otherwise wait for them, so their errors aren't lost.
+        if summary_files and not summary_files.cancel():
+            summary_files.result()
+        raise
+
+    # Wait for the Markdown and CSV summary files before reporting success
+    if summary_files:
+        summary_files.result()
 
     # Print success message
     terraform.print_success_message(output_file=output_file, output_directory=output_directory, enforcement_mode=enforcement_mode)
 
-    # Markdown and CSV Summary files
-    if not no_summary:
-        terraform.create_markdown_summary_file(directory=output_directory)
-        terraform.create_csv_summary_file(directory=output_directory)
+    if explain or explain_file:
+        exclusion_report = terraform.azure_policies.exclusion_report()
+        if explain:
+            print_exclusion_report(exclusion_report, verbosity=verbosity)
+        if explain_file:
+            write_exclusion_report(exclusion_report, explain_file)
@@ -7,12 +7,12 @@
 List available built-in Azure Policies
 """
 import logging
-import yaml
 import click
 from click_option_group import optgroup, RequiredMutuallyExclusiveOptionGroup
 from cloud_guardrails import set_log_level
 from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
 from cloud_guardrails.shared import utils, validate
+from cloud_guardrails.shared.exclusion_decisions import print_exclusion_report, write_exclusion_report
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +31,8 @@ logger = logging.getLogger(__name__)
 # Other options=
 @optgroup.group("Other Options", help="")
 @optgroup.option("--format", "-f", "fmt", type=click.Choice(["stdout", "yaml"]), required=False, default="stdout", help="Output format")
+@optgroup.option("--explain", is_flag=True, default=False, help="Explain why policies were left out. Add -v to list every one of them.")
+@optgroup.option("--explain-file", "explain_file", type=click.Path(exists=False), required=False, help="Write why each policy was left out to this JSON file")
 @click.option("--verbose", "-v", "verbosity", count=True,)
 def list_policies(
     service: str,
@@ -40,6 +42,8 @@ def list_policies(
     params_optional: bool,
     params_required: bool,
     fmt: str,
+    explain: bool,
+    explain_file: str,
     verbosity: int,
 ):
     """
@@ -47,16 +51,20 @@ def list_policies(
     """
 
     set_log_level(verbosity)
-    service_names = utils.get_service_names()
-    service_names.append("all")
-    if service not in service_names:
+    if service != "all" and not utils.is_supported_service(service):
+        service_names = list(utils.get_service_names()) + ["all"]
         raise Exception(
             f"Please provide a valid service name. Valid service names are {service_names}"
         )
     if verbosity >= 1:
         utils.print_grey("Getting policy names according to service\n")
+    if service == "all":
+        azure_policies = AzurePolicies()
+    else:
+        azure_policies = AzurePolicies(service_names=[service])
     if fmt == "yaml":
         print_policies_in_yaml(
+            azure_policies=azure_policies,
             service=service,
             audit_only=audit_only,
             all_policies=all_policies,
@@ -67,6 +75,7 @@ def list_policies(
         )
     else:
         print_policies_in_stdout(
+            azure_policies=azure_policies,
             service=service,
             audit_only=audit_only,
             all_policies=all_policies,
@@ -75,6 +84,12 @@ def list_policies(
             params_required=params_required,
             verbosity=verbosity,
         )
+    if explain or explain_file:
+        exclusion_report = azure_policies.exclusion_report()
+        if explain:
+            print_exclusion_report(exclusion_report, verbosity=verbosity)
+        if explain_file:
+            write_exclusion_report(exclusion_report, explain_file)
 
 
 def get_display_names_sorted_by_service(
@@ -84,15 +99,20 @@ def get_display_names_sorted_by_service(
         no_params: bool,
         params_optional: bool,
         params_required: bool,
+        azure_policies: AzurePolicies = None,
 ) -> dict:
     if service == "all":
-        azure_policies = AzurePolicies()
+        if azure_policies is None:
+            azure_policies = AzurePolicies()
+        service_names = None
     else:
-        azure_policies = AzurePolicies(service_names=[service])
+        if azure_policies is None:
+            azure_policies = AzurePolicies(service_names=[service])
+        service_names = [service]
     if all_policies:
-        display_names = azure_policies.get_all_display_names_sorted_by_service(no_params=True, params_optional=True, params_required=True, audit_only=audit_only)
+        display_names = azure_policies.get_all_display_names_sorted_by_service(no_params=True, params_optional=True, params_required=True, audit_only=audit_only, service_names=service_names)
     else:
-        display_names = azure_policies.get_all_display_names_sorted_by_service(no_params=no_params, params_optional=params_optional, params_required=params_required, audit_only=audit_only)
+        display_names = azure_policies.get_all_display_names_sorted_by_service(no_params=no_params, params_optional=params_optional, params_required=params_required, audit_only=audit_only, service_names=service_names)
     if service != "all":
         if display_names.get(service, None):
             trimmed_display_names = {service: display_names[service].copy()}
@@ -110,8 +130,10 @@ def print_policies_in_yaml(
         params_optional: bool,
         params_required: bool,
         verbosity: int,
+        azure_policies: AzurePolicies = None,
 ):
     display_names = get_display_names_sorted_by_service(
+        azure_policies=azure_policies,
         service=service,
         audit_only=audit_only,
         all_policies=all_policies,
@@ -119,6 +141,7 @@ def print_policies_in_yaml(
         params_optional=params_optional,
         params_required=params_required,
     )
+    import yaml
     result = yaml.dump(display_names)
     total_policies = 0
     for service_name in display_names.keys():
@@ -136,9 +159,11 @@ def print_policies_in_stdout(
         params_optional: bool,
         params_required: bool,
         verbosity: int,
+        azure_policies: AzurePolicies = None,
 ):
 
     display_names = get_display_names_sorted_by_service(
+        azure_policies=azure_policies,
         service=service,
         audit_only=audit_only,
         all_policies=all_policies,
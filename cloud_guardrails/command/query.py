@@ -0,0 +1,80 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+Select built-in Azure Policies with a query over their attributes
+"""
+import json
+import logging
+import click
+from cloud_guardrails import set_log_level
+from cloud_guardrails.shared import utils, validate
+from cloud_guardrails.shared.config import get_default_config, get_config_from_file
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.iam_definition.policy_query import PolicyQuery
+from cloud_guardrails.shared.exclusion_decisions import print_exclusion_report, write_exclusion_report
+
+logger = logging.getLogger(__name__)
+
+
+@click.command(name="query", short_help="Select built-in Azure Policies with a query over their attributes.")
+@click.argument("query", type=str, callback=validate.click_validate_query)
+@click.option("--config", "-c", "config_file", type=click.Path(exists=False), required=False, help="The config file, generated by the create-config-file command.")
+@click.option("--format", "-f", "fmt", type=click.Choice(["stdout", "yaml", "json"]), required=False, default="stdout", help="Output format")
+@click.option("--show-plan", is_flag=True, default=False, help="Print how the query was compiled before the results")
+@click.option("--explain", is_flag=True, default=False, help="Explain why matching policies were left out. Add -v to list every one of them.")
+@click.option("--explain-file", "explain_file", type=click.Path(exists=False), required=False, help="Write why each matching policy was left out to this JSON file")
+@click.option("--verbose", "-v", "verbosity", count=True)
+def query(
+    query: PolicyQuery,
+    config_file: str,
+    fmt: str,
+    show_plan: bool,
+    explain: bool,
+    explain_file: str,
+    verbosity: int,
+):
+    """
+    Select built-in Azure Policies with a query over their attributes, like:
+
+    \b
+        cloud-guardrails query "service = 'Key Vault' and effect = deny"
+        cloud-guardrails query "category ~ kubernetes and version >= 2 and not preview"
+        cloud-guardrails query "parameter = effect and (mode = Indexed or name ~ 'private link')"
+
+    \b
+    Fields: service, effect, parameter, mode, category, version, name
+    Operators: =, !=, ~ (contains), in (a, b), and <, <=, >, >= for the version
+    Flags: no_params, params_optional, params_required, audit_only, preview, deprecated, modifies_resources,
+    deploy_prefixed
+
+    Combine them with and, or, not and parentheses. The policies excluded by the config are left out.
+    """
+    set_log_level(verbosity)
+    if config_file:
+        config = get_config_from_file(config_file=config_file)
+    else:
+        config = get_default_config()
+    if show_plan:
+        utils.print_grey(f"Plan: {query}")
+    azure_policies = AzurePolicies(config=config)
+    display_names = azure_policies.get_display_names_by_query(query)
+    if fmt == "json":
+        print(json.dumps(display_names, indent=4))
+    elif fmt == "yaml":
+        import yaml
+        print(yaml.dump(display_names))
+    else:
+        for service_name, service_display_names in display_names.items():
+            for display_name in service_display_names:
+                print(f"{service_name}: {display_name}")
+    if verbosity >= 1:
+        print(f"total policies: {sum(len(names) for names in display_names.values())}")
+    if explain or explain_file:
+        exclusion_report = azure_policies.exclusion_report()
+        if explain:
+            print_exclusion_report(exclusion_report, verbosity=verbosity)
+        if explain_file:
+            write_exclusion_report(exclusion_report, explain_file)
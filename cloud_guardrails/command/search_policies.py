@@ -0,0 +1,91 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+Search built-in Azure Policies by keyword
+"""
+import json
+import logging
+import click
+from click_option_group import optgroup
+from cloud_guardrails import set_log_level
+from cloud_guardrails.shared import utils, validate
+from cloud_guardrails.shared.config import get_default_config, get_config_from_file
+from cloud_guardrails.iam_definition.catalog_database import get_catalog_database
+
+logger = logging.getLogger(__name__)
+
+
+@click.command(name="search-policies", short_help="Search built-in Azure Policies by keyword.")
+@click.argument("query", type=str)
+@click.option("--service", "-s", type=str, required=False, default="all", help="Only search the policies of this service", callback=validate.click_validate_supported_azure_service)
+# Effects
+@optgroup.group("Effects", help="")
+@optgroup.option("--audit-only", "-a", is_flag=True, required=False, default=False, help="Policies with 'Audit' or 'AuditIfNotExists' effect only")
+@optgroup.option("--effect", "-e", type=str, required=False, help="Policies that allow this effect, like 'deny'")
+# Parameter Options
+@optgroup.group("Parameter Options", help="Without any of these, all policies are searched")
+@optgroup.option("--no-params", is_flag=True, default=False, help="Policies that do NOT require parameters")
+@optgroup.option("--params-optional", is_flag=True, default=False, help="Policies where parameters are OPTIONAL")
+@optgroup.option("--params-required", is_flag=True, default=False, help="Policies where parameters are REQUIRED")
+@optgroup.option("--parameter", "-p", type=str, required=False, help="Policies that take this parameter, like 'effect'")
+# Other options
+@optgroup.group("Other Options", help="")
+@optgroup.option("--config", "-c", "config_file", type=click.Path(exists=False), required=False, help="The config file, generated by the create-config-file command.")
+@optgroup.option("--include-skipped", is_flag=True, default=False, help="Also search the deprecated policies and the ones that modify or deploy resources, which the other commands skip")
+@optgroup.option("--limit", "-l", type=click.IntRange(min=1), default=20, show_default=True, help="Maximum number of results")
+@optgroup.option("--format", "-f", "fmt", type=click.Choice(["stdout", "json"]), required=False, default="stdout", help="Output format")
+@click.option("--verbose", "-v", "verbosity", count=True)
+def search_policies(
+    query: str,
+    service: str,
+    audit_only: bool,
+    effect: str,
+    no_params: bool,
+    params_optional: bool,
+    params_required: bool,
+    parameter: str,
+    config_file: str,
+    include_skipped: bool,
+    limit: int,
+    fmt: str,
+    verbosity: int,
+):
+    """
+    Search built-in Azure Policies by keyword, best match first.
+
+    Every word in QUERY has to appear in the display name or description of the policy. Words are matched by their
+    stem, so 'encrypt' also finds 'encryption'. The policies excluded by the config are left out.
+    """
+    set_log_level(verbosity)
+    if config_file:
+        config = get_config_from_file(config_file=config_file)
+    else:
+        config = get_default_config()
+    # Search all policies unless the search is narrowed down to some parameter requirements
+    if not (no_params or params_optional or params_required):
+        no_params = params_optional = params_required = True
+    results = get_catalog_database().search(
+        query,
+        service_names=None if service == "all" else [service],
+        no_params=no_params,
+        params_optional=params_optional,
+        params_required=params_required,
+        audit_only=audit_only,
+        effect=effect,
+        parameter=parameter,
+        limit=limit,
+        include_skipped=include_skipped,
+        config=config,
+    )
+    if fmt == "json":
+        print(json.dumps(results, indent=4))
+        return
+    for result in results:
+        print(f"{result.get('service_name')}: {result.get('display_name')}")
+        if verbosity >= 1:
+            utils.print_grey(f"\t{result.get('short_id')}")
+    if verbosity >= 1:
+        print(f"total policies: {len(results)}")
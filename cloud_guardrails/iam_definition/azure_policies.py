@@ -7,85 +7,133 @@
 Single data source for the Policy Definition. It combines the azure-policy GitHub module into a single JSON file
 """
 import os
-import json
-from tabulate import tabulate
 from operator import itemgetter
 import csv
+import threading
 from collections import OrderedDict
 import logging
 from cloud_guardrails.shared import utils
-from cloud_guardrails.shared.config import DEFAULT_CONFIG, Config
+from cloud_guardrails.shared.config import Config, get_shared_default_config
 from cloud_guardrails.iam_definition.policy_definition import PolicyDefinition
+from cloud_guardrails.iam_definition.policy_catalog import PolicyCatalog, get_policy_catalog
+from cloud_guardrails.iam_definition.compliance_index import ComplianceIndex, get_compliance_index
+from cloud_guardrails.iam_definition.policy_table import PolicyTable, mask_of
+from cloud_guardrails.iam_definition.policy_query import PolicyQuery
+from cloud_guardrails.shared.exclusion_decisions import ExclusionDecisions, DEPRECATED, MODIFY, DEPLOY, \
+    REASON_DESCRIPTIONS
 
 logger = logging.getLogger(__name__)
 
-default_service_names = utils.get_service_names()
-default_service_names.sort()
+# Enough to hold every built-in policy definition, so each one is only built once per run
+DEFAULT_POLICY_DEFINITION_CACHE_SIZE = 4096
 
-iam_definition_path = os.path.join(utils.DATA_FILE_DIRECTORY, "iam-definition.json")
-with open(iam_definition_path, "r") as file:
-    iam_definition = json.load(file)
 
-
-def skip_display_names(policy_definition: PolicyDefinition, config: Config = DEFAULT_CONFIG) -> bool:
+def skip_display_names(policy_definition: PolicyDefinition, config: Config = None) -> bool:
+    if config is None:
+        config = get_shared_default_config()
     # Quality control
     # First, if the display name starts with [Deprecated], skip it
     if policy_definition.display_name.startswith("[Deprecated]: "):
-        logger.debug(
-            "Skipping Policy (Deprecated). Policy name: %s"
-            % policy_definition.display_name
-        )
+        logger.debug("Skipping Policy (Deprecated). Policy name: %s", policy_definition.display_name)
         return True
     # If the policy is deprecated, skip it
     elif policy_definition.is_deprecated:
-        logger.debug(
-            "Skipping Policy (Deprecated). Policy name: %s"
-            % policy_definition.display_name
-        )
+        logger.debug("Skipping Policy (Deprecated). Policy name: %s", policy_definition.display_name)
         return True
     elif policy_definition.modifies_resources:
-        logger.info(f"Skipping Policy (Modify). Policy name: {policy_definition.display_name} with effects: {policy_definition.allowed_effects}")
+        logger.info(
+            "Skipping Policy (Modify). Policy name: %s with effects: %s",
+            policy_definition.display_name, policy_definition.allowed_effects
+        )
         return True
     # Some Policies with Modify capabilities don't have an Effect - only way to detect them is to see if the name starts with 'Deploy'
     elif policy_definition.display_name.startswith("Deploy "):
-        logger.info(f"Skipping Policy (Deploy). Policy name: {policy_definition.display_name} with effects: {policy_definition.allowed_effects}")
+        logger.info(
+            "Skipping Policy (Deploy). Policy name: %s with effects: %s",
+            policy_definition.display_name, policy_definition.allowed_effects
+        )
         return True
     # If we have specified it in the Config config, skip it
     elif config.is_excluded(
             service_name=policy_definition.service_name, display_name=policy_definition.display_name
     ):
-        logger.info(
-            "Skipping Policy (Excluded by user). Policy name: %s"
-            % policy_definition.display_name
-        )
+        logger.info("Skipping Policy (Excluded by user). Policy name: %s", policy_definition.display_name)
         return True
     else:
         # print(f"Allowing policy with effects {policy_definition.allowed_effects} and name {policy_definition.display_name}")
         return False
 
 
+def _log_level(reason: str) -> int:
+    # Deprecated policies are expected, so they are only logged at debug level
+    if reason == DEPRECATED:
+        return logging.DEBUG
+    return logging.INFO
+
+
 class AzurePolicies:
     def __init__(
             self,
-            service_names: list = default_service_names,
-            config: Config = DEFAULT_CONFIG,
+            service_names: list = None,
+            config: Config = None,
+            catalog: PolicyCatalog = None,
+            cache_size: int = DEFAULT_POLICY_DEFINITION_CACHE_SIZE,
+            compliance_index: ComplianceIndex = None,
     ):
+        # The defaults are built here rather than as default arguments, so nothing is done at import time
+        if config is None:
+            config = get_shared_default_config()
+        if service_names is None:
+            service_names = utils.get_service_names()
         self.config = config
+        # The catalog is only read from disk the first time a policy is looked up
+        if catalog:
+            self.catalog = catalog
+        else:
+            self.catalog = get_policy_catalog()
+        # Same for the compliance benchmark data, which is only needed for the summaries
+        if compliance_index:
+            self.compliance_index = compliance_index
+        else:
+            self.compliance_index = get_compliance_index()
         self.service_names = self.set_service_names(service_names=service_names)
-        self.service_definitions = iam_definition["service_definitions"]
-        self.policy_definitions = iam_definition["policy_definitions"]
-
-    def set_service_names(self, service_names: list):
-        if service_names == ["all"]:
+        # Least recently used cache of PolicyDefinition objects, keyed by short ID. Set cache_size to 0 to disable it.
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._policy_definition_cache = OrderedDict()
+        # The summaries can be built on a separate thread while the Terraform is rendered
+        self._policy_definition_cache_lock = threading.Lock()
+        # The rows of the policy table that the config excludes, and the rows it has been checked against so far
+        self._config_excluded_rows = 0
+        self._config_checked_rows = 0
+        self._config_exclusions_lock = threading.Lock()
+        # Allocated the first time a policy is excluded. The summaries and the Terraform can exclude policies from
+        # different threads, so the allocation takes a lock. It is separate from _config_exclusions_lock, which is
+        # held while decisions are recorded.
+        self._exclusion_decisions = None
+        self._exclusion_decisions_lock = threading.Lock()
+
+    @property
+    def service_definitions(self) -> dict:
+        return self.catalog.service_definitions
+
+    @property
+    def policy_definitions(self) -> dict:
+        return self.catalog.policy_definitions
+
+    @property
+    def policy_table(self) -> PolicyTable:
+        return self.catalog.policy_table
+
+    def set_service_names(self, service_names: list) -> list:
+        if list(service_names) == ["all"]:
             service_names = utils.get_service_names()
-            service_names.sort()
-        service_names_to_remove = []
-        for service_name in service_names:
-            if self.config.is_service_excluded(service_name=service_name):
-                service_names_to_remove.append(service_name)
-        for service_name in service_names_to_remove:
-            service_names.remove(service_name)
-        return service_names
+        # Build a new list, so neither the caller's list nor the shared service names are changed
+        return [
+            service_name for service_name in service_names
+            if not self.config.is_service_excluded(service_name=service_name)
+        ]
 
     def policy_ids(self, service_name: str = None) -> list:
         results = []
@@ -101,30 +149,51 @@ class AzurePolicies:
         """Looks up a policy property given a policy ID and optionally a service name"""
         result = None
         try:
+            if policy_property == "policy_content":
+                return self.catalog.policy_content(policy_id)
             result = self.policy_definitions.get(policy_id).get(policy_property)
         except KeyError as error:
             logger.warning(error)
         return result
 
     def get_policy_definition(self, policy_id: str) -> PolicyDefinition:
+        with self._policy_definition_cache_lock:
+            policy_definition = self._policy_definition_cache.get(policy_id)
+            if policy_definition:
+                self.cache_hits += 1
+                self._policy_definition_cache.move_to_end(policy_id)
+                return policy_definition
+            self.cache_misses += 1
         service_name = self.policy_definitions.get(policy_id).get("service_name")
-        policy_content = self.policy_definitions.get(policy_id).get("policy_content")
+        policy_content = self.catalog.policy_content(policy_id)
         file_name = self.policy_definitions.get(policy_id).get("file_name")
         policy_definition = PolicyDefinition(policy_content=policy_content, service_name=service_name,
                                              file_name=file_name)
+        if self.cache_size > 0:
+            with self._policy_definition_cache_lock:
+                self._policy_definition_cache[policy_id] = policy_definition
+                if len(self._policy_definition_cache) > self.cache_size:
+                    self._policy_definition_cache.popitem(last=False)
         return policy_definition
 
+    def cache_info(self) -> dict:
+        """Hit and miss statistics for the PolicyDefinition cache"""
+        return dict(
+            hits=self.cache_hits,
+            misses=self.cache_misses,
+            size=len(self._policy_definition_cache),
+            max_size=self.cache_size,
+        )
+
     def get_policy_definition_by_display_name(self, display_name: str) -> PolicyDefinition:
         policy_definition = None
-        for policy_id, policy_details in self.policy_definitions.items():
-            if policy_details.get("display_name") == display_name:
-                policy_definition = self.get_policy_definition(policy_id=policy_id)
-                break
+        policy_id = self.catalog.get_policy_id_by_display_name(display_name=display_name)
+        if policy_id:
+            policy_definition = self.get_policy_definition(policy_id=policy_id)
         return policy_definition
 
     def get_policy_id_by_display_name(self, display_name: str) -> str:
-        policy_definition = self.get_policy_definition_by_display_name(display_name=display_name)
-        return policy_definition.short_id
+        return self.catalog.get_policy_id_by_display_name(display_name=display_name)
 
     def get_parameters_by_policy_id(self, policy_id: str, include_effect: bool = False) -> dict:
         policy_definition = self.get_policy_definition(policy_id=policy_id)
@@ -188,43 +257,39 @@ class AzurePolicies:
         return parameters
 
     def is_policy_id_excluded(self, policy_id: str) -> bool:
-        policy_definition = self.get_policy_definition(policy_id=policy_id)
+        return self.policy_exclusion_reason(policy_id=policy_id) is not None
+
+    def policy_exclusion_reason(self, policy_id: str) -> str:
+        """
+        Why a policy is excluded, as a reason code from exclusion_decisions, or None if it isn't. The decision is
+        recorded for the exclusion report.
+        """
+        # Only the precomputed summary fields are needed here, so the policy_content is never touched
+        policy_details = self.policy_definitions.get(policy_id)
+        display_name = policy_details.get("display_name")
+        service_name = policy_details.get("service_name")
         # Quality control
-        # First, if the display name starts with [Deprecated], skip it
-        if policy_definition.display_name.startswith("[Deprecated]: "):
-            logger.debug(
-                "Skipping Policy (Deprecated). Policy name: %s"
-                % policy_definition.display_name
-            )
-            return True
-        # If the policy is deprecated, skip it
-        elif policy_definition.is_deprecated:
-            logger.debug(
-                "Skipping Policy (Deprecated). Policy name: %s"
-                % policy_definition.display_name
-            )
-            return True
-        elif policy_definition.modifies_resources:
-            logger.info(
-                f"Skipping Policy (Modify). Policy name: {policy_definition.display_name} with effects: {policy_definition.allowed_effects}")
-            return True
+        # First, if the display name starts with [Deprecated], or the policy is deprecated, skip it
+        if display_name.startswith("[Deprecated]: ") or policy_details.get("is_deprecated"):
+            reason = DEPRECATED
+        elif policy_details.get("modifies_resources"):
+            reason = MODIFY
         # Some Policies with Modify capabilities don't have an Effect - only way to detect them is to see if the name starts with 'Deploy'
-        elif policy_definition.display_name.startswith("Deploy "):
-            logger.info(
-                f"Skipping Policy (Deploy). Policy name: {policy_definition.display_name} with effects: {policy_definition.allowed_effects}")
-            return True
+        elif policy_details.get("deploy_prefixed"):
+            reason = DEPLOY
         # If we have specified it in the Config config, skip it
-        elif self.config.is_excluded(
-                service_name=policy_definition.service_name, display_name=policy_definition.display_name
-        ):
-            logger.info(
-                "Skipping Policy (Excluded by user). Policy name: %s"
-                % policy_definition.display_name
-            )
-            return True
         else:
-            # print(f"Allowing policy with effects {policy_definition.allowed_effects} and name {policy_definition.display_name}")
-            return False
+            reason = self.config.exclusion_reason(service_name=service_name, display_name=display_name)
+        if reason:
+            # The arguments are only formatted if the message is logged
+            logger.log(
+                _log_level(reason), "Skipping Policy (%s). Policy name: %s with effects: %s",
+                REASON_DESCRIPTIONS[reason], display_name, policy_details.get("allowed_effects")
+            )
+            row = self.policy_table.row(service_name=service_name, short_id=policy_id)
+            if row is not None:
+                self.exclusion_decisions.record(row, reason)
+        return reason
 
     def display_names(self, service_name: str = None) -> list:
         results = []
@@ -241,198 +306,255 @@ class AzurePolicies:
         return results
 
     def get_all_display_names_sorted_by_service(self, no_params: bool = True, params_optional: bool = True,
-                                                params_required: bool = True, audit_only: bool = False) -> dict:
+                                                params_required: bool = True, audit_only: bool = False,
+                                                service_names: list = None) -> dict:
+        """:param service_names: Only list these services. Defaults to every service in the catalog."""
+        table = self.policy_table
+        if service_names is None:
+            selected = table.all
+        else:
+            selected = table.services(service_names)
+        selected &= table.parameter_requirements(
+            no_params=no_params, params_optional=params_optional, params_required=params_required
+        )
+        if audit_only:
+            selected &= table.column("audit_only")
+        selected &= ~self._excluded_rows(selected)
         results = {}
-        for service_name, service_policies in self.service_definitions.items():
-            service_results = []
-            for policy_id, policy_details in service_policies.items():
-                if not self.is_policy_id_excluded(policy_id=policy_id):
-                    if no_params:
-                        if policy_details.get("no_params"):
-                            service_results.append(policy_details.get("display_name"))
-                    if params_optional:
-                        if policy_details.get("params_optional"):
-                            service_results.append(policy_details.get("display_name"))
-                    if params_required:
-                        if policy_details.get("params_required"):
-                            service_results.append(policy_details.get("display_name"))
-                    # If audit_only is flagged, create a new list to hold the audit-only ones, then save it as the new service results
-                    if audit_only:
-                        filtered_service_results = []
-                        for service_result in service_results:
-                            if policy_details.get("audit_only"):
-                                filtered_service_results.append(service_result)
-                        service_results = filtered_service_results.copy()
-                    # If audit_only is not used, don't worry about it
-                    service_results.sort()
-                    service_results = list(dict.fromkeys(service_results))  # remove duplicates
-                    if service_results:
-                        results[service_name] = service_results
+        for row in table.rows(selected):
+            results.setdefault(table.service_name(row), []).append(table.display_names[row])
+        for service_name, service_results in results.items():
+            service_results.sort()
+            results[service_name] = list(dict.fromkeys(service_results))  # remove duplicates
+        return results
+
+    def get_display_names_by_query(self, query: PolicyQuery, service_names: list = None) -> dict:
+        """
+        The display names of the policies that match a query and are not excluded, sorted by service.
+
+        :param service_names: Only list these services. Defaults to every service in the catalog.
+        """
+        table = self.policy_table
+        selected = query.mask(table)
+        if service_names is not None:
+            selected &= table.services(service_names)
+        selected &= ~self._excluded_rows(selected)
+        results = {}
+        for row in table.rows(selected):
+            results.setdefault(table.service_name(row), []).append(table.display_names[row])
+        for service_name, service_results in results.items():
+            results[service_name] = sorted(set(service_results))
         return results
 
+    def _excluded_rows(self, rows: int) -> int:
+        """
+        The rows of the policy table that are excluded, out of the given rows. Each row is only checked once per
+        AzurePolicies object, and the reason it was excluded is recorded for the exclusion report.
+        """
+        table = self.policy_table
+        with self._config_exclusions_lock:
+            unchecked = rows & ~self._config_checked_rows
+            if unchecked:
+                self._record_skipped_rows(unchecked & table.skipped)
+                excluded = []
+                for row in table.rows(unchecked & ~table.skipped):
+                    reason = self.config.exclusion_reason(
+                        service_name=table.service_name(row), display_name=table.display_names[row]
+                    )
+                    if reason:
+                        self.exclusion_decisions.record(row, reason)
+                        excluded.append(row)
+                        logger.info(
+                            "Skipping Policy (%s). Policy name: %s", REASON_DESCRIPTIONS[reason], table.display_names[row]
+                        )
+                self._config_excluded_rows |= mask_of(excluded)
+                self._config_checked_rows |= unchecked
+            excluded_rows = rows & (table.skipped | self._config_excluded_rows)
+        return excluded_rows
+
+    def _record_skipped_rows(self, rows: int):
+        """Record why the deprecated, Modify and Deploy policies among the rows are skipped, in that order"""
+        table = self.policy_table
+        deprecated = rows & table.column("is_deprecated")
+        for row in table.rows(rows & ~deprecated):
+            if table.display_names[row].startswith("[Deprecated]: "):
+                deprecated |= 1 << row
+        modify = rows & ~deprecated & table.column("modifies_resources")
+        deploy = rows & ~deprecated & ~modify
+        for reason, reason_rows in ((DEPRECATED, deprecated), (MODIFY, modify), (DEPLOY, deploy)):
+            for row in table.rows(reason_rows):
+                self.exclusion_decisions.record(row, reason)
+                logger.log(
+                    _log_level(reason), "Skipping Policy (%s). Policy name: %s",
+                    REASON_DESCRIPTIONS[reason], table.display_names[row]
+                )
+
+    @property
+    def exclusion_decisions(self) -> ExclusionDecisions:
+        """Why each policy that was looked at so far was excluded, by row of the policy table"""
+        if self._exclusion_decisions is None:
+            with self._exclusion_decisions_lock:
+                if self._exclusion_decisions is None:
+                    self._exclusion_decisions = ExclusionDecisions(len(self.policy_table))
+        return self._exclusion_decisions
+
+    def exclusion_report(self) -> dict:
+        """The excluded policies and the reason for each, as JSON-ready values"""
+        table = self.policy_table
+        decisions = self.exclusion_decisions
+        policies = {}
+        for row in decisions.excluded_rows():
+            policies[table.short_ids[row]] = dict(
+                service_name=table.service_name(row),
+                display_name=table.display_names[row],
+                reason=decisions.reason(row),
+            )
+        return dict(counts=decisions.counts(), policies=policies)
+
     def get_all_policy_ids_sorted_by_service(self, no_params: bool = True, params_optional: bool = True,
-                                             params_required: bool = True, audit_only: bool = False, enforce: bool = False) -> dict:
+                                             params_required: bool = True, audit_only: bool = False, enforce: bool = False,
+                                             where: PolicyQuery = None) -> dict:
+        """
+        Select the policies for the requested services in a single pass.
+
+        The policies are selected with mask operations over the policy table, only the shards of the services with
+        selected policies are read, and each service's results are sorted once by display name.
+
+        :param where: Only select the policies that also match this query
+        """
         results = {}
-        for service_name, service_policies in self.service_definitions.items():
-            if self.config.is_service_excluded(service_name=service_name):
-                continue
-            service_results = {}
-            for policy_id, policy_details in service_policies.items():
-                if not self.is_policy_id_excluded(policy_id=policy_id):
-                    if no_params:
-                        if policy_details.get("no_params"):
-                            policy_definition = self.get_policy_definition(policy_id=policy_details.get("short_id"))
-                            service_results[policy_details.get("display_name")] = dict(
-                                short_id=policy_details.get("short_id"),
-                                long_id=policy_definition.id,
-                                display_name=policy_details.get("display_name").replace("[Preview]: ", ""),
-                            )
-                    if params_optional:
-                        if policy_details.get("params_optional"):
-                            parameters = {}
-                            policy_definition = self.get_policy_definition(policy_id=policy_details.get("short_id"))
-                            # Get the policy definition ID
-                            # Look up the policy definition and set the object
-                            # For parameter name, parameter details, do stuff from get_policy_definition_parameters
-                            for parameter_name, parameter_details in policy_definition.parameters.items():
-                                # fix issue #92
-                                # if parameter_details.name == "effect":
-                                #     continue
-                                parameters[parameter_details.name] = parameter_details.json()
-                                if parameter_name == "effect":
-                                    if enforce:
-                                        # It could be Capitalized or lowercase in allowed_values
-                                        if "Deny" in parameter_details.allowed_values:
-                                            parameters[parameter_name]["value"] = "Deny"
-                                        # lowercase = [x.lower() for x in parameter_details.allowed_values]
-                                        if "deny" in parameter_details.allowed_values:
-                                            parameters[parameter_name]["value"] = "deny"
-                            service_results[policy_details.get("display_name")] = dict(
-                                short_id=policy_details.get("short_id"),
-                                long_id=policy_definition.id,
-                                display_name=policy_details.get("display_name").replace("[Preview]: ", ""),
-                                parameters=parameters
-                            )
-                    if params_required:
-                        if policy_details.get("params_required"):
-                            parameters = {}
-                            policy_definition = self.get_policy_definition(policy_id=policy_details.get("short_id"))
-                            # Get the policy definition ID
-                            # Look up the policy definition and set the object
-                            # For parameter name, parameter details, do stuff from get_policy_definition_parameters
-                            for parameter_name, parameter_details in policy_definition.parameters.items():
-                                # fix issue #92
-                                # if parameter_details.name == "effect":
-                                #     continue
-                                parameters[parameter_details.name] = parameter_details.json()
-                                if parameter_details.name == "effect":
-                                    if enforce:
-                                        # It could be Capitalized or lowercase in allowed_values
-                                        if "Deny" in parameter_details.allowed_values:
-                                            parameters[parameter_details.name]["value"] = "Deny"
-                                        # lowercase = [x.lower() for x in parameter_details.allowed_values]
-                                        if "deny" in parameter_details.allowed_values:
-                                            parameters[parameter_details.name]["value"] = "deny"
-                            service_results[policy_details.get("display_name")] = dict(
-                                short_id=policy_details.get("short_id"),
-                                long_id=policy_definition.id,
-                                display_name=policy_details.get("display_name").replace("[Preview]: ", ""),
-                            )
-                    # If audit_only is flagged, create a new list to hold the audit-only ones, then save it as the new service results
-                    if audit_only:
-                        filtered_service_results = {}
-                        for service_result, service_result_details in service_results.items():
-                            if policy_details.get("audit_only"):
-                                filtered_service_results[service_result] = service_result_details
-                        service_results = filtered_service_results.copy()
-
-                    service_results = OrderedDict(sorted(service_results.items()))
-
-                    # If audit_only is not used, don't worry about it
-                    if service_results:
-                        results[service_name] = service_results
-        # Trim the irrelevant services
+        for service_name, policy_id, policy_details in self._selected_policies(
+                no_params=no_params, params_optional=params_optional, params_required=params_required,
+                audit_only=audit_only, where=where):
+            results.setdefault(service_name, {})[policy_details.get("display_name")] = self._policy_id_pair(
+                policy_details=policy_details, enforce=enforce
+            )
         policy_id_pairs = {}
-        for service_name, service_policies in results.items():
-            if service_name in self.service_names:
-                policy_id_pairs[service_name] = service_policies
+        for service_name, service_results in results.items():
+            policy_id_pairs[service_name] = OrderedDict(sorted(service_results.items()))
         return policy_id_pairs
 
-    def compliance_coverage_data(self, no_params: bool = True, params_optional: bool = True, params_required: bool = True) -> dict:
-        results = {}
-        compliance_data_file = os.path.abspath(
-            os.path.join(
-                os.path.dirname(__file__), os.path.pardir, "shared", "data", "compliance-data.json"
-            )
+    def _selected_policies(self, no_params: bool = True, params_optional: bool = True, params_required: bool = True,
+                           audit_only: bool = False, where: PolicyQuery = None):
+        """
+        Yield the service name, short ID and summary of the policies in the requested services that match the
+        parameter requirements and are not excluded, in catalog order.
+        """
+        table = self.policy_table
+        selected = table.services(
+            [
+                service_name for service_name in self.service_names
+                if not self.config.is_service_excluded(service_name=service_name)
+            ]
+        )
+        # The parameter categories are mutually exclusive, so each policy lands in at most one of them
+        selected &= table.parameter_requirements(
+            no_params=no_params, params_optional=params_optional, params_required=params_required
         )
-        with open(compliance_data_file) as json_file:
-            compliance_data = json.load(json_file)
-        display_names_sorted = self.get_all_display_names_sorted_by_service(no_params=no_params, params_optional=params_optional, params_required=params_required)
-        definitions_found = []
-        for service_name, display_names in display_names_sorted.items():
-            for display_name in display_names:
-                policy_definition_compliance_metadata = compliance_data.get(display_name, None)
-                # If there are no results, skip
-                if not policy_definition_compliance_metadata:
-                    continue
-                # Check if this is excluded by the config
-                policy_definition = self.get_policy_definition_by_display_name(display_name)
-                if skip_display_names(policy_definition=policy_definition, config=self.config):
-                    continue
-                definitions_found.append(f"{service_name}: {display_name}")
-                service_results = {}
-                # if it exists in the display names
-                if policy_definition_compliance_metadata:
+        if audit_only:
+            selected &= table.column("audit_only")
+        if where is not None:
+            selected &= where.mask(table)
+        selected &= ~self._excluded_rows(selected)
+        # Only the shards of the services with selected policies are read
+        for row in table.rows(selected):
+            service_name = table.service_name(row)
+            policy_id = table.short_ids[row]
+            yield service_name, policy_id, self.service_definitions[service_name][policy_id]
+
+    def _policy_id_pair(self, policy_details: dict, enforce: bool = False) -> dict:
+        """The entry for a single policy in the output of get_all_policy_ids_sorted_by_service"""
+        result = dict(
+            short_id=policy_details.get("short_id"),
+            long_id=policy_details.get("id"),
+            display_name=policy_details.get("display_name").replace("[Preview]: ", ""),
+        )
+        # Only policies with optional parameters carry their parameters along
+        if policy_details.get("params_optional"):
+            parameters = {}
+            policy_definition = self.get_policy_definition(policy_id=policy_details.get("short_id"))
+            for parameter_name, parameter_details in policy_definition.parameters.items():
+                parameters[parameter_details.name] = parameter_details.json()
+                if parameter_name == "effect" and enforce and policy_details.get("deny_effect_value"):
+                    parameters[parameter_name]["value"] = policy_details.get("deny_effect_value")
+            result["parameters"] = parameters
+        return result
+
+    def compliance_coverage_data(self, no_params: bool = True, params_optional: bool = True, params_required: bool = True,
+                                 where: PolicyQuery = None) -> dict:
+        """
+        Join the selected policies with the compliance benchmark data.
+
+        The compliance index is loaded once per process and matched by policy ID first, then by display name, so
+        policies that were renamed in the catalog still pick up their benchmarks.
+        """
+        results = {}
+        for service_name, display_name, policy_id, policy_def_results in self._compliance_coverage_rows(
+                no_params=no_params, params_optional=params_optional, params_required=params_required, where=where):
+            results.setdefault(service_name, {})[display_name] = policy_def_results
+        return results
+
+    def _compliance_coverage_rows(self, no_params: bool = True, params_optional: bool = True,
+                                  params_required: bool = True, where: PolicyQuery = None):
+        """
+        Yield the service name, display name, short ID and compliance data of each selected policy, by service and
+        then by display name.
+        """
+        for service_name, selected_display_names in self._selected_display_names(
+                no_params=no_params, params_optional=params_optional, params_required=params_required,
+                where=where).items():
+            # Visit each service's policies in display name order, like get_all_display_names_sorted_by_service
+            for display_name, policy_id in sorted(selected_display_names.items()):
+                compliance_metadata = self.compliance_index.get(policy_id=policy_id, display_name=display_name)
+                if compliance_metadata:
                     policy_def_results = dict(
-                        description=policy_definition_compliance_metadata.get("description"),
-                        effects=policy_definition_compliance_metadata.get("effects").lower(),
-                        github_link=policy_definition_compliance_metadata.get("github_link"),
-                        github_version=policy_definition_compliance_metadata.get("github_version"),
+                        description=compliance_metadata.get("description"),
+                        effects=compliance_metadata.get("effects").lower(),
+                        github_link=compliance_metadata.get("github_link"),
+                        github_version=compliance_metadata.get("github_version"),
                         name=display_name,
-                        policy_id=policy_definition_compliance_metadata.get("policy_id"),
-                        service_name=policy_definition_compliance_metadata.get("service_name"),
-                        benchmarks=policy_definition_compliance_metadata.get("benchmarks"),
+                        policy_id=compliance_metadata.get("policy_id"),
+                        service_name=compliance_metadata.get("service_name"),
+                        benchmarks=compliance_metadata.get("benchmarks"),
                     )
-                    service_results[display_name] = policy_def_results
+                # Address items that are not listed under the compliance benchmarks
                 else:
-                    continue
-                if not results.get(service_name):
-                    results[service_name] = service_results
-                else:
-                    results[service_name][display_name] = policy_def_results
-        # Address items that are not listed under the compliance benchmarks
-        for service_name, display_names in display_names_sorted.items():
-            for display_name in display_names:
-                service_results = {}
-                if service_name in results.keys():
-                    if display_name in results[service_name].keys():
-                        continue
-                definitions_found.append(f"{service_name}: {display_name}")
-                # Check if this is excluded by the config
-                policy_definition = self.get_policy_definition_by_display_name(display_name)
-                if skip_display_names(policy_definition=policy_definition, config=self.config):
-                    continue
-                if not policy_definition:
-                    raise Exception(f"Policy definition with display name {display_name} not found")
-                policy_def_results = dict(
-                    description=policy_definition.properties.description,
-                    effects=','.join(policy_definition.allowed_effects),
-                    github_link=policy_definition.github_link,
-                    github_version=policy_definition.properties.version,
-                    name=display_name,
-                    policy_id=policy_definition.id,
-                    service_name=service_name,
-                    benchmarks={},
-                )
-                service_results[display_name] = policy_def_results
-                if not results.get(service_name):
-                    results[service_name] = service_results
-                else:
-                    results[service_name][display_name] = policy_def_results
-        definitions_found.sort()
+                    policy_definition = self.get_policy_definition(policy_id=policy_id)
+                    policy_def_results = dict(
+                        description=policy_definition.properties.description,
+                        effects=','.join(policy_definition.allowed_effects),
+                        github_link=policy_definition.github_link,
+                        github_version=policy_definition.properties.version,
+                        name=display_name,
+                        policy_id=policy_definition.id,
+                        service_name=service_name,
+                        benchmarks={},
+                    )
+                yield service_name, display_name, policy_id, policy_def_results
+
+    def _selected_display_names(self, no_params: bool = True, params_optional: bool = True,
+                                params_required: bool = True, where: PolicyQuery = None) -> dict:
+        """The display names of the selected policies in every service, mapped to their short IDs, by service"""
+        table = self.policy_table
+        selected = table.parameter_requirements(
+            no_params=no_params, params_optional=params_optional, params_required=params_required
+        )
+        if where is not None:
+            selected &= where.mask(table)
+        selected &= ~self._excluded_rows(selected)
+        results = {}
+        for row in table.rows(selected):
+            # If a service has two policies with the same display name, the first one wins
+            results.setdefault(table.service_name(row), {}).setdefault(table.display_names[row], table.short_ids[row])
         return results
 
-    def table_summary(self, hyperlink_format: bool = True, no_params: bool = True, params_optional: bool = True, params_required: bool = True) -> list:
+    def summary_rows(self, no_params: bool = True, params_optional: bool = True, params_required: bool = True,
+                     where: PolicyQuery = None) -> list:
+        """
+        The rows shared by the Markdown and CSV summaries, unsorted and with the plain policy name.
+
+        Build these once and pass them to markdown_table and csv_summary so the compliance data is only joined once.
+        """
         results = []
 
         def get_benchmark_id(benchmark_name: str, this_policy_metadata: dict) -> str:
@@ -444,78 +566,84 @@ class AzurePolicies:
                 benchmark_id = ""
             return benchmark_id
 
-        compliance_coverage_data = self.compliance_coverage_data(no_params=no_params, params_optional=params_optional, params_required=params_required)
-        for service_name, service_details in compliance_coverage_data.items():
-            for display_name, policy_metadata in service_details.items():
-                name = display_name.replace("[Preview]: ", "")
-                github_link = policy_metadata.get("github_link")
-                policy_definition_obj = self.get_policy_definition_by_display_name(display_name)
-
-                # Get the string that we'll put in the name, depending on if we want to use Markdown hyperlink format or just the name itself
-                if hyperlink_format:
-                    if github_link != "":
-                        policy_definition_string = f"[{name}]({github_link})"
-                    else:
-                        policy_definition_string = name
-                else:
-                    policy_definition_string = name
+        # Joined by short ID, since a display name can be used by policies in more than one service
+        for service_name, display_name, policy_id, policy_metadata in self._compliance_coverage_rows(
+                no_params=no_params, params_optional=params_optional, params_required=params_required, where=where):
+            name = display_name.replace("[Preview]: ", "")
+            github_link = policy_metadata.get("github_link")
+            policy_definition_obj = self.get_policy_definition(policy_id=policy_id)
 
-                azure_security_benchmark_id = get_benchmark_id(
-                    "Azure Security Benchmark", policy_metadata
-                )
-                cis_id = get_benchmark_id("CIS", policy_metadata)
-                ccmc_id = get_benchmark_id("CCMC L3", policy_metadata)
-                iso_id = get_benchmark_id("ISO 27001", policy_metadata)
-                nist_800_171_id = get_benchmark_id(
-                    "NIST SP 800-171 R2", policy_metadata
-                )
-                nist_800_53_id = get_benchmark_id(
-                    "NIST SP 800-53 R4", policy_metadata
-                )
-                hipaa_id = get_benchmark_id("HIPAA HITRUST 9.2", policy_metadata)
-                new_zealand_id = get_benchmark_id(
-                    "NZISM Security Benchmark", policy_metadata
-                )
-                parameter_requirements = None
-                if policy_definition_obj.no_params:
-                    parameter_requirements = "None"
-                elif policy_definition_obj.params_optional:
-                    parameter_requirements = "Optional"
-                elif policy_definition_obj.params_required:
-                    parameter_requirements = "Required"
-
-                parameter_names = policy_definition_obj.parameter_names
-                # Fixing issue #92
-                # if "effect" in parameter_names:
-                #     parameter_names.remove("effect")
-                parameter_names = ", ".join(parameter_names)
-                # Store Audit only result as a string
-                if policy_definition_obj.audit_only:
-                    audit_only = "Yes"
-                else:
-                    audit_only = "No"
-                result = {
-                    "Service": service_name,
-                    "Policy Definition": policy_definition_string,
-                    "Parameter Requirements": parameter_requirements,
-                    "Audit Only": audit_only,
-                    "Azure Security Benchmark": azure_security_benchmark_id,
-                    "CIS": cis_id,
-                    "CCMC L3": ccmc_id,
-                    "ISO 27001": iso_id,
-                    "NIST SP 800-171 R2": nist_800_171_id,
-                    "NIST SP 800-53 R4": nist_800_53_id,
-                    "HIPAA HITRUST 9.2": hipaa_id,
-                    "New Zealand ISM": new_zealand_id,
-                    "Parameters": parameter_names,
-                    "Link": github_link,
-                    "ID": policy_definition_obj.short_id
-                }
-                results.append(result)
+            azure_security_benchmark_id = get_benchmark_id(
+                "Azure Security Benchmark", policy_metadata
+            )
+            cis_id = get_benchmark_id("CIS", policy_metadata)
+            ccmc_id = get_benchmark_id("CCMC L3", policy_metadata)
+            iso_id = get_benchmark_id("ISO 27001", policy_metadata)
+            nist_800_171_id = get_benchmark_id(
+                "NIST SP 800-171 R2", policy_metadata
+            )
+            nist_800_53_id = get_benchmark_id(
+                "NIST SP 800-53 R4", policy_metadata
+            )
+            hipaa_id = get_benchmark_id("HIPAA HITRUST 9.2", policy_metadata)
+            new_zealand_id = get_benchmark_id(
+                "NZISM Security Benchmark", policy_metadata
+            )
+            parameter_requirements = None
+            if policy_definition_obj.no_params:
+                parameter_requirements = "None"
+            elif policy_definition_obj.params_optional:
+                parameter_requirements = "Optional"
+            elif policy_definition_obj.params_required:
+                parameter_requirements = "Required"
+
+            parameter_names = policy_definition_obj.parameter_names
+            # Fixing issue #92
+            # if "effect" in parameter_names:
+            #     parameter_names.remove("effect")
+            parameter_names = ", ".join(parameter_names)
+            # Store Audit only result as a string
+            if policy_definition_obj.audit_only:
+                audit_only = "Yes"
+            else:
+                audit_only = "No"
+            result = {
+                "Service": service_name,
+                "Policy Definition": name,
+                "Parameter Requirements": parameter_requirements,
+                "Audit Only": audit_only,
+                "Azure Security Benchmark": azure_security_benchmark_id,
+                "CIS": cis_id,
+                "CCMC L3": ccmc_id,
+                "ISO 27001": iso_id,
+                "NIST SP 800-171 R2": nist_800_171_id,
+                "NIST SP 800-53 R4": nist_800_53_id,
+                "HIPAA HITRUST 9.2": hipaa_id,
+                "New Zealand ISM": new_zealand_id,
+                "Parameters": parameter_names,
+                "Link": github_link,
+                "ID": policy_definition_obj.short_id
+            }
+            results.append(result)
+        return results
+
+    def table_summary(self, hyperlink_format: bool = True, no_params: bool = True, params_optional: bool = True,
+                      params_required: bool = True, summary_rows: list = None) -> list:
+        if summary_rows is None:
+            summary_rows = self.summary_rows(no_params=no_params, params_optional=params_optional, params_required=params_required)
+        results = []
+        for row in summary_rows:
+            result = row.copy()
+            # Get the string that we'll put in the name, depending on if we want to use Markdown hyperlink format or just the name itself
+            if hyperlink_format and row["Link"] != "":
+                result["Policy Definition"] = f"[{row['Policy Definition']}]({row['Link']})"
+            results.append(result)
+        # The hyperlinks change the sort order, so sort after formatting
         results = sorted(results, key=itemgetter("Service", "Policy Definition"))
         return results
 
-    def csv_summary(self, path: str, verbosity: int, no_params: bool = True, params_optional: bool = True, params_required: bool = True):
+    def csv_summary(self, path: str, verbosity: int, no_params: bool = True, params_optional: bool = True,
+                    params_required: bool = True, summary_rows: list = None):
         headers = [
             "Service",
             "Policy Definition",
@@ -535,7 +663,8 @@ class AzurePolicies:
         ]
 
         # results = headers.copy()
-        results = self.table_summary(hyperlink_format=False, no_params=no_params, params_optional=params_optional, params_required=params_required)
+        results = self.table_summary(hyperlink_format=False, no_params=no_params, params_optional=params_optional,
+                                     params_required=params_required, summary_rows=summary_rows)
         if os.path.exists(path):
             os.remove(path)
             if verbosity >= 1:
@@ -549,7 +678,10 @@ class AzurePolicies:
             if verbosity >= 1:
                 utils.print_grey(f"Wrote the new file to {path}")
 
-    def markdown_table(self, no_params: bool = True, params_optional: bool = True, params_required: bool = True) -> str:
-        results = self.table_summary(no_params=no_params, params_optional=params_optional, params_required=params_required)
+    def markdown_table(self, no_params: bool = True, params_optional: bool = True, params_required: bool = True,
+                       summary_rows: list = None) -> str:
+        results = self.table_summary(no_params=no_params, params_optional=params_optional,
+                                     params_required=params_required, summary_rows=summary_rows)
+        from tabulate import tabulate
         return tabulate(results, headers="keys", tablefmt="github")
 
@@ -0,0 +1,326 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+The policy summaries as a SQLite database, for ranked full-text search.
+
+The database only backs the search-policies command. The other commands select policies from the PolicyTable bitsets
+in policy_table.py, so there is a single selection engine and it doesn't need SQLite.
+
+update_iam_definition.py writes the database next to the other catalog files. It has a table for the policies, their
+parameters, their effects and their compliance benchmark mappings, and an FTS5 index over the display names and
+descriptions. If the SQLite library was built without FTS5, searches fall back to LIKE queries.
+"""
+import os
+import re
+import logging
+import sqlite3
+import threading
+from cloud_guardrails.shared import utils
+
+logger = logging.getLogger(__name__)
+
+CATALOG_DATABASE_PATH = os.path.join(utils.DATA_FILE_DIRECTORY, "iam-definition.sqlite")
+# Stored in PRAGMA user_version. Bump this whenever the tables change.
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE policies (
+    short_id TEXT NOT NULL,
+    position INTEGER PRIMARY KEY,
+    service_name TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    description TEXT,
+    id TEXT,
+    file_name TEXT,
+    github_link TEXT,
+    no_params INTEGER NOT NULL,
+    params_optional INTEGER NOT NULL,
+    params_required INTEGER NOT NULL,
+    audit_only INTEGER NOT NULL,
+    is_deprecated INTEGER NOT NULL,
+    modifies_resources INTEGER NOT NULL,
+    deploy_prefixed INTEGER NOT NULL,
+    deny_effect_value TEXT
+);
+CREATE INDEX policies_service_name ON policies (service_name);
+CREATE INDEX policies_short_id ON policies (short_id);
+CREATE TABLE parameters (
+    policy_position INTEGER NOT NULL REFERENCES policies (position),
+    name TEXT NOT NULL
+);
+CREATE INDEX parameters_name ON parameters (name);
+CREATE TABLE effects (
+    policy_position INTEGER NOT NULL REFERENCES policies (position),
+    effect TEXT NOT NULL
+);
+CREATE INDEX effects_effect ON effects (effect);
+CREATE TABLE compliance (
+    policy_position INTEGER NOT NULL REFERENCES policies (position),
+    benchmark TEXT NOT NULL,
+    requirement_id TEXT,
+    category TEXT
+);
+CREATE INDEX compliance_benchmark ON compliance (benchmark);
+"""
+# Porter stemming, so "encrypt" also finds "encrypted" and "encryption"
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE policies_fts USING fts5(
+    display_name, description, content='policies', content_rowid='position', tokenize='porter unicode61'
+);
+"""
+# In the order of the INSERT statement below
+_BOOLEAN_COLUMNS = [
+    "no_params", "params_optional", "params_required", "audit_only", "is_deprecated", "modifies_resources",
+    "deploy_prefixed"
+]
+# The only SQL that the queries below put together at run time. Values always go through ? placeholders, so user input
+# never becomes part of the SQL text.
+_COLUMNS = "p.service_name, p.short_id, p.display_name, p.description"
+_REQUIREMENT_CLAUSES = {
+    "no_params": "p.no_params",
+    "params_optional": "p.params_optional",
+    "params_required": "p.params_required",
+}
+_AUDIT_ONLY_CLAUSE = "p.audit_only"
+# The policies that the other commands never select. See AzurePolicies.is_policy_id_excluded.
+_NOT_SKIPPED_CLAUSE = (
+    "p.is_deprecated = 0 AND p.modifies_resources = 0 AND p.deploy_prefixed = 0 "
+    "AND p.display_name NOT LIKE '[Deprecated]: %'"
+)
+_EFFECT_CLAUSE = "p.position IN (SELECT policy_position FROM effects WHERE effect = ?)"
+_PARAMETER_CLAUSE = "p.position IN (SELECT policy_position FROM parameters WHERE name = ?)"
+_LIKE_CLAUSE = "(lower(p.display_name) LIKE ? OR lower(p.description) LIKE ?)"
+_DISPLAY_NAME_LIKE_CLAUSE = "(lower(p.display_name) LIKE ?)"
+
+
+def _placeholders(number: int) -> str:
+    return ", ".join("?" * number)
+
+
+def fts5_is_available(connection: sqlite3.Connection) -> bool:
+    try:
+        connection.execute("CREATE VIRTUAL TABLE temp.fts5_check USING fts5(value)")
+        connection.execute("DROP TABLE temp.fts5_check")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def populate_catalog_database(connection: sqlite3.Connection, service_definitions: dict, compliance_index=None):
+    """
+    Create the tables and fill them from the policy summaries by service.
+
+    :param compliance_index: A ComplianceIndex to fill the compliance table from. Left empty if not provided.
+    """
+    connection.executescript(SCHEMA)
+    has_fts5 = fts5_is_available(connection)
+    if has_fts5:
+        connection.executescript(FTS_SCHEMA)
+    position = 0
+    for service_name, service_policies in service_definitions.items():
+        for short_id, policy_details in service_policies.items():
+            connection.execute(
+                "INSERT INTO policies (short_id, position, service_name, display_name, description, id, file_name, "
+                "github_link, deny_effect_value, no_params, params_optional, params_required, audit_only, "
+                "is_deprecated, modifies_resources, deploy_prefixed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    short_id, position, service_name, policy_details.get("display_name"),
+                    policy_details.get("description"), policy_details.get("id"), policy_details.get("file_name"),
+                    policy_details.get("github_link"), policy_details.get("deny_effect_value"),
+                ] + [bool(policy_details.get(column)) for column in _BOOLEAN_COLUMNS]
+            )
+            connection.executemany(
+                "INSERT INTO parameters (policy_position, name) VALUES (?, ?)",
+                [(position, name) for name in policy_details.get("parameter_names", [])]
+            )
+            connection.executemany(
+                "INSERT INTO effects (policy_position, effect) VALUES (?, ?)",
+                [(position, effect) for effect in policy_details.get("allowed_effects", [])]
+            )
+            if compliance_index:
+                compliance_metadata = compliance_index.get(
+                    policy_id=short_id, display_name=policy_details.get("display_name")
+                )
+                if compliance_metadata:
+                    connection.executemany(
+                        "INSERT INTO compliance (policy_position, benchmark, requirement_id, category) "
+                        "VALUES (?, ?, ?, ?)",
+                        [
+                            (position, benchmark, details.get("requirement_id"), details.get("category"))
+                            for benchmark, details in compliance_metadata.get("benchmarks", {}).items()
+                        ]
+                    )
+            position += 1
+    if has_fts5:
+        connection.execute("INSERT INTO policies_fts (policies_fts) VALUES ('rebuild')")
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    connection.commit()
+
+
+def write_catalog_database(service_definitions: dict, path: str = CATALOG_DATABASE_PATH, compliance_index=None):
+    """Write the database to a temporary file and move it into place, so readers never see a partial database"""
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    connection = sqlite3.connect(temporary_path)
+    try:
+        populate_catalog_database(connection, service_definitions, compliance_index=compliance_index)
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+    os.replace(temporary_path, path)
+
+
+def _fts_query(query: str) -> str:
+    """Quote every word, so the user's query is matched as keywords rather than parsed as FTS5 syntax"""
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"' for word in words)
+
+
+class CatalogDatabase:
+    """Read-only queries against the catalog database"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.connection.row_factory = sqlite3.Row
+        self.has_fts5 = bool(self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'policies_fts'"
+        ).fetchone())
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str = CATALOG_DATABASE_PATH):
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        schema_version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version != SCHEMA_VERSION:
+            connection.close()
+            raise Exception(
+                f"{path} has schema version {schema_version}, but this version of cloud-guardrails reads "
+                f"version {SCHEMA_VERSION}. Run update_iam_definition.py to rebuild it."
+            )
+        return cls(connection)
+
+    @classmethod
+    def from_catalog(cls, service_definitions: dict, compliance_index=None):
+        """Build the database in memory, for when update_iam_definition.py hasn't written one"""
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        populate_catalog_database(connection, service_definitions, compliance_index=compliance_index)
+        return cls(connection)
+
+    def close(self):
+        self.connection.close()
+
+    def _filters(self, service_names: list = None, no_params: bool = True, params_optional: bool = True,
+                 params_required: bool = True, audit_only: bool = False, effect: str = None,
+                 parameter: str = None, include_skipped: bool = False) -> tuple:
+        """
+        The WHERE clauses and their arguments of a search. The clauses only come from the fixed
+        fragments at the top of this module.
+        """
+        clauses = []
+        arguments = []
+        if service_names is not None:
+            clauses.append("p.service_name IN (" + _placeholders(len(service_names)) + ")")
+            arguments.extend(service_names)
+        requirements = [
+            _REQUIREMENT_CLAUSES[column] for column, selected in
+            [("no_params", no_params), ("params_optional", params_optional), ("params_required", params_required)]
+            if selected
+        ]
+        clauses.append("(" + (" OR ".join(requirements) or "0") + ")")
+        if audit_only:
+            clauses.append(_AUDIT_ONLY_CLAUSE)
+        if not include_skipped:
+            clauses.append(_NOT_SKIPPED_CLAUSE)
+        if effect:
+            clauses.append(_EFFECT_CLAUSE)
+            arguments.append(effect.lower())
+        if parameter:
+            clauses.append(_PARAMETER_CLAUSE)
+            arguments.append(parameter)
+        return clauses, arguments
+
+    def _execute(self, sql: str, arguments: list) -> list:
+        # The connection is shared, so the queries from different threads take turns
+        with self._lock:
+            return [dict(row) for row in self.connection.execute(sql, arguments).fetchall()]
+
+    def search(self, query: str, service_names: list = None, no_params: bool = True, params_optional: bool = True,
+               params_required: bool = True, audit_only: bool = False, effect: str = None, parameter: str = None,
+               limit: int = 20, include_skipped: bool = False, config=None) -> list:
+        """
+        The policies whose display name or description contain every word in the query, best match first.
+
+        Each result has the service name, short ID, display name and description of the policy. Like the other
+        commands, deprecated policies and policies that modify or deploy resources are left out unless
+        include_skipped is set, and so are the policies that the config, if one is given, excludes.
+        """
+        clauses, arguments = self._filters(
+            service_names=service_names, no_params=no_params, params_optional=params_optional,
+            params_required=params_required, audit_only=audit_only, effect=effect, parameter=parameter,
+            include_skipped=include_skipped
+        )
+        match = _fts_query(query)
+        if not match:
+            return []
+        if config is None:
+            return self._search(query, match, clauses, arguments, limit)
+        # The config is checked in Python, so the limit is applied afterwards. -1 is no limit in SQLite.
+        results = [
+            result for result in self._search(query, match, clauses, arguments, -1)
+            if not config.is_excluded(service_name=result.get("service_name"), display_name=result.get("display_name"))
+        ]
+        return results[:limit]
+
+    def _search(self, query: str, match: str, clauses: list, arguments: list, limit: int) -> list:
+        if self.has_fts5:
+            # Matches in the display name count for more than matches in the description. The clauses are fixed
+            # fragments from _filters, and the query and the values are bound as arguments.
+            sql = (
+                "SELECT " + _COLUMNS + " FROM policies_fts f JOIN policies p ON p.position = f.rowid "  # nosec B608
+                "WHERE policies_fts MATCH ? AND " + " AND ".join(clauses) + " "
+                "ORDER BY bm25(policies_fts, 10.0, 1.0), p.position LIMIT ?"
+            )
+            return self._execute(sql, [match] + arguments + [limit])
+        # Without FTS5, every word has to appear somewhere, and display name matches are listed first. Each word adds
+        # the same fixed LIKE clause, and the word itself is bound as an argument.
+        words = re.findall(r"\w+", query.lower())
+        like_clauses = [_LIKE_CLAUSE] * len(words)
+        display_name_hits = [_DISPLAY_NAME_LIKE_CLAUSE] * len(words)
+        like_arguments = []
+        for word in words:
+            like_arguments.extend([f"%{word}%", f"%{word}%"])
+        sql = (
+            "SELECT " + _COLUMNS + " FROM policies p WHERE " + " AND ".join(like_clauses + clauses) + " "  # nosec B608
+            "ORDER BY (" + " + ".join(display_name_hits) + ") DESC, p.position LIMIT ?"
+        )
+        return self._execute(sql, like_arguments + arguments + [f"%{word}%" for word in words] + [limit])
+
+
+_catalog_database = None
+_catalog_database_lock = threading.Lock()
+
+
+def get_catalog_database() -> CatalogDatabase:
+    """
+    Return the database shared by the whole process. If update_iam_definition.py hasn't written one, it is built in
+    memory from the catalog the first time it is needed.
+    """
+    global _catalog_database
+    with _catalog_database_lock:
+        if _catalog_database is None:
+            if os.path.exists(CATALOG_DATABASE_PATH):
+                _catalog_database = CatalogDatabase.open(CATALOG_DATABASE_PATH)
+            else:
+                # Imported here because the catalog is only needed when there is no database file
+                from cloud_guardrails.iam_definition.policy_catalog import get_policy_catalog
+                from cloud_guardrails.iam_definition.compliance_index import get_compliance_index
+                logger.info("%s does not exist; building the catalog database in memory", CATALOG_DATABASE_PATH)
+                _catalog_database = CatalogDatabase.from_catalog(
+                    get_policy_catalog().service_definitions, compliance_index=get_compliance_index()
+                )
+        return _catalog_database
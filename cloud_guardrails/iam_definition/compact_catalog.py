@@ -0,0 +1,224 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+The compact, binary form of the IAM definition catalog that is written by update_iam_definition.py
+
+The catalog is split in three parts:
+
+* A small top level file with the list of services, the service of each policy, the display name index and the
+  PolicyTable columns, so policies can be selected without reading any shard.
+* One shard per service with the policy summaries of that service. Shards are only read when a service is used.
+* A PolicyContentStore with the policy_content of each policy, which is only read on demand.
+
+Each file starts with a magic string and the schema version, followed by a pickle (protocol 4). Unlike the JSON
+export, the summaries are only stored once. Strings are interned before pickling, so repeated values like effects,
+parameter names and service names are written once and shared again when a file is loaded.
+"""
+import os
+import re
+import sys
+import struct
+import pickle  # nosec
+import logging
+import threading
+from collections import namedtuple
+from collections.abc import Mapping
+from cloud_guardrails.shared import utils
+from cloud_guardrails.iam_definition.policy_content_store import PolicyContentStore, write_policy_content_store
+from cloud_guardrails.iam_definition.policy_table import PolicyTable
+
+logger = logging.getLogger(__name__)
+
+COMPACT_IAM_DEFINITION_PATH = os.path.join(utils.DATA_FILE_DIRECTORY, "iam-definition.pickle")
+MAGIC = b"cloud-guardrails catalog\n"
+# Bump this whenever the layout of the payload changes
+SCHEMA_VERSION = 5
+_HEADER = struct.Struct(">H")
+
+CompactCatalog = namedtuple(
+    "CompactCatalog",
+    ["service_definitions", "policy_summaries", "policy_contents", "display_name_index", "policy_table"]
+)
+
+
+def get_policy_contents_path(path: str) -> str:
+    """Where the policy contents of the compact catalog at path are stored"""
+    return f"{os.path.splitext(path)[0]}-contents.jsonl"
+
+
+def get_shard_directory(path: str) -> str:
+    """Where the service shards of the compact catalog at path are stored"""
+    return f"{os.path.splitext(path)[0]}-services"
+
+
+def get_shard_file_name(service_name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", service_name.lower()).strip("-") + ".pickle"
+
+
+def is_compact_catalog(path: str) -> bool:
+    """True if the file at path starts like a compact catalog"""
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def _dump(payload: dict, path: str):
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(_HEADER.pack(SCHEMA_VERSION))
+        pickle.dump(payload, file, protocol=4)
+
+
+def _load(path: str) -> dict:
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"{path} is not a compact IAM definition catalog")
+        schema_version, = _HEADER.unpack(file.read(_HEADER.size))
+        if schema_version != SCHEMA_VERSION:
+            raise Exception(
+                f"{path} has schema version {schema_version}, but this version of cloud-guardrails reads "
+                f"version {SCHEMA_VERSION}. Run update_iam_definition.py to rebuild it."
+            )
+        # The catalog is written by update_iam_definition.py and shipped with the package, so it is trusted
+        return pickle.load(file)  # nosec
+
+
+class ServiceShards(Mapping):
+    """The policy summaries by service, reading each service's shard the first time the service is used"""
+
+    def __init__(self, directory: str, shard_file_names: dict, content_sha256: str):
+        self.directory = directory
+        self.shard_file_names = shard_file_names
+        self.content_sha256 = content_sha256
+        self._services = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, service_name: str) -> dict:
+        service_policies = self._services.get(service_name)
+        if service_policies is None:
+            if service_name not in self.shard_file_names:
+                raise KeyError(service_name)
+            with self._lock:
+                service_policies = self._services.get(service_name)
+                if service_policies is None:
+                    service_policies = self._read(service_name)
+                    self._services[service_name] = service_policies
+        return service_policies
+
+    def _read(self, service_name: str) -> dict:
+        path = os.path.join(self.directory, self.shard_file_names[service_name])
+        logger.debug("Loading the %s policies from %s", service_name, path)
+        shard = _load(path)
+        if shard.get("content_sha256") != self.content_sha256:
+            raise Exception(f"{path} was not built together with the catalog. Run update_iam_definition.py to rebuild it.")
+        return shard["policies"]
+
+    def __iter__(self):
+        return iter(self.shard_file_names)
+
+    def __len__(self) -> int:
+        return len(self.shard_file_names)
+
+    @property
+    def loaded_services(self) -> list:
+        """The services whose shard has been read so far"""
+        return list(self._services)
+
+
+class PolicySummaries(Mapping):
+    """The policy summaries by short ID. Looking up a policy only reads the shard of its service."""
+
+    def __init__(self, service_definitions: ServiceShards, policy_services: dict):
+        self.service_definitions = service_definitions
+        self.policy_services = policy_services
+
+    def __getitem__(self, short_id: str) -> dict:
+        return self.service_definitions[self.policy_services[short_id]][short_id]
+
+    def __iter__(self):
+        return iter(self.policy_services)
+
+    def __len__(self) -> int:
+        return len(self.policy_services)
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return {_intern(key): _intern(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_intern(item) for item in value]
+    return value
+
+
+def write_compact_catalog(iam_definition: dict, path: str = COMPACT_IAM_DEFINITION_PATH):
+    """Write the catalog built by create_azure_builtin_definition() in the compact format"""
+    service_definitions = _intern(iam_definition["service_definitions"])
+    policy_contents = {
+        short_id: policy_details.get("policy_content")
+        for short_id, policy_details in iam_definition["policy_definitions"].items()
+    }
+    content_sha256 = write_policy_content_store(policy_contents, get_policy_contents_path(path))
+
+    shard_directory = get_shard_directory(path)
+    os.makedirs(shard_directory, exist_ok=True)
+    # Services that were removed upstream shouldn't leave their shard behind
+    for file_name in os.listdir(shard_directory):
+        if file_name.endswith(".pickle"):
+            os.remove(os.path.join(shard_directory, file_name))
+    shard_file_names = {}
+    for service_name, service_policies in service_definitions.items():
+        shard_file_name = get_shard_file_name(service_name)
+        if shard_file_name in shard_file_names.values():
+            raise Exception(f"The shard file name {shard_file_name} of {service_name} is used by another service")
+        shard_file_names[service_name] = shard_file_name
+        _dump(
+            dict(content_sha256=content_sha256, policies=service_policies),
+            os.path.join(shard_directory, shard_file_name)
+        )
+
+    # The same order and precedence as PolicyCatalog uses when it indexes a JSON catalog
+    policy_services = {}
+    policy_summaries = {}
+    for service_name, service_policies in service_definitions.items():
+        for short_id, policy_details in service_policies.items():
+            policy_services[short_id] = service_name
+            policy_summaries[short_id] = policy_details
+    display_name_index = {}
+    for short_id, policy_details in policy_summaries.items():
+        display_name_index.setdefault(policy_details.get("display_name"), short_id)
+    _dump(
+        dict(
+            content_sha256=content_sha256,
+            shard_directory=os.path.basename(shard_directory),
+            shard_file_names=shard_file_names,
+            policy_services=policy_services,
+            display_name_index=display_name_index,
+            policy_table=PolicyTable.from_service_definitions(service_definitions).to_dict(),
+        ),
+        path
+    )
+
+
+def read_compact_catalog(path: str = COMPACT_IAM_DEFINITION_PATH) -> CompactCatalog:
+    """
+    Read the top level file of a compact catalog. The service shards and the policy contents are read when they are
+    first used.
+    """
+    payload = _load(path)
+    content_sha256 = payload["content_sha256"]
+    service_definitions = ServiceShards(
+        directory=os.path.join(os.path.dirname(path), payload["shard_directory"]),
+        shard_file_names=payload["shard_file_names"],
+        content_sha256=content_sha256,
+    )
+    return CompactCatalog(
+        service_definitions=service_definitions,
+        policy_summaries=PolicySummaries(service_definitions, payload["policy_services"]),
+        policy_contents=PolicyContentStore(get_policy_contents_path(path), content_sha256=content_sha256),
+        display_name_index=payload["display_name_index"],
+        policy_table=PolicyTable.from_dict(payload["policy_table"]),
+    )
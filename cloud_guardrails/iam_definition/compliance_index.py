@@ -0,0 +1,78 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+On-demand access to the compliance benchmark data that is built by update_compliance_data.py
+"""
+import os
+import json
+import logging
+import threading
+from cloud_guardrails.shared import utils
+
+logger = logging.getLogger(__name__)
+
+COMPLIANCE_DATA_PATH = os.path.join(utils.DATA_FILE_DIRECTORY, "compliance-data.json")
+
+
+def display_name_key(display_name: str) -> str:
+    """A looser version of the display name, so small wording differences between the docs and the catalog still match"""
+    return utils.strip_special_characters(utils.normalize_display_name_string(display_name)).lower()
+
+
+class ComplianceIndex:
+    """
+    Loads compliance-data.json the first time it is used and indexes it by policy ID.
+
+    The display name is kept as a secondary key for entries whose policy ID is not in the catalog.
+    """
+
+    def __init__(self, path: str = COMPLIANCE_DATA_PATH):
+        self.path = path
+        self._by_policy_id = None
+        self._by_display_name = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._by_policy_id is None:
+                self._read()
+
+    def _read(self):
+        logger.debug("Loading the compliance data from %s", self.path)
+        with open(self.path, "r") as file:
+            compliance_data = json.load(file)
+        by_policy_id = {}
+        by_display_name = {}
+        for display_name, compliance_metadata in compliance_data.items():
+            policy_id = compliance_metadata.get("policy_id")
+            if policy_id:
+                by_policy_id.setdefault(policy_id, compliance_metadata)
+            by_display_name.setdefault(display_name, compliance_metadata)
+            by_display_name.setdefault(display_name_key(display_name), compliance_metadata)
+        self._by_display_name = by_display_name
+        self._by_policy_id = by_policy_id
+
+    def get(self, policy_id: str, display_name: str = None) -> dict:
+        """Get the compliance metadata of a policy by its short ID, falling back to its display name"""
+        if self._by_policy_id is None:
+            self._load()
+        compliance_metadata = self._by_policy_id.get(policy_id)
+        if not compliance_metadata and display_name:
+            compliance_metadata = self._by_display_name.get(display_name)
+            if not compliance_metadata:
+                compliance_metadata = self._by_display_name.get(display_name_key(display_name))
+        return compliance_metadata
+
+
+_compliance_index = None
+
+
+def get_compliance_index() -> ComplianceIndex:
+    """Return the compliance index shared by the whole process, creating it on first use"""
+    global _compliance_index
+    if _compliance_index is None:
+        _compliance_index = ComplianceIndex()
+    return _compliance_index
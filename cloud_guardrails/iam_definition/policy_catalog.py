@@ -0,0 +1,204 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+On-demand access to the IAM definition catalog that is built by update_iam_definition.py
+"""
+import os
+import json
+import logging
+import threading
+from cloud_guardrails.shared import utils
+from cloud_guardrails.iam_definition.policy_definition import PolicyDefinition
+from cloud_guardrails.iam_definition.policy_table import PolicyTable
+from cloud_guardrails.iam_definition.compact_catalog import COMPACT_IAM_DEFINITION_PATH, is_compact_catalog, \
+    read_compact_catalog
+
+logger = logging.getLogger(__name__)
+
+IAM_DEFINITION_PATH = os.path.join(utils.DATA_FILE_DIRECTORY, "iam-definition.json")
+
+
+def get_default_iam_definition_path() -> str:
+    """The compact catalog if it has been built, otherwise the JSON one"""
+    if os.path.exists(COMPACT_IAM_DEFINITION_PATH):
+        return COMPACT_IAM_DEFINITION_PATH
+    return IAM_DEFINITION_PATH
+
+
+class PolicyCatalog:
+    """
+    Loads the catalog the first time it is used instead of at import time.
+
+    The per-policy summaries (the service_definitions entries) are kept as the lookup table. The full policy_content
+    is split off from the summaries and is only handed out when a caller asks for a specific policy. With the compact
+    catalog, each service's summaries are only read when that service is used.
+    """
+
+    def __init__(self, path: str = None):
+        # Either format can be passed in; the file itself says which one it is
+        self.path = path or get_default_iam_definition_path()
+        self._service_definitions = None
+        self._policy_summaries = None
+        self._policy_contents = None
+        self._display_name_index = None
+        self._normalized_display_name_index = None
+        self._precomputed_display_name_index = None
+        self._policy_table = None
+        self._service_names = None
+        self._service_name_set = None
+        # Only one thread reads the file, even if several ask for the catalog at once
+        self._lock = threading.RLock()
+
+    def _load(self):
+        with self._lock:
+            if self._service_definitions is None:
+                self._read()
+
+    def _read(self):
+        logger.debug("Loading the IAM definition from %s", self.path)
+        if is_compact_catalog(self.path):
+            # The services are only read from their shards when they are used
+            compact_catalog = read_compact_catalog(self.path)
+            service_definitions = compact_catalog.service_definitions
+            policy_summaries = compact_catalog.policy_summaries
+            policy_contents = compact_catalog.policy_contents
+            self._precomputed_display_name_index = compact_catalog.display_name_index
+            self._policy_table = compact_catalog.policy_table
+        else:
+            with open(self.path, "r") as file:
+                iam_definition = json.load(file)
+            service_definitions = iam_definition["service_definitions"]
+            # policy_definitions duplicates the service_definitions entries, so only hold on to the policy_content
+            policy_contents = {}
+            for short_id, policy_details in iam_definition["policy_definitions"].items():
+                policy_contents[short_id] = policy_details.get("policy_content")
+            policy_summaries = {}
+            for service_name, service_policies in service_definitions.items():
+                for short_id, policy_details in service_policies.items():
+                    policy_summaries[short_id] = policy_details
+            add_missing_summary_fields(policy_summaries=policy_summaries, policy_contents=policy_contents)
+        # Publish everything at the end, so other threads never see a partially loaded catalog
+        self._policy_contents = policy_contents
+        self._policy_summaries = policy_summaries
+        self._service_definitions = service_definitions
+
+    @property
+    def service_definitions(self) -> dict:
+        """The policy summaries, sorted by service"""
+        if self._service_definitions is None:
+            self._load()
+        return self._service_definitions
+
+    @property
+    def policy_definitions(self) -> dict:
+        """The policy summaries, keyed by the short ID of the policy"""
+        if self._policy_summaries is None:
+            self._load()
+        return self._policy_summaries
+
+    def _ensure_service_names(self):
+        """Sort the service names and build the set used by is_supported_service, once"""
+        if self._service_names is None:
+            service_names = tuple(sorted(self.service_definitions.keys()))
+            self._service_name_set = frozenset(service_names)
+            self._service_names = service_names
+
+    @property
+    def service_names(self) -> tuple:
+        """The services in the catalog, sorted. It's a tuple so that callers can't change the shared copy."""
+        self._ensure_service_names()
+        return self._service_names
+
+    @property
+    def policy_table(self) -> PolicyTable:
+        """The policy summaries as columns. The compact catalog stores them, otherwise they are built on first use."""
+        if self._service_definitions is None:
+            self._load()
+        if self._policy_table is None:
+            with self._lock:
+                if self._policy_table is None:
+                    self._policy_table = PolicyTable.from_service_definitions(self.service_definitions)
+        return self._policy_table
+
+    def is_supported_service(self, service_name: str) -> bool:
+        self._ensure_service_names()
+        return service_name in self._service_name_set
+
+    def policy_summary(self, policy_id: str) -> dict:
+        """Get the summary of a single policy, without the policy_content"""
+        return self.policy_definitions.get(policy_id)
+
+    def policy_content(self, policy_id: str) -> dict:
+        """Get the full policy definition JSON of a single policy"""
+        if self._policy_contents is None:
+            self._load()
+        return self._policy_contents.get(policy_id)
+
+    def _build_display_name_index(self):
+        if self._policy_summaries is None:
+            self._load()
+        if self._precomputed_display_name_index is not None:
+            # The compact catalog comes with the index, so none of the service shards need to be read
+            display_name_index = self._precomputed_display_name_index
+            normalized_display_name_index = {}
+            for display_name, short_id in display_name_index.items():
+                normalized_display_name_index.setdefault(utils.normalize_display_name_string(display_name), short_id)
+            self._normalized_display_name_index = normalized_display_name_index
+            self._display_name_index = display_name_index
+            return
+        display_name_index = {}
+        normalized_display_name_index = {}
+        for short_id, policy_details in self.policy_definitions.items():
+            display_name = policy_details.get("display_name")
+            # The first policy with a given display name wins, same as a linear scan would
+            display_name_index.setdefault(display_name, short_id)
+            normalized_display_name_index.setdefault(
+                utils.normalize_display_name_string(display_name), short_id
+            )
+        # Publish the indexes only once they are complete, so other threads never see a partial index
+        self._normalized_display_name_index = normalized_display_name_index
+        self._display_name_index = display_name_index
+
+    def get_policy_id_by_display_name(self, display_name: str) -> str:
+        """Look up the short ID of a policy by its display name, with or without the '[Preview]: ' prefix"""
+        if self._display_name_index is None:
+            self._build_display_name_index()
+        policy_id = self._display_name_index.get(display_name)
+        if not policy_id:
+            policy_id = self._normalized_display_name_index.get(
+                utils.normalize_display_name_string(display_name)
+            )
+        return policy_id
+
+
+def add_missing_summary_fields(policy_summaries: dict, policy_contents: dict):
+    """Catalogs built by older versions don't have every precomputed field, so compute those from the policy_content"""
+    for short_id, policy_details in policy_summaries.items():
+        if "deny_effect_value" in policy_details and "mode" in policy_details:
+            continue
+        policy_definition = PolicyDefinition(
+            policy_content=policy_contents.get(short_id),
+            service_name=policy_details.get("service_name"),
+            file_name=policy_details.get("file_name"),
+        )
+        policy_details["id"] = policy_definition.id
+        policy_details["deploy_prefixed"] = policy_definition.deploy_prefixed
+        policy_details["deny_effect_value"] = policy_definition.deny_effect_value
+        policy_details["mode"] = policy_definition.properties.mode
+        policy_details["category"] = policy_definition.category
+        policy_details["version"] = policy_definition.properties.version
+        policy_details["preview"] = bool(policy_definition.properties.preview)
+
+
+_policy_catalog = None
+
+
+def get_policy_catalog() -> PolicyCatalog:
+    """Return the catalog shared by the whole process, creating it on first use"""
+    global _policy_catalog
+    if _policy_catalog is None:
+        _policy_catalog = PolicyCatalog()
+    return _policy_catalog
@@ -0,0 +1,117 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+The policy_content of every policy, stored one JSON document per line, with an index of byte offsets by short ID.
+
+The file is memory mapped, so looking up a policy only parses that policy's line, and processes that read the same
+file share it through the OS page cache.
+"""
+import os
+import json
+import mmap
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+
+def get_index_path(path: str) -> str:
+    return f"{path}.index"
+
+
+def write_policy_content_store(policy_contents: dict, path: str) -> str:
+    """
+    Write the policy contents as JSON lines, and the offset index next to them.
+
+    :param policy_contents: The policy_content of each policy, by short ID
+    :return: The sha256 of the JSON lines. It is also in the index, so a catalog can record which store it goes with.
+    """
+    records = {}
+    offset = 0
+    sha256 = hashlib.sha256()
+    with open(path, "wb") as file:
+        for short_id, policy_content in policy_contents.items():
+            line = json.dumps(policy_content, separators=(",", ":")).encode("utf-8") + b"\n"
+            file.write(line)
+            sha256.update(line)
+            records[short_id] = [offset, len(line) - 1]
+            offset += len(line)
+    content_sha256 = sha256.hexdigest()
+    index = dict(schema_version=SCHEMA_VERSION, content_sha256=content_sha256, records=records)
+    with open(get_index_path(path), "w") as file:
+        json.dump(index, file, separators=(",", ":"))
+    return content_sha256
+
+
+class PolicyContentStore:
+    """Read-only access to the policy contents written by write_policy_content_store(). Opens the files on first use."""
+
+    def __init__(self, path: str, content_sha256: str = None):
+        self.path = path
+        # The store the catalog was written with. Checked against the index, not by hashing the whole file.
+        self.content_sha256 = content_sha256
+        self._records = None
+        self._mmap = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        with self._lock:
+            if self._records is not None:
+                return
+            logger.debug("Opening the policy content store %s", self.path)
+            with open(get_index_path(self.path), "r") as file:
+                index = json.load(file)
+            if index.get("schema_version") != SCHEMA_VERSION:
+                raise Exception(
+                    f"{self.path} has schema version {index.get('schema_version')}, but this version of "
+                    f"cloud-guardrails reads version {SCHEMA_VERSION}. Run update_iam_definition.py to rebuild it."
+                )
+            if self.content_sha256 and index.get("content_sha256") != self.content_sha256:
+                raise Exception(
+                    f"{self.path} was not built together with the catalog. Run update_iam_definition.py to rebuild it."
+                )
+            if os.path.getsize(self.path):
+                with open(self.path, "rb") as file:
+                    self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._records = index.get("records")
+
+    @property
+    def records(self) -> dict:
+        """[offset, length] of each policy's line, by short ID"""
+        if self._records is None:
+            self._open()
+        return self._records
+
+    def get(self, short_id: str, default=None) -> dict:
+        record = self.records.get(short_id)
+        if record is None:
+            return default
+        offset, length = record
+        return json.loads(self._mmap[offset:offset + length])
+
+    def __getitem__(self, short_id: str) -> dict:
+        if short_id not in self.records:
+            raise KeyError(short_id)
+        return self.get(short_id)
+
+    def __contains__(self, short_id: str) -> bool:
+        return short_id in self.records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._records = None
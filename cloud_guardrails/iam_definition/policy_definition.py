@@ -33,6 +33,7 @@ class PolicyDefinition:
         self.display_name = self.properties.display_name
         self.parameters = self.properties.parameters
         self.policy_rule = self.properties.policy_rule
+        self._allowed_effects = None
 
     def __repr__(self):
         return json.dumps(self.json())
@@ -142,59 +143,42 @@ class PolicyDefinition:
 
     @property
     def allowed_effects(self) -> list:
+        """The lowercase effects the policy can apply. Classified once per policy and cached on the instance."""
+        if self._allowed_effects is None:
+            self._allowed_effects = self._classify_effects()
+        return list(self._allowed_effects)
+
+    def _classify_effects(self) -> list:
+        """Walk the 'then' block of the policy rule to find the effects, instead of searching the stringified rule"""
         allowed_effects = []
-        if self.properties.parameters.get("effect", None):
-            allowed_effects = self.properties.parameters.get("effect", None).allowed_values
-        # # try:
-        # #     effect_parameter = self.properties.parameters.get("effect")
-        #
-        # # This just means that there is no effect in there.
-        # except AttributeError as error:
-        #     # Weird cases: where deployifnotexists or modify are in the body of the policy definition instead of the "effect" parameter
-        #     # In this case, we have an 'if' statement that greps for deployifnotexists in str(policy_definition.lower())
-        #     # logger.debug(error)
-        #     logger.debug(f"AttributeError for policy name: {self.properties.display_name}. {error}")
-
-        # Handle cases where the effect is not in there.
-        then_effect = self.properties.policy_rule.get("then").get("effect")
-        if "parameters" not in then_effect:
+        effect_parameter = self.properties.parameters.get("effect", None)
+        if effect_parameter and effect_parameter.allowed_values:
+            allowed_effects.extend(effect_parameter.allowed_values)
+
+        then_block = self.properties.policy_rule.get("then", {})
+        # Handle cases where the effect is hardcoded instead of being a reference like "[parameters('effect')]"
+        then_effect = then_block.get("effect")
+        if isinstance(then_effect, str) and not then_effect.startswith("["):
             allowed_effects.append(then_effect)
 
-        if "deployifnotexists" in str(
-            self.properties.policy_rule
-        ).lower() and "modify" in str(self.properties.policy_rule).lower():
-            logger.debug(
-                f"Found BOTH deployIfNotExists and modify in the policy content for the policy: {self.display_name}"
-            )
-            allowed_effects.append("deployIfNotExists")
-            allowed_effects.append("modify")
-        elif "deployifnotexists" in str(self.properties.policy_rule).lower():
-            logger.debug(
-                f"Found deployIfNotExists in the policy content for the policy: {self.display_name}"
-            )
-            allowed_effects.append("deployIfNotExists")
-        elif "modify" in str(self.properties.policy_rule).lower():
-            logger.debug(
-                f"Found Modify in the policy content for the policy: {self.display_name}"
-            )
-            allowed_effects.append("modify")
-        elif "append" in str(self.properties.policy_rule).lower():
-            logger.debug(
-                f"Found append in the policy content for the policy: {self.display_name}"
-            )
+        # Weird cases: where deployIfNotExists, modify or append are only evident from the shape of the 'details'
+        # block. Looking at the structure avoids false positives from field names that contain those words.
+        details = then_block.get("details")
+        if isinstance(details, dict):
+            if "deployment" in details:
+                logger.debug("Found deployIfNotExists details in the policy content for the policy: %s", self.display_name)
+                allowed_effects.append("deployIfNotExists")
+            if "operations" in details:
+                logger.debug("Found modify operations in the policy content for the policy: %s", self.display_name)
+                allowed_effects.append("modify")
+        elif isinstance(details, list):
+            # The append effect takes a list of field/value pairs as its details
+            logger.debug("Found append details in the policy content for the policy: %s", self.display_name)
             allowed_effects.append("append")
-        else:
-            pass
-            # logger.debug(f"No deploy effect found for {self.display_name}")
-
-        # Normalize names
-        if allowed_effects:
-            lowercase_allowed_effects = [x.lower() for x in allowed_effects]
-            # Remove duplicates
-            lowercase_allowed_effects = list(dict.fromkeys(lowercase_allowed_effects))
-            return lowercase_allowed_effects
-        else:
-            return []
+
+        # Normalize names and remove duplicates
+        lowercase_allowed_effects = [x.lower() for x in allowed_effects]
+        return list(dict.fromkeys(lowercase_allowed_effects))
 
     @property
     def audit_only(self) -> bool:
@@ -208,18 +192,38 @@ class PolicyDefinition:
     @property
     def modifies_resources(self) -> bool:
         # Effects: https://docs.microsoft.com/en-us/azure/governance/policy/concepts/effects
+        allowed_effects = self.allowed_effects
         if (
-            "append" in self.allowed_effects
-            or "modify" in self.allowed_effects
-            or "deployifnotexists" in self.allowed_effects
+            "append" in allowed_effects
+            or "modify" in allowed_effects
+            or "deployifnotexists" in allowed_effects
         ):
             logger.debug(
-                f"{self.service_name} - modifies_resources: The policy definition {self.display_name} has the allowed_effects: {self.allowed_effects}"
+                "%s - modifies_resources: The policy definition %s has the allowed_effects: %s",
+                self.service_name, self.display_name, allowed_effects
             )
             return True
         else:
             return False
 
+    @property
+    def deny_effect_value(self) -> str:
+        """The value that sets the effect parameter to Deny in enforcement mode, or None if Deny is not allowed"""
+        result = None
+        effect_parameter = self.parameters.get("effect", None)
+        if effect_parameter and effect_parameter.allowed_values:
+            # It could be Capitalized or lowercase in allowed_values
+            if "Deny" in effect_parameter.allowed_values:
+                result = "Deny"
+            if "deny" in effect_parameter.allowed_values:
+                result = "deny"
+        return result
+
+    @property
+    def deploy_prefixed(self) -> bool:
+        """Some Policies with Modify capabilities don't have an Effect - only way to detect them is to see if the name starts with 'Deploy'"""
+        return self.display_name.startswith("Deploy ")
+
     @property
     def is_deprecated(self) -> bool:
         """Determine whether the policy is deprecated or not"""
@@ -0,0 +1,361 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+A small query language over the policy catalog, compiled to a plan of bitset operations on the PolicyTable.
+
+Examples:
+
+    service = "Key Vault" and effect = deny
+    service in ("Key Vault", Storage) and not params_required
+    category ~ kubernetes and version >= 2 and not preview
+    parameter = effect or mode = Indexed
+    name ~ "private link"
+
+Comparisons are written as <field> <operator> <value>. Values that contain spaces or parentheses are quoted with
+double or single quotes. Keywords, fields and values are not case sensitive.
+
+* service, effect, parameter, mode, category, version: =, !=, ~ (contains), in (...). The version can also be
+  compared with <, <=, > and >=, number by number, so "version >= 1.2" matches 1.10.0 but not 1.1.0-preview.
+* name: =, !=, ~ against the display name.
+* The boolean attributes are used on their own: no_params, params_optional, params_required, audit_only, preview,
+  deprecated, modifies_resources, deploy_prefixed.
+
+Combine them with and, or, not and parentheses. 'and' binds tighter than 'or'.
+
+The indexed fields are resolved by looking up the bitsets of the matching values, so a comparison costs one lookup per
+distinct value, not one per policy. Only 'name' reads the policies one by one, and only the ones that the rest of an
+'and' has not ruled out already.
+"""
+import re
+import logging
+import threading
+from abc import ABC, abstractmethod
+from cloud_guardrails.iam_definition.policy_table import PolicyTable, BOOLEAN_COLUMNS, INDEXED_COLUMNS, count
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+        |(?P<operator><=|>=|!=|=|<|>|~)
+        |(?P<punctuation>[(),])
+        |(?P<word>[^\s()=!<>~,"']+)
+    )""",
+    re.VERBOSE,
+)
+_KEYWORDS = ("and", "or", "not", "in")
+_FIELD_ALIASES = {"deprecated": "is_deprecated", "display_name": "name", "effects": "effect", "parameters": "parameter"}
+_FLAGS = BOOLEAN_COLUMNS
+_FIELDS = INDEXED_COLUMNS + ("name",)
+_VERSION_OPERATORS = ("<", "<=", ">", ">=")
+
+
+def _version_key(version: str) -> tuple:
+    """The leading numbers of a version, like (1, 2, 0) for '1.2.0-preview'. None if it doesn't start with a number."""
+    match = re.match(r"\d+(?:\.\d+)*", version.strip())
+    if not match:
+        return None
+    return tuple(int(number) for number in match.group(0).split("."))
+
+
+def _compare_versions(left: tuple, operator: str, right: tuple) -> bool:
+    # Pad both sides, so 2 and 2.0.0 are the same version
+    length = max(len(left), len(right))
+    left = left + (0,) * (length - len(left))
+    right = right + (0,) * (length - len(right))
+    if operator == "<":
+        return left < right
+    if operator == "<=":
+        return left <= right
+    if operator == ">":
+        return left > right
+    return left >= right
+
+
+class _Node(ABC):
+    # Lower is cheaper. 'and' evaluates its cheapest operands first, so the expensive ones see fewer rows.
+    cost = 0
+
+    @abstractmethod
+    def evaluate(self, table: PolicyTable, rows: int) -> int:
+        """The subset of rows that match"""
+
+
+class _Flag(_Node):
+    def __init__(self, column: str):
+        self.column = column
+
+    def evaluate(self, table: PolicyTable, rows: int) -> int:
+        return rows & table.column(self.column)
+
+    def __str__(self):
+        return self.column
+
+
+class _Lookup(_Node):
+    """A comparison against an indexed field, answered from the bitsets of the matching values"""
+    cost = 1
+
+    def __init__(self, field: str, operator: str, values: list):
+        self.field = field
+        self.operator = operator
+        self.values = values
+        if operator in _VERSION_OPERATORS:
+            self._version_keys = [_version_key(value) for value in values]
+        else:
+            self._lowercase_values = [value.lower() for value in values]
+
+    def matches(self, value: str) -> bool:
+        if self.operator in _VERSION_OPERATORS:
+            version_key = _version_key(value)
+            return version_key is not None and _compare_versions(version_key, self.operator, self._version_keys[0])
+        value = value.lower()
+        if self.operator == "~":
+            return any(expected in value for expected in self._lowercase_values)
+        return value in self._lowercase_values
+
+    def evaluate(self, table: PolicyTable, rows: int) -> int:
+        mask = 0
+        for value, value_mask in table.index(self.field).items():
+            if self.matches(value):
+                mask |= value_mask
+        return rows & mask
+
+    def __str__(self):
+        if len(self.values) > 1:
+            return f"{self.field} in ({', '.join(repr(value) for value in self.values)})"
+        return f"{self.field} {self.operator} {self.values[0]!r}"
+
+
+class _Scan(_Node):
+    """A comparison against the display name, checked one policy at a time"""
+    cost = 2
+
+    def __init__(self, operator: str, value: str):
+        self.operator = operator
+        self.value = value.lower()
+
+    def evaluate(self, table: PolicyTable, rows: int) -> int:
+        mask = 0
+        for row in table.rows(rows):
+            display_name = table.display_names[row].lower()
+            if self.operator == "~":
+                matched = self.value in display_name
+            else:
+                matched = display_name == self.value or display_name.replace("[preview]: ", "") == self.value
+            if matched:
+                mask |= 1 << row
+        return mask
+
+    def __str__(self):
+        return f"name {self.operator} {self.value!r}"
+
+
+class _Not(_Node):
+    def __init__(self, operand: _Node):
+        self.operand = operand
+        self.cost = operand.cost
+
+    def evaluate(self, table: PolicyTable, rows: int) -> int:
+        return rows & ~self.operand.evaluate(table, rows)
+
+    def __str__(self):
+        return f"not {self.operand}"
+
+
+class _And(_Node):
+    def __init__(self, operands: list):
+        # sorted() is stable, so operands of the same cost keep the order they were written in
+        self.operands = sorted(operands, key=lambda operand: operand.cost)
+        self.cost = max(operand.cost for operand in operands)
+
+    def evaluate(self, table: PolicyTable, rows: int) -> int:
+        for operand in self.operands:
+            rows = operand.evaluate(table, rows)
+            if not rows:
+                break
+        return rows
+
+    def __str__(self):
+        return "(" + " and ".join(str(operand) for operand in self.operands) + ")"
+
+
+class _Or(_Node):
+    def __init__(self, operands: list):
+        self.operands = operands
+        self.cost = max(operand.cost for operand in operands)
+
+    def evaluate(self, table: PolicyTable, rows: int) -> int:
+        mask = 0
+        for operand in self.operands:
+            # Rows that already matched don't have to be checked again
+            mask |= operand.evaluate(table, rows & ~mask)
+        return mask
+
+    def __str__(self):
+        return "(" + " or ".join(str(operand) for operand in self.operands) + ")"
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = self._tokenize(text)
+        self.position = 0
+
+    def _tokenize(self, text: str) -> list:
+        tokens = []
+        position = 0
+        while position < len(text):
+            if text[position:].strip() == "":
+                break
+            match = _TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise Exception(f"Could not read the query at position {position}: {text[position:]!r}")
+            kind = match.lastgroup
+            value = match.group(kind)
+            start = match.start(kind)
+            if kind == "string":
+                value = re.sub(r"\\(.)", r"\1", value[1:-1])
+            elif kind == "word" and value.lower() in _KEYWORDS:
+                kind = "keyword"
+                value = value.lower()
+            tokens.append((kind, value, start))
+            position = match.end()
+        return tokens
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None, None, len(self.text)
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def _error(self, expected: str):
+        kind, value, position = self._peek()
+        found = "the end of the query" if kind is None else repr(value)
+        return Exception(f"Expected {expected} at position {position} of the query, but found {found}")
+
+    def _accept(self, kind: str, value: str = None) -> bool:
+        token_kind, token_value, _ = self._peek()
+        if token_kind == kind and (value is None or token_value == value):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self) -> _Node:
+        if not self.tokens:
+            raise Exception("The query is empty")
+        node = self._or()
+        if self._peek()[0] is not None:
+            raise self._error("'and', 'or' or ')'")
+        return node
+
+    def _or(self) -> _Node:
+        operands = [self._and()]
+        while self._accept("keyword", "or"):
+            operands.append(self._and())
+        return operands[0] if len(operands) == 1 else _Or(operands)
+
+    def _and(self) -> _Node:
+        operands = [self._not()]
+        while self._accept("keyword", "and"):
+            operands.append(self._not())
+        return operands[0] if len(operands) == 1 else _And(operands)
+
+    def _not(self) -> _Node:
+        if self._accept("keyword", "not"):
+            return _Not(self._not())
+        return self._atom()
+
+    def _value(self) -> str:
+        kind, value, _ = self._peek()
+        if kind not in ("string", "word"):
+            raise self._error("a value")
+        self.position += 1
+        return value
+
+    def _atom(self) -> _Node:
+        if self._accept("punctuation", "("):
+            node = self._or()
+            if not self._accept("punctuation", ")"):
+                raise self._error("')'")
+            return node
+        kind, value, _ = self._peek()
+        if kind != "word":
+            raise self._error("a field name, 'not' or '('")
+        self.position += 1
+        field = value.lower()
+        field = _FIELD_ALIASES.get(field, field)
+        if field in _FLAGS:
+            return _Flag(field)
+        if field not in _FIELDS:
+            raise Exception(
+                f"Unknown field {value!r} in the query. Supported fields are: {', '.join(_FIELDS + _FLAGS)}"
+            )
+        if self._accept("keyword", "in"):
+            if not self._accept("punctuation", "("):
+                raise self._error("'(' after 'in'")
+            values = [self._value()]
+            while self._accept("punctuation", ","):
+                values.append(self._value())
+            if not self._accept("punctuation", ")"):
+                raise self._error("',' or ')'")
+            operator = "="
+        else:
+            kind, operator, _ = self._peek()
+            if kind != "operator":
+                raise self._error(f"an operator after {value!r}")
+            self.position += 1
+            values = [self._value()]
+        if operator in _VERSION_OPERATORS and field != "version":
+            raise Exception(f"The {operator} operator only works with the version field, not {field}")
+        if operator in _VERSION_OPERATORS and _version_key(values[0]) is None:
+            raise Exception(f"{values[0]!r} is not a version number")
+        # != is compiled to 'not ='
+        node_operator = "=" if operator == "!=" else operator
+        if field == "name":
+            node = _Or([_Scan(node_operator, value) for value in values]) if len(values) > 1 \
+                else _Scan(node_operator, values[0])
+        else:
+            node = _Lookup(field, node_operator, values)
+        if operator == "!=":
+            node = _Not(node)
+        return node
+
+
+class PolicyQuery:
+    """A compiled query. The bitset it selects is cached for each PolicyTable it is evaluated against."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.plan = _Parser(text).parse()
+        # The table the query was last evaluated against, and the bitset it selected
+        self._table = None
+        self._mask = None
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return str(self.plan)
+
+    def __repr__(self):
+        return f"PolicyQuery({self.text!r})"
+
+    def mask(self, table: PolicyTable) -> int:
+        """The bitset of the rows of the table that match the query"""
+        with self._lock:
+            if self._table is not table:
+                self._mask = self.plan.evaluate(table, table.all)
+                self._table = table
+                logger.debug("The query %s matches %d policies", self, count(self._mask))
+            return self._mask
+
+
+def compile_query(text: str) -> PolicyQuery:
+    """Parse a query. Raises an Exception that says what is wrong and where if it is not valid."""
+    return PolicyQuery(text)
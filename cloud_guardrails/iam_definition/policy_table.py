@@ -0,0 +1,196 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+The policy summaries as columns, so that policies are selected with a few mask operations instead of a Python
+predicate per policy.
+
+Each row is a policy, in catalog order. Every boolean attribute is a bitset: a Python int where bit N is set if row N
+has that attribute. The indexed attributes, like the service or the effects, have a bitset for each of their values.
+Python ints have no size limit and their bitwise operators run in C over the whole number, so "params optional, audit
+only, in these services, not excluded" is a handful of and/or operations over the entire catalog.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+BOOLEAN_COLUMNS = (
+    "no_params", "params_optional", "params_required", "audit_only", "is_deprecated", "modifies_resources",
+    "deploy_prefixed", "preview"
+)
+# The attributes with a bitset per value. Effects and parameter names are lists, so a policy can be in several bitsets.
+INDEXED_COLUMNS = ("service", "effect", "parameter", "mode", "category", "version")
+
+
+def mask_of(rows) -> int:
+    """The bitset with the bits of the given rows set"""
+    mask = 0
+    for row in rows:
+        mask |= 1 << row
+    return mask
+
+
+def count(mask: int) -> int:
+    """The number of rows in a bitset"""
+    return bin(mask).count("1")
+
+
+class PolicyTable:
+    """
+    Read-only columns over the policy summaries.
+
+    short_ids, display_names and service_codes have one entry per row. service_codes index into service_names, which
+    are the services in catalog order. masks has the bitset of each boolean column, and indexes has the bitset of each
+    value of each indexed column. Effects are lower case.
+    """
+
+    def __init__(
+            self,
+            short_ids: list,
+            display_names: list,
+            service_names: tuple,
+            service_codes: list,
+            masks: dict,
+            indexes: dict,
+    ):
+        self.short_ids = short_ids
+        self.display_names = display_names
+        self.service_names = tuple(service_names)
+        self.service_codes = service_codes
+        self.masks = masks
+        self.indexes = indexes
+        self.all = (1 << len(short_ids)) - 1
+        # {(service name, short ID): row}, built on first use
+        self._rows_by_policy = None
+
+    @classmethod
+    def from_service_definitions(cls, service_definitions: dict) -> "PolicyTable":
+        """Build the columns from the service_definitions of the catalog"""
+        short_ids = []
+        display_names = []
+        service_names = []
+        service_codes = []
+        rows = {column: [] for column in BOOLEAN_COLUMNS}
+        rows["skipped"] = []
+        index_rows = {column: {} for column in INDEXED_COLUMNS}
+        row = 0
+        for service_code, (service_name, service_policies) in enumerate(service_definitions.items()):
+            service_names.append(service_name)
+            index_rows["service"][service_name] = []
+            for short_id, policy_details in service_policies.items():
+                display_name = policy_details.get("display_name")
+                short_ids.append(short_id)
+                display_names.append(display_name)
+                service_codes.append(service_code)
+                index_rows["service"][service_name].append(row)
+                for column in BOOLEAN_COLUMNS:
+                    if policy_details.get(column):
+                        rows[column].append(row)
+                # The policies that are never selected, whatever the config says. See is_policy_id_excluded.
+                if (
+                    display_name.startswith("[Deprecated]: ") or policy_details.get("is_deprecated")
+                    or policy_details.get("modifies_resources") or policy_details.get("deploy_prefixed")
+                ):
+                    rows["skipped"].append(row)
+                for effect in policy_details.get("allowed_effects") or []:
+                    index_rows["effect"].setdefault(effect.lower(), []).append(row)
+                for parameter_name in policy_details.get("parameter_names") or []:
+                    index_rows["parameter"].setdefault(parameter_name, []).append(row)
+                for column in ("mode", "category", "version"):
+                    if policy_details.get(column) is not None:
+                        index_rows[column].setdefault(str(policy_details.get(column)), []).append(row)
+                row += 1
+        return cls(
+            short_ids=short_ids,
+            display_names=display_names,
+            service_names=tuple(service_names),
+            service_codes=service_codes,
+            masks={column: mask_of(column_rows) for column, column_rows in rows.items()},
+            indexes={
+                column: {value: mask_of(value_rows) for value, value_rows in column_rows.items()}
+                for column, column_rows in index_rows.items()
+            },
+        )
+
+    def to_dict(self) -> dict:
+        """Plain values, so the table can be stored with the compact catalog"""
+        return dict(
+            short_ids=self.short_ids,
+            display_names=self.display_names,
+            service_names=list(self.service_names),
+            service_codes=self.service_codes,
+            masks=self.masks,
+            indexes=self.indexes,
+        )
+
+    @classmethod
+    def from_dict(cls, table: dict) -> "PolicyTable":
+        return cls(**table)
+
+    def __len__(self) -> int:
+        return len(self.short_ids)
+
+    def column(self, name: str) -> int:
+        """The bitset of a boolean column"""
+        mask = self.masks.get(name)
+        if mask is None:
+            raise Exception(f"The policy table does not have a column named {name}")
+        return mask
+
+    def index(self, name: str) -> dict:
+        """The bitset of each value of an indexed column"""
+        index = self.indexes.get(name)
+        if index is None:
+            raise Exception(f"The policy table does not have an index named {name}")
+        return index
+
+    @property
+    def skipped(self) -> int:
+        """Deprecated policies and policies that modify or deploy resources"""
+        return self.masks["skipped"]
+
+    def services(self, service_names: list) -> int:
+        """The rows of any of the services. Services that are not in the catalog match nothing."""
+        mask = 0
+        for service_name in service_names:
+            mask |= self.indexes["service"].get(service_name, 0)
+        return mask
+
+    def effects(self, effects: list) -> int:
+        """The rows that allow any of the effects, case insensitive"""
+        mask = 0
+        for effect in effects:
+            mask |= self.indexes["effect"].get(effect.lower(), 0)
+        return mask
+
+    def parameter_requirements(self, no_params: bool = True, params_optional: bool = True,
+                               params_required: bool = True) -> int:
+        """The rows in any of the requested parameter categories"""
+        mask = 0
+        if no_params:
+            mask |= self.masks["no_params"]
+        if params_optional:
+            mask |= self.masks["params_optional"]
+        if params_required:
+            mask |= self.masks["params_required"]
+        return mask
+
+    def row(self, service_name: str, short_id: str) -> int:
+        """The row of a policy, or None if it isn't in the table"""
+        if self._rows_by_policy is None:
+            self._rows_by_policy = {
+                (self.service_name(row), short_id): row for row, short_id in enumerate(self.short_ids)
+            }
+        return self._rows_by_policy.get((service_name, short_id))
+
+    def service_name(self, row: int) -> str:
+        return self.service_names[self.service_codes[row]]
+
+    @staticmethod
+    def rows(mask: int) -> list:
+        """The rows in a bitset, in catalog order"""
+        # Least significant bit first, without the '0b' prefix
+        bits = bin(mask)[:1:-1]
+        return [row for row, bit in enumerate(bits) if bit == "1"]
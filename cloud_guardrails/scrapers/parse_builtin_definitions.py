@@ -5,66 +5,249 @@
 # or https://opensource.org/licenses/BSD-3-Clause
 import os
 import json
-import copy
+import time
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from cloud_guardrails.shared import utils
 from cloud_guardrails.iam_definition.policy_definition import PolicyDefinition
-default_service_names = utils.get_service_names()
-default_service_names.sort()
+from cloud_guardrails.scrapers.policy_source import PolicySource, DirectoryPolicySource
 
+logger = logging.getLogger(__name__)
 
-def get_service_policy_files(service_policy_directory: str) -> list:
-    policy_files = [
-        f
-        for f in os.listdir(service_policy_directory)
-        if os.path.isfile(os.path.join(service_policy_directory, f))
-    ]
-    policy_files.sort()
-    return policy_files
+IAM_DEFINITION_MANIFEST_PATH = os.path.join(utils.DATA_FILE_DIRECTORY, "iam-definition-manifest.json")
+# Bump this when the parser changes what it stores for a policy, so the next build parses every file again
+MANIFEST_VERSION = 3
 
 
-def create_azure_builtin_definition() -> dict:
+def get_service_definition_entry(policy_definition: PolicyDefinition, policy_file_name: str) -> dict:
+    """The summary of a policy that goes in service_definitions. Each classification is only worked out once."""
+    allowed_effects = policy_definition.allowed_effects
+    no_params = policy_definition.no_params
+    params_optional = policy_definition.params_optional
+    return dict(
+        display_name=policy_definition.display_name,
+        short_id=policy_definition.name,
+        id=policy_definition.id,
+        service_name=policy_definition.service_name,
+        description=policy_definition.properties.description,
+        github_link=policy_definition.github_link,
+        file_name=policy_file_name,
+        allowed_effects=allowed_effects,
+        no_params=no_params,
+        params_optional=params_optional,
+        params_required=not (no_params or params_optional),
+        is_deprecated=policy_definition.is_deprecated,
+        audit_only=policy_definition.audit_only,
+        modifies_resources=policy_definition.modifies_resources,
+        deploy_prefixed=policy_definition.deploy_prefixed,
+        deny_effect_value=policy_definition.deny_effect_value,
+        parameter_names=policy_definition.parameter_names,
+        mode=policy_definition.properties.mode,
+        category=policy_definition.category,
+        version=policy_definition.properties.version,
+        preview=bool(policy_definition.properties.preview),
+    )
+
+
+def parse_policy_file(service_name: str, policy_file_name: str, policy_bytes: bytes) -> tuple:
+    """Parse one policy file. Returns (short_id, service_definition_entry, policy_content)."""
+    # json.loads detects the encoding of bytes, including a UTF-8 byte order mark
+    policy_content = json.loads(policy_bytes)
+    policy_definition = PolicyDefinition(
+        policy_content=policy_content, service_name=service_name, file_name=str(policy_file_name)
+    )
+    service_definition_entry = get_service_definition_entry(policy_definition, policy_file_name)
+    # Look up by unique ID, like "051cba44-2429-45b9-9649-46cec11c7119"
+    return policy_definition.name, service_definition_entry, policy_content
+
+
+def parse_service_policies(service_name: str, policy_files: list) -> list:
+    """
+    Hash and parse the policy files of one service.
+
+    :param policy_files: (file name, contents as bytes, known sha256 or None) tuples.
+    :return: (file name, sha256, parsed) tuples in the same order. parsed is the result of parse_policy_file(), or
+        None when the hash matches the known one and the file doesn't need to be parsed again.
+
+    This runs in the worker processes when the build is parallel, so it only takes and returns plain, picklable values.
+    """
+    results = []
+    for policy_file_name, policy_bytes, known_sha256 in policy_files:
+        sha256 = hashlib.sha256(policy_bytes).hexdigest()
+        if sha256 == known_sha256:
+            results.append((policy_file_name, sha256, None))
+        else:
+            results.append((policy_file_name, sha256, parse_policy_file(service_name, policy_file_name, policy_bytes)))
+    return results
+
+
+def _parse_service_policies_task(task: tuple) -> list:
+    return parse_service_policies(*task)
+
+
+def read_manifest(catalog_path: str, manifest_path: str = IAM_DEFINITION_MANIFEST_PATH) -> dict:
+    """The manifest written with the catalog at catalog_path, or None if there isn't a usable one"""
+    if not os.path.exists(manifest_path) or not os.path.exists(catalog_path):
+        return None
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        logger.info("The manifest %s is from another version of the parser; ignoring it", manifest_path)
+        return None
+    if manifest.get("catalog_sha256") != file_sha256(catalog_path):
+        logger.info("The catalog %s was changed after the manifest was written; ignoring the manifest", catalog_path)
+        return None
+    return manifest
+
+
+def write_manifest(manifest: dict, catalog_path: str, manifest_path: str = IAM_DEFINITION_MANIFEST_PATH):
+    """Write the manifest, tied to the catalog file that was just written"""
+    manifest["catalog_sha256"] = file_sha256(catalog_path)
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=4)
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def build_azure_builtin_definition(
+    jobs: int = 1, timings: dict = None, previous_results: dict = None, previous_manifest: dict = None,
+    source: PolicySource = None
+) -> tuple:
+    """
+    Build the IAM definition catalog from the azure-policy repository.
+
+    When the catalog and manifest from the last build are provided, only the files that were added or whose content
+    changed are parsed. The entries of the other files are taken from the previous catalog, and removed files are
+    dropped. The result is the same as a full build.
+
+    :param jobs: Number of processes that parse the policy files, one service at a time. 1 parses everything in this
+        process, and 0 uses one process per CPU. The result is the same either way.
+    :param timings: If provided, the seconds spent in each phase of the build are added to it.
+    :param previous_results: The catalog written by the last build.
+    :param previous_manifest: The manifest written with that catalog.
+    :param source: Where the policy files are read from. Defaults to the azure-policy submodule.
+    :return: The catalog, its manifest, and the number of added, changed, removed and unchanged files.
+    """
+    if timings is None:
+        timings = {}
+    if source is None:
+        source = DirectoryPolicySource()
+    if previous_results is None or previous_manifest is None:
+        previous_results = {"service_definitions": {}, "policy_definitions": {}}
+        previous_manifest = {}
+    previous_files = previous_manifest.get("files", {})
+
+    start = time.perf_counter()
+    # The catalog doesn't exist yet, so the services come from the azure-policy repository
+    service_names = source.service_names()
+    tasks = []
+    manifest_files = {}
+    # The files that don't need to be parsed again, with their hash
+    unchanged = {}
+    parsed_files = {}
+    for service_name in service_names:
+        policy_files = []
+        for policy_file_name in source.policy_files(service_name):
+            manifest_key = f"{service_name}/{policy_file_name}"
+            fingerprint = source.fingerprint(service_name, policy_file_name)
+            manifest_files[manifest_key] = dict(fingerprint=fingerprint)
+            previous_file = previous_files.get(manifest_key)
+            if previous_file and _previous_entries(previous_results, service_name, policy_file_name, previous_file):
+                if previous_file.get("fingerprint") == fingerprint:
+                    # The size and modification time (or the git blob) are the same, so don't even read the file
+                    unchanged[manifest_key] = previous_file.get("sha256")
+                    continue
+                policy_files.append((policy_file_name, previous_file.get("sha256")))
+            else:
+                policy_files.append((policy_file_name, None))
+        tasks.append((service_name, policy_files))
+    timings["list files"] = time.perf_counter() - start
+
+    def read_tasks():
+        # The files are read here and only parsed in the workers, so the source doesn't need to be shared with them
+        for service_name, policy_files in tasks:
+            contents = source.read_policy_files(service_name, [policy_file_name for policy_file_name, _ in policy_files])
+            yield service_name, [
+                (policy_file_name, contents[policy_file_name], known_sha256)
+                for policy_file_name, known_sha256 in policy_files
+            ]
+
+    start = time.perf_counter()
+    if jobs == 1:
+        parsed_services = [_parse_service_policies_task(task) for task in read_tasks()]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            # map() yields the results in the order of the tasks, whichever worker finishes first
+            parsed_services = list(executor.map(_parse_service_policies_task, read_tasks()))
+    for (service_name, policy_files), parsed_policies in zip(tasks, parsed_services):
+        for policy_file_name, sha256, parsed in parsed_policies:
+            manifest_key = f"{service_name}/{policy_file_name}"
+            if parsed is None:
+                unchanged[manifest_key] = sha256
+            else:
+                parsed_files[manifest_key] = parsed
+            manifest_files[manifest_key]["sha256"] = sha256
+    timings["parse policies"] = time.perf_counter() - start
+
+    start = time.perf_counter()
     results = {
         "service_definitions": {},
         "policy_definitions": {}
     }
-    for service_name in default_service_names:
-        # Get paths for all the policy files for that service
-        service_policy_directory = os.path.join(
-            utils.AZURE_POLICY_SERVICE_DIRECTORY, service_name
-        )
-        policy_files = get_service_policy_files(service_policy_directory)
+    changes = dict(added=0, changed=0, removed=0, unchanged=0)
+    for service_name in service_names:
         # Add the service to the service definitions
         results["service_definitions"][service_name] = {}
-
-        for policy_file_name in policy_files:
-            policy_content = utils.read_json_file(str(os.path.join(service_policy_directory, policy_file_name)))
-            policy_definition = PolicyDefinition(
-                policy_content=policy_content, service_name=service_name, file_name=str(policy_file_name)
-            )
-            # Look up by unique ID, like "051cba44-2429-45b9-9649-46cec11c7119"
-            short_id = policy_definition.name
-
-            # Add to service_definitions
-            service_definition_entry = dict(
-                display_name=policy_definition.display_name,
-                short_id=short_id,
-                service_name=policy_definition.service_name,
-                description=policy_definition.properties.description,
-                github_link=policy_definition.github_link,
-                file_name=policy_file_name,
-                allowed_effects=policy_definition.allowed_effects,
-                no_params=policy_definition.no_params,
-                params_optional=policy_definition.params_optional,
-                params_required=policy_definition.params_required,
-                is_deprecated=policy_definition.is_deprecated,
-                audit_only=policy_definition.audit_only,
-                modifies_resources=policy_definition.modifies_resources,
-                parameter_names=policy_definition.parameter_names,
+    # The files are in service order and then file name order, just like a full build
+    for manifest_key, manifest_file in manifest_files.items():
+        service_name, policy_file_name = manifest_key.split("/", 1)
+        if manifest_key in unchanged:
+            manifest_file["sha256"] = unchanged[manifest_key]
+            short_id, service_definition_entry, policy_content = _previous_entries(
+                previous_results, service_name, policy_file_name, previous_files.get(manifest_key)
             )
-            results["service_definitions"][service_name][short_id] = service_definition_entry
+            changes["unchanged"] += 1
+        else:
+            short_id, service_definition_entry, policy_content = parsed_files[manifest_key]
+            changes["changed" if manifest_key in previous_files else "added"] += 1
+        manifest_file["short_id"] = short_id
+        results["service_definitions"][service_name][short_id] = service_definition_entry
+        # The entry is only serialized, never changed, so a shallow copy is enough
+        policy_definition_entry = dict(service_definition_entry)
+        policy_definition_entry["policy_content"] = policy_content
+        results["policy_definitions"][short_id] = policy_definition_entry
+    changes["removed"] = len(set(previous_files) - set(manifest_files))
+    manifest = dict(version=MANIFEST_VERSION, files=manifest_files)
+    timings["merge"] = time.perf_counter() - start
+    logger.debug("Parsed %d policies from %d services", len(results["policy_definitions"]), len(service_names))
+    return results, manifest, changes
+
+
+def _previous_entries(previous_results: dict, service_name: str, policy_file_name: str, previous_file: dict) -> tuple:
+    """
+    The (short_id, service_definition_entry, policy_content) of a file from the previous catalog, or None if the
+    previous catalog doesn't have them, for example because another service has a policy with the same ID.
+    """
+    short_id = previous_file.get("short_id")
+    service_definition_entry = previous_results["service_definitions"].get(service_name, {}).get(short_id)
+    policy_definition_entry = previous_results["policy_definitions"].get(short_id)
+    if not service_definition_entry or not policy_definition_entry:
+        return None
+    if service_definition_entry.get("file_name") != policy_file_name:
+        return None
+    if (policy_definition_entry.get("service_name"), policy_definition_entry.get("file_name")) != (service_name, policy_file_name):
+        return None
+    return short_id, service_definition_entry, policy_definition_entry.get("policy_content")
+
 
-            # Add to policy_definitions
-            policy_definition_entry = copy.deepcopy(service_definition_entry)
-            policy_definition_entry["policy_content"] = policy_content
-            results["policy_definitions"][short_id] = policy_definition_entry
+def create_azure_builtin_definition(jobs: int = 1, timings: dict = None, source: PolicySource = None) -> dict:
+    """Build the whole IAM definition catalog from the azure-policy repository"""
+    results, manifest, changes = build_azure_builtin_definition(jobs=jobs, timings=timings, source=source)
     return results
@@ -0,0 +1,297 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+Where the catalog build reads the Azure Policy definition files from.
+
+By default that is the azure-policy submodule checked out on disk. The files can also be read straight from the
+objects of a local clone of azure-policy at any revision, or from a .tar.gz or .zip archive of the repository, without
+checking anything out or extracting anything.
+"""
+import os
+import logging
+import tarfile
+import zipfile
+import subprocess  # nosec
+from abc import ABC, abstractmethod
+from cloud_guardrails.shared import utils
+
+logger = logging.getLogger(__name__)
+
+# Where the policy definitions are in the azure-policy repository
+POLICY_DEFINITIONS_PATH = "built-in-policies/policyDefinitions"
+# Azure Government has nested folders, and Regulatory Compliance is full of Microsoft Managed Controls
+EXCLUDED_SERVICES = ["Azure Government", "Regulatory Compliance"]
+
+
+def get_service_policy_files(service_policy_directory: str) -> list:
+    policy_files = [
+        f
+        for f in os.listdir(service_policy_directory)
+        if os.path.isfile(os.path.join(service_policy_directory, f))
+    ]
+    policy_files.sort()
+    return policy_files
+
+
+class PolicySource(ABC):
+    """The policy files of each service, read from somewhere"""
+
+    @abstractmethod
+    def service_names(self) -> list:
+        """The sorted service names"""
+
+    @abstractmethod
+    def policy_files(self, service_name: str) -> list:
+        """The sorted file names of the policies of a service"""
+
+    @abstractmethod
+    def fingerprint(self, service_name: str, policy_file_name: str) -> str:
+        """A cheap value that changes whenever the file changes, like its size and modification time"""
+
+    @abstractmethod
+    def read_policy_files(self, service_name: str, policy_file_names: list) -> dict:
+        """The contents of some of the policy files of a service, as bytes, by file name"""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class DirectoryPolicySource(PolicySource):
+    """The policyDefinitions directory of a checked out azure-policy repository"""
+
+    def __init__(self, directory: str = None):
+        # Looked up when the source is created, not when the module is imported, so the directory can be patched
+        self.directory = directory or utils.AZURE_POLICY_SERVICE_DIRECTORY
+
+    def __str__(self):
+        return self.directory
+
+    def service_names(self) -> list:
+        service_names = [
+            service_name for service_name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, service_name)) and service_name not in EXCLUDED_SERVICES
+        ]
+        service_names.sort()
+        return service_names
+
+    def policy_files(self, service_name: str) -> list:
+        return get_service_policy_files(os.path.join(self.directory, service_name))
+
+    def fingerprint(self, service_name: str, policy_file_name: str) -> str:
+        stat = os.stat(os.path.join(self.directory, service_name, policy_file_name))
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def read_policy_files(self, service_name: str, policy_file_names: list) -> dict:
+        results = {}
+        for policy_file_name in policy_file_names:
+            with open(os.path.join(self.directory, service_name, policy_file_name), "rb") as file:
+                results[policy_file_name] = file.read()
+        return results
+
+
+class GitPolicySource(PolicySource):
+    """
+    The policy definitions in a local clone of azure-policy at a given revision, read from the git objects.
+
+    The tree is listed once with 'git ls-tree', and the blobs are streamed through a single 'git cat-file --batch'
+    process, so nothing is checked out.
+    """
+
+    def __init__(self, repository: str, revision: str = "HEAD"):
+        self.repository = repository
+        self.revision = revision
+        self._tree = None
+        self._cat_file = None
+
+    def __str__(self):
+        return f"{self.repository}@{self.revision}"
+
+    def _git(self, *args) -> bytes:
+        return subprocess.run(  # nosec
+            ["git", "-C", self.repository, *args], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        ).stdout
+
+    @property
+    def tree(self) -> dict:
+        """{service name: {file name: blob ID}}, listed once"""
+        if self._tree is None:
+            tree = {}
+            output = self._git("ls-tree", "-r", "-z", self.revision, "--", f"{POLICY_DEFINITIONS_PATH}/")
+            for line in output.split(b"\0"):
+                if not line:
+                    continue
+                # <mode> SP <type> SP <object> TAB <path>
+                info, path = line.split(b"\t", 1)
+                mode, object_type, blob_id = info.decode().split(" ")
+                if object_type != "blob":
+                    continue
+                relative_path = path.decode("utf-8")[len(POLICY_DEFINITIONS_PATH) + 1:]
+                if relative_path.count("/") != 1:
+                    continue
+                service_name, policy_file_name = relative_path.split("/")
+                tree.setdefault(service_name, {})[policy_file_name] = blob_id
+            if not tree:
+                raise Exception(f"There are no policy definitions under {POLICY_DEFINITIONS_PATH} in {self}")
+            self._tree = tree
+        return self._tree
+
+    def service_names(self) -> list:
+        return sorted(service_name for service_name in self.tree if service_name not in EXCLUDED_SERVICES)
+
+    def policy_files(self, service_name: str) -> list:
+        return sorted(self.tree.get(service_name, {}))
+
+    def fingerprint(self, service_name: str, policy_file_name: str) -> str:
+        return self.tree[service_name][policy_file_name]
+
+    def read_policy_files(self, service_name: str, policy_file_names: list) -> dict:
+        if self._cat_file is None:
+            self._cat_file = subprocess.Popen(  # nosec
+                ["git", "-C", self.repository, "cat-file", "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+        results = {}
+        # One object at a time, so that neither side of the pipes can fill up and block the other
+        for policy_file_name in policy_file_names:
+            blob_id = self.tree[service_name][policy_file_name]
+            self._cat_file.stdin.write(f"{blob_id}\n".encode())
+            self._cat_file.stdin.flush()
+            # <object> SP <type> SP <size> LF <contents> LF
+            header = self._cat_file.stdout.readline().decode().split()
+            if len(header) != 3 or header[1] != "blob":
+                raise Exception(f"Could not read {service_name}/{policy_file_name} ({blob_id}) from {self}")
+            results[policy_file_name] = self._cat_file.stdout.read(int(header[2]))
+            self._cat_file.stdout.read(1)
+        return results
+
+    def close(self):
+        if self._cat_file is not None:
+            self._cat_file.stdin.close()
+            self._cat_file.wait()
+            self._cat_file.stdout.close()
+            self._cat_file = None
+
+
+class ArchivePolicySource(PolicySource):
+    """
+    The policy definitions in a .tar.gz or .zip archive of the azure-policy repository, like the ones GitHub serves.
+
+    The archive can have a top level directory, like azure-policy-master/. Zip archives are read one member at a
+    time. A compressed tarball can only be read from the start, so it is streamed: a single pass moves forward to each
+    file as it is asked for. Files that come before the one asked for are kept until they are asked for, which only
+    happens when the archive is not in the order the services are built in.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_zip = zipfile.is_zipfile(path)
+        self._members = None
+        # The tarball being streamed, and the policy files it has passed that haven't been asked for yet
+        self._stream = None
+        self._pending = {}
+
+    def __str__(self):
+        return self.path
+
+    @staticmethod
+    def _relative_path(member_name: str) -> str:
+        """The path of a member under policyDefinitions, or None if it's somewhere else"""
+        prefix, separator, relative_path = member_name.partition(f"{POLICY_DEFINITIONS_PATH}/")
+        if not separator or (prefix and not prefix.endswith("/")) or prefix.count("/") > 1:
+            return None
+        if relative_path.count("/") != 1 or relative_path.endswith("/"):
+            return None
+        return relative_path
+
+    @property
+    def members(self) -> dict:
+        """{service name: {file name: (member name, fingerprint)}}, listed once"""
+        if self._members is None:
+            members = {}
+            if self.is_zip:
+                with zipfile.ZipFile(self.path) as archive:
+                    infos = [(info.filename, f"{info.CRC}:{info.file_size}") for info in archive.infolist()]
+            else:
+                with tarfile.open(self.path, "r:*") as archive:
+                    infos = [
+                        (info.name, f"{info.mtime}:{info.size}") for info in archive.getmembers() if info.isfile()
+                    ]
+            for member_name, fingerprint in infos:
+                relative_path = self._relative_path(member_name)
+                if relative_path:
+                    service_name, policy_file_name = relative_path.split("/")
+                    members.setdefault(service_name, {})[policy_file_name] = (member_name, fingerprint)
+            if not members:
+                raise Exception(f"There are no policy definitions under {POLICY_DEFINITIONS_PATH} in {self}")
+            self._members = members
+        return self._members
+
+    def service_names(self) -> list:
+        return sorted(service_name for service_name in self.members if service_name not in EXCLUDED_SERVICES)
+
+    def policy_files(self, service_name: str) -> list:
+        return sorted(self.members.get(service_name, {}))
+
+    def fingerprint(self, service_name: str, policy_file_name: str) -> str:
+        return self.members[service_name][policy_file_name][1]
+
+    def _read_tarball_member(self, member_name: str) -> bytes:
+        if member_name in self._pending:
+            return self._pending.pop(member_name)
+        wanted_services = set(self.service_names())
+        # If the member was already passed, it was read before, so start over from the beginning once
+        for attempt in range(2):
+            if self._stream is None:
+                self._stream = tarfile.open(self.path, "r|*")
+            info = self._stream.next()
+            while info is not None:
+                relative_path = self._relative_path(info.name) if info.isfile() else None
+                if relative_path:
+                    if info.name == member_name:
+                        return self._stream.extractfile(info).read()
+                    if relative_path.split("/")[0] in wanted_services:
+                        self._pending[info.name] = self._stream.extractfile(info).read()
+                info = self._stream.next()
+            self._close_stream()
+        raise Exception(f"Could not read {member_name} from {self}")
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def read_policy_files(self, service_name: str, policy_file_names: list) -> dict:
+        member_names = [self.members[service_name][policy_file_name][0] for policy_file_name in policy_file_names]
+        if self.is_zip:
+            with zipfile.ZipFile(self.path) as archive:
+                return {
+                    policy_file_name: archive.read(member_name)
+                    for policy_file_name, member_name in zip(policy_file_names, member_names)
+                }
+        return {
+            policy_file_name: self._read_tarball_member(member_name)
+            for policy_file_name, member_name in zip(policy_file_names, member_names)
+        }
+
+    def close(self):
+        self._close_stream()
+        self._pending = {}
+
+
+def get_policy_source(git_repository: str = None, revision: str = "HEAD", archive: str = None) -> PolicySource:
+    """The git repository or archive if one is given, otherwise the azure-policy submodule"""
+    if git_repository and archive:
+        raise Exception("Provide either a git repository or an archive, not both")
+    if git_repository:
+        return GitPolicySource(repository=git_repository, revision=revision)
+    if archive:
+        return ArchivePolicySource(path=archive)
+    return DirectoryPolicySource()
@@ -3,15 +3,46 @@
 # Licensed under the BSD 3-Clause license.
 # For full license text, see the LICENSE file in the repo root
 # or https://opensource.org/licenses/BSD-3-Clause
+import re
 import logging
 import json
-import yaml
 from cloud_guardrails.shared import utils
-from cloud_guardrails.templates.config_template import get_config_template
+from cloud_guardrails.shared.exclusion_decisions import NO_MATCHING_KEYWORD, EXCLUDED_SERVICE, EXCLUDED_KEYWORD, \
+    EXCLUDED_POLICY
 
 logger = logging.getLogger(__name__)
 
 
+class KeywordMatcher:
+    """
+    Finds which of a list of keywords appears in a display name.
+
+    The keywords are compiled once into a single regex, so a display name is lowercased once and scanned once, however
+    many keywords there are.
+    """
+
+    def __init__(self, keywords: list):
+        self.keywords = [keyword.lower() for keyword in keywords if keyword != ""]
+        if self.keywords:
+            # Longest first, so when two keywords match at the same place the more specific one is reported
+            alternatives = sorted(set(self.keywords), key=len, reverse=True)
+            self._pattern = re.compile("|".join(re.escape(keyword) for keyword in alternatives))
+        else:
+            self._pattern = None
+
+    def __bool__(self):
+        return self._pattern is not None
+
+    def match(self, text: str) -> str:
+        """The first keyword in the text, or None if there isn't one"""
+        if self._pattern is None:
+            return None
+        match = self._pattern.search(text.lower())
+        if match:
+            return match.group(0)
+        return None
+
+
 class Config:
     def __init__(
         self,
@@ -20,15 +51,32 @@ class Config:
         exclude_services: list = None,
         exclude_keywords: list = None,
     ):
-        # This is not really needed by the object - just used for data validation
-        self.supported_services = utils.get_service_names()
         self.exclude_policies = self._exclude_policies(exclude_policies)
         self.match_only_keywords = self._match_only_keywords(match_only_keywords)
         self.exclude_keywords = self._exclude_keywords(exclude_keywords)
+        # The keyword lists are compiled once here, rather than looped over for every policy
+        self.match_only_keyword_matcher = KeywordMatcher(self.match_only_keywords)
+        self.exclude_keyword_matcher = KeywordMatcher(self.exclude_keywords)
 
         # Get the list of services excluded by the user
         self.exclude_services = self._exclude_services(exclude_services)
 
+        # Sets for the lookups: the excluded policy names of each service, all of them together for a quick miss, and
+        # the excluded services. The config is not meant to change after it is created, so these are built once.
+        self._excluded_policy_names = {
+            service_name: frozenset(service_policies)
+            for service_name, service_policies in self.exclude_policies.items()
+        }
+        self._all_excluded_policy_names = frozenset().union(*self._excluded_policy_names.values())
+        self._excluded_service_names = frozenset(self.exclude_services)
+        # exclusion_reason() decisions by (service name, display name). "" means the policy is not excluded.
+        self._decisions = {}
+
+    @property
+    def supported_services(self) -> tuple:
+        # This is not really needed by the object - just used for data validation
+        return utils.get_service_names()
+
     def __str__(self):
         result = dict(
             match_only_keywords=self.match_only_keywords,
@@ -70,7 +118,7 @@ class Config:
         if policies_dict:
             # Let's just loop through and validate the service names.
             for service, values in policies_dict.items():
-                if service not in self.supported_services:
+                if not utils.is_supported_service(service):
                     raise Exception(
                         "Error: the provided service %s is not in the list of supported services"
                         % service
@@ -93,7 +141,7 @@ class Config:
             for service in services:
                 if service == "":
                     pass
-                elif service in self.supported_services:
+                elif utils.is_supported_service(service):
                     exclude_services.append(service)
                 else:
                     raise Exception(
@@ -102,67 +150,75 @@ class Config:
                     )
         return exclude_services
 
+    def matching_keyword(self, policy_display_name: str) -> str:
+        """The keyword from match_only_keywords that is in the display name, if any"""
+        return self.match_only_keyword_matcher.match(policy_display_name)
+
+    def excluding_keyword(self, policy_display_name: str) -> str:
+        """The keyword from exclude_keywords that is in the display name, if any"""
+        return self.exclude_keyword_matcher.match(policy_display_name)
+
     def is_keyword_match(self, policy_display_name: str) -> bool:
-        result = False
-        lowercase_name = policy_display_name.lower()
-        if self.match_only_keywords:
-            for keyword in self.match_only_keywords:
-                if keyword in lowercase_name:
-                    result = True
-                    break
-        return result
+        return self.matching_keyword(policy_display_name) is not None
 
     def is_policy_excluded(self, service_name: str, display_name: str) -> bool:
-        result = False
         # If the display name matches any of the keywords from exclude_keywords, then it's excluded
-        if self.exclude_keywords:
-            for keyword in self.exclude_keywords:
-                if keyword.lower() in display_name.lower():
-                    return True
-        # If there is no list of excluded policies, it's not excluded
-        if not self.exclude_policies:
-            return result
-
-        # If the service name is not in the list of excluded policies at all, then it's not excluded
-        service_exists = self.exclude_policies.get(service_name, None)
-        if not service_exists:
-            return False
+        if self.excluding_keyword(display_name) is not None:
+            return True
+        return self._is_policy_name_excluded(service_name=service_name, display_name=display_name)
 
-        # If the service name is listed, let's loop through the items under each service and see if the text matches.
-        for service_name, service_policies in self.exclude_policies.items():
-            if display_name in service_policies:
-                return True
+    def _is_policy_name_excluded(self, service_name: str, display_name: str) -> bool:
+        result = False
+        # Most policies are not excluded by name at all, so rule those out before looking at the service
+        if display_name not in self._all_excluded_policy_names:
+            return result
+        # The policy is only excluded if it is listed under its own service
+        if display_name in self._excluded_policy_names.get(service_name, ()):
+            return True
         # If we've made it this far, then it is not excluded
         return result
 
     def is_excluded(self, service_name: str, display_name: str) -> bool:
+        return self.exclusion_reason(service_name=service_name, display_name=display_name) is not None
+
+    def exclusion_reason(self, service_name: str, display_name: str) -> str:
+        """Why the config excludes a policy, as a reason code from exclusion_decisions, or None if it doesn't"""
+        key = (service_name, display_name)
+        reason = self._decisions.get(key)
+        if reason is None:
+            reason = self._exclusion_reason(service_name=service_name, display_name=display_name) or ""
+            self._decisions[key] = reason
+        return reason or None
+
+    def _exclusion_reason(self, service_name: str, display_name: str) -> str:
         # Case: substrings from match_only_keywords are NOT in the display name
         if self.match_only_keywords:
             if not self.is_keyword_match(policy_display_name=display_name):
-                return True
+                return NO_MATCHING_KEYWORD
 
         # Case: Service is listed in excluded services
-        if service_name in self.exclude_services:
-            return True
+        if service_name in self._excluded_service_names:
+            return EXCLUDED_SERVICE
+
+        # Case: The display name matches any of the keywords from exclude_keywords
+        if self.excluding_keyword(display_name) is not None:
+            return EXCLUDED_KEYWORD
 
         # Case: The policy name is in the list of excluded policies, sorted by service
-        policy_excluded = self.is_policy_excluded(
-            service_name=service_name, display_name=display_name
-        )
-        if policy_excluded:
-            return True
-        else:
-            return False
+        if self._is_policy_name_excluded(service_name=service_name, display_name=display_name):
+            return EXCLUDED_POLICY
+        return None
 
     def is_service_excluded(self, service_name: str) -> bool:
-        if service_name in self.exclude_services:
+        if service_name in self._excluded_service_names:
             return True
         else:
             return False
 
 
 def get_default_config(exclude_services: list = None, match_only_keywords: list = None, exclude_keywords: list = None) -> Config:
-    config_cfg = yaml.safe_load(DEFAULT_CONFIG_TEMPLATE)
+    import yaml
+    config_cfg = yaml.safe_load(get_default_config_template())
     exclude_policies = config_cfg.get("exclude_policies", None)
     cfg_exclude_services = config_cfg.get("exclude_services", None)
     cfg_match_only_keywords = config_cfg.get("match_only_keywords", None)
@@ -194,6 +250,7 @@ def get_default_config(exclude_services: list = None, match_only_keywords: list
 
 
 def get_config_from_file(config_file: str, exclude_services: list = None) -> Config:
+    import yaml
     with open(config_file, "r") as yaml_file:
         config_cfg = yaml.safe_load(yaml_file)
     # Policies to exclude
@@ -230,5 +287,36 @@ def get_empty_config() -> Config:
     return config
 
 
-DEFAULT_CONFIG_TEMPLATE = get_config_template()
-DEFAULT_CONFIG = get_default_config()
+_default_config_template = None
+_default_config = None
+
+
+def get_config_template() -> str:
+    # Rendering the template needs Jinja2, so only import it when a config template is actually needed
+    from cloud_guardrails.templates.config_template import get_config_template as render_config_template
+    return render_config_template()
+
+
+def get_default_config_template() -> str:
+    """The rendered default config template, rendered the first time it is needed"""
+    global _default_config_template
+    if _default_config_template is None:
+        _default_config_template = get_config_template()
+    return _default_config_template
+
+
+def get_shared_default_config() -> Config:
+    """The default config shared by the whole process, built the first time it is needed. Don't modify it."""
+    global _default_config
+    if _default_config is None:
+        _default_config = get_default_config()
+    return _default_config
+
+
+def __getattr__(name: str):
+    # DEFAULT_CONFIG_TEMPLATE and DEFAULT_CONFIG used to be built at import time. Build them on first access instead.
+    if name == "DEFAULT_CONFIG_TEMPLATE":
+        return get_default_config_template()
+    if name == "DEFAULT_CONFIG":
+        return get_shared_default_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
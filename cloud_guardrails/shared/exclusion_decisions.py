@@ -0,0 +1,84 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+Why a policy was left out of a run, as a reason code.
+
+The first four come from the policy itself and the rest from the config. When several apply, the first one in this
+order is the one that is reported.
+"""
+import json
+from collections import Counter
+from cloud_guardrails.shared import utils
+
+DEPRECATED = "deprecated"
+MODIFY = "modify"
+DEPLOY = "deploy"
+NO_MATCHING_KEYWORD = "no_matching_keyword"
+EXCLUDED_SERVICE = "excluded_service"
+EXCLUDED_KEYWORD = "excluded_keyword"
+EXCLUDED_POLICY = "excluded_policy"
+
+REASONS = (DEPRECATED, MODIFY, DEPLOY, NO_MATCHING_KEYWORD, EXCLUDED_SERVICE, EXCLUDED_KEYWORD, EXCLUDED_POLICY)
+REASON_DESCRIPTIONS = {
+    DEPRECATED: "Deprecated",
+    MODIFY: "Modify",
+    DEPLOY: "Deploy",
+    NO_MATCHING_KEYWORD: "No match_only_keywords match",
+    EXCLUDED_SERVICE: "Service excluded by user",
+    EXCLUDED_KEYWORD: "Matches exclude_keywords",
+    EXCLUDED_POLICY: "Excluded by user",
+}
+# 0 means the policy was not excluded, or has not been looked at
+_CODES = {reason: code for code, reason in enumerate(REASONS, start=1)}
+
+
+class ExclusionDecisions:
+    """
+    The reason code of each row of the policy table, one byte per row, allocated once for the whole run.
+    """
+
+    def __init__(self, size: int):
+        self._codes = bytearray(size)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def record(self, row: int, reason: str):
+        self._codes[row] = _CODES[reason]
+
+    def reason(self, row: int) -> str:
+        """The reason the row was excluded, or None"""
+        code = self._codes[row]
+        if code:
+            return REASONS[code - 1]
+        return None
+
+    def excluded_rows(self) -> list:
+        """The rows that were excluded, in table order"""
+        return [row for row, code in enumerate(self._codes) if code]
+
+    def counts(self) -> dict:
+        """The number of excluded rows for each reason, in the order of REASONS"""
+        counter = Counter(self._codes)
+        return {reason: counter[code] for reason, code in _CODES.items() if counter[code]}
+
+
+def print_exclusion_report(report: dict, verbosity: int = 0):
+    """Print the output of AzurePolicies.exclusion_report(). With verbosity, every excluded policy is listed."""
+    print()
+    utils.print_blue(f"Excluded {len(report.get('policies'))} policies:")
+    for reason, count in report.get("counts").items():
+        print(f"    {REASON_DESCRIPTIONS[reason]} ({reason}): {count}")
+    if verbosity >= 1:
+        for short_id, decision in report.get("policies").items():
+            utils.print_grey(
+                f"    [{decision.get('reason')}] {decision.get('service_name')}: {decision.get('display_name')} ({short_id})"
+            )
+
+
+def write_exclusion_report(report: dict, path: str):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=4)
@@ -5,7 +5,7 @@
 # or https://opensource.org/licenses/BSD-3-Clause
 import logging
 from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
-from cloud_guardrails.shared.config import DEFAULT_CONFIG
+from cloud_guardrails.shared.config import get_shared_default_config
 from cloud_guardrails.shared import utils
 from cloud_guardrails.iam_definition.policy_definition import PolicyDefinition
 
@@ -17,22 +17,29 @@ class CategorizedParameters:
 
     def __init__(
         self,
-        azure_policies: AzurePolicies = AzurePolicies(service_names=["all"], config=DEFAULT_CONFIG),
+        azure_policies: AzurePolicies = None,
         parameters_config: dict = None,
         params_optional: bool = False,
         params_required: bool = False,
         audit_only: bool = False,
-        enforce: bool = False
+        enforce: bool = False,
+        policy_id_pairs: dict = None
     ):
         self.params_optional = params_optional
         self.params_required = params_required
         self.audit_only = audit_only
         self.enforce = enforce
-        self.azure_policies = azure_policies
+        # Don't build the default AzurePolicies object as a default argument, otherwise it is created on import
+        if azure_policies:
+            self.azure_policies = azure_policies
+        else:
+            self.azure_policies = AzurePolicies(service_names=["all"], config=get_shared_default_config())
         if parameters_config:
             self.parameters_config = self.set_parameters_config(parameters_config)
         else:
             self.parameters_config = {}
+        # Callers that already ran the policy selection can pass it in so it isn't computed again
+        self.policy_id_pairs = policy_id_pairs
         self.service_categorized_parameters = self.set_service_categorized_parameters()
 
     def set_parameters_config(self, parameters_config: dict) -> dict:
@@ -44,10 +51,9 @@ class CategorizedParameters:
         """If the parameters config from the YAML file has invalid values, this will throw an exception"""
         # Validate the input first
         # Let's validate the top level keys.
-        valid_service_names = utils.get_service_names()
         for service_name, service_policies in parameters_config.items():
             # Service name should be valid
-            if service_name not in valid_service_names:
+            if not utils.is_supported_service(service_name):
                 raise Exception(
                     f"The service name {service_name} is not a valid service name. Please adjust your config file.")
             for policy_name, policy_parameters in service_policies.items():
@@ -89,13 +95,16 @@ class CategorizedParameters:
 
     def set_service_categorized_parameters(self):
         """Now that we have validated the parameters to be included in the HCL file, let's set the values"""
-        all_policy_ids_sorted_by_service = self.azure_policies.get_all_policy_ids_sorted_by_service(
-            no_params=False,
-            params_optional=self.params_optional,
-            params_required=self.params_required,
-            audit_only=self.audit_only,
-            enforce=self.enforce
-        )
+        if self.policy_id_pairs is not None:
+            all_policy_ids_sorted_by_service = self.policy_id_pairs
+        else:
+            all_policy_ids_sorted_by_service = self.azure_policies.get_all_policy_ids_sorted_by_service(
+                no_params=False,
+                params_optional=self.params_optional,
+                params_required=self.params_required,
+                audit_only=self.audit_only,
+                enforce=self.enforce
+            )
         results = {}
         for service_name, service_policies in all_policy_ids_sorted_by_service.items():
             # Case: "all"
@@ -7,7 +7,6 @@ import os
 import re
 import json
 import csv
-import yaml
 import logging
 from pathlib import Path
 from colorama import Fore
@@ -35,14 +34,21 @@ DATA_FILE_DIRECTORY = os.path.abspath(
 )
 
 
-def get_service_names():
-    services = os.listdir(AZURE_POLICY_SERVICE_DIRECTORY)
-    services.sort()
-    # TODO: Removing Azure Government because it has nested folders. Need to handle this case later.
-    services.remove("Azure Government")
-    # Regulatory compliance is full of Microsoft Managed Controls
-    services.remove("Regulatory Compliance")
-    return services
+def get_service_names() -> tuple:
+    """
+    The services in the built IAM definition catalog, sorted.
+
+    The tuple is computed once and shared by the whole process. Make a list out of it if you need to change it.
+    """
+    # Imported here because the catalog module depends on this one
+    from cloud_guardrails.iam_definition.policy_catalog import get_policy_catalog
+    return get_policy_catalog().service_names
+
+
+def is_supported_service(service_name: str) -> bool:
+    """True if the service is in the built IAM definition catalog"""
+    from cloud_guardrails.iam_definition.policy_catalog import get_policy_catalog
+    return get_policy_catalog().is_supported_service(service_name)
 
 
 def read_json_file(file: str) -> dict:
@@ -178,6 +184,7 @@ def get_real_value(value):
 
 def read_yaml_file(filename: str) -> dict:
     """Reads a YAML file, safe loads, and returns the dictionary"""
+    import yaml
     with open(filename, "r") as yaml_file:
         cfg = yaml.safe_load(yaml_file)
     return cfg
@@ -9,19 +9,16 @@ from cloud_guardrails.shared import utils
 
 
 def click_validate_supported_azure_service(ctx, param, value):
-    supported_services = utils.get_service_names()
-    supported_services.append("all")
-
-    if value in supported_services:
+    if value == "all" or utils.is_supported_service(value):
         return value
     else:
+        supported_services = utils.get_service_names() + ("all",)
         raise click.BadParameter(
             f"Supply a supported Azure service. Supported services are: {', '.join(supported_services)}"
         )
 
 
 def click_validate_comma_separated_excluded_services(ctx, param, value):
-    supported_services = utils.get_service_names()
     if value is not None:
         try:
             if value == "":
@@ -29,14 +26,24 @@ def click_validate_comma_separated_excluded_services(ctx, param, value):
             else:
                 excluded_services = value.split(",")
                 for service in excluded_services:
-                    if service not in supported_services:
+                    if not utils.is_supported_service(service):
                         raise click.BadParameter(
                             f"The service name {service} is invalid. Please provide a comma "
                             f"separated list of supported services from the list: "
-                            f"{','.join(supported_services)}"
+                            f"{','.join(utils.get_service_names())}"
                         )
                 return excluded_services
         except ValueError:
             raise click.BadParameter(
                 "Supply the list of resource names to exclude from results in a comma separated string."
             )
+
+
+def click_validate_query(ctx, param, value):
+    if value is None:
+        return None
+    from cloud_guardrails.iam_definition.policy_query import compile_query
+    try:
+        return compile_query(value)
+    except Exception as error:
+        raise click.BadParameter(str(error))
@@ -5,11 +5,12 @@
 # or https://opensource.org/licenses/BSD-3-Clause
 import os
 from cloud_guardrails.shared import utils
-from jinja2 import Template, Environment, FileSystemLoader
+from cloud_guardrails.templates.registry import register_template, get_template
 
 DEFAULT_CONFIG_FILE = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "config-template.yml.j2")
 )
+register_template("config-template", DEFAULT_CONFIG_FILE)
 
 
 def get_config_template() -> str:
@@ -18,7 +19,5 @@ def get_config_template() -> str:
         exclude_keywords=[],
         service_names=utils.get_service_names(),
     )
-    template_path = os.path.join(os.path.dirname(__file__))
-    env = Environment(loader=FileSystemLoader(template_path))  # nosec
-    template = env.get_template("config-template.yml.j2")
+    template = get_template("config-template")
     return template.render(t=template_contents)
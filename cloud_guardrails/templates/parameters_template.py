@@ -5,11 +5,26 @@
 # or https://opensource.org/licenses/BSD-3-Clause
 import os
 import json
-from jinja2 import Environment, FileSystemLoader
 from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
 from cloud_guardrails.shared.parameters_categorized import CategorizedParameters
-from cloud_guardrails.shared.config import DEFAULT_CONFIG, Config
+from cloud_guardrails.shared.config import Config, get_shared_default_config
 from cloud_guardrails.shared import utils
+from cloud_guardrails.templates.registry import register_template, get_template
+
+
+def is_list(value):
+    return isinstance(value, list)
+
+
+register_template(
+    "parameters-template",
+    os.path.join(os.path.dirname(__file__), "parameters-template.yml.j2"),
+    tests={
+        "is_none_instance": utils.is_none_instance,
+        "is_a_list": is_list,
+    },
+    lstrip_blocks=True,
+)
 
 
 class ParameterSegment:
@@ -37,11 +52,13 @@ class ParameterSegment:
 class ParameterTemplate:
     def __init__(
         self,
-        config: Config = DEFAULT_CONFIG,
+        config: Config = None,
         params_optional: bool = False,
         params_required: bool = False,
         enforce: bool = False
     ):
+        if config is None:
+            config = get_shared_default_config()
         self.azure_policies = AzurePolicies(service_names=["all"], config=config)
         self.enforce = enforce
         categorized_parameters = CategorizedParameters(
@@ -106,15 +123,6 @@ class ParameterTemplate:
         template_contents = dict(
             categorized_parameters=self.parameters_config
         )
-        template_path = os.path.join(os.path.dirname(__file__))
-        env = Environment(loader=FileSystemLoader(template_path), lstrip_blocks=True)  # nosec
-        env.tests['is_none_instance'] = utils.is_none_instance
-
-        def is_list(value):
-            return isinstance(value, list)
-
-        env.tests['is_a_list'] = is_list
-
-        template = env.get_template("parameters-template.yml.j2")
+        template = get_template("parameters-template")
         result = template.render(t=template_contents)
         return result
@@ -0,0 +1,125 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# Licensed under the BSD 3-Clause license.
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+"""
+Registry of the Jinja2 templates used to render the Terraform, config and parameter files.
+
+Each module registers its template once, together with the filters and tests it needs. The template is compiled the
+first time it is requested and reused afterwards. Templates can also be precompiled to Python modules at build time
+with precompile_templates(), in which case they are imported instead of parsed.
+"""
+import os
+import logging
+import compileall
+import importlib
+import threading
+from jinja2 import Environment, FileSystemLoader, ModuleLoader, Template
+
+logger = logging.getLogger(__name__)
+
+COMPILED_TEMPLATES_DIRECTORY = os.path.join(os.path.dirname(__file__), "compiled")
+
+# The modules that register templates. precompile_templates() imports these so every template is registered.
+TEMPLATE_MODULES = [
+    "cloud_guardrails.templates.config_template",
+    "cloud_guardrails.templates.parameters_template",
+    "cloud_guardrails.terraform.terraform_no_params",
+    "cloud_guardrails.terraform.terraform_with_params",
+    "cloud_guardrails.terraform.guardrails",
+]
+
+
+class TemplateSpec:
+    """Everything needed to build the Jinja2 Environment for one template"""
+
+    def __init__(self, name: str, template_path: str, filters: dict = None, tests: dict = None, **environment_options):
+        self.name = name
+        self.template_path = template_path
+        self.directory, self.file_name = os.path.split(template_path)
+        self.filters = filters or {}
+        self.tests = tests or {}
+        self.environment_options = environment_options
+
+    @property
+    def compiled_directory(self) -> str:
+        return os.path.join(COMPILED_TEMPLATES_DIRECTORY, self.name)
+
+    @property
+    def compiled_path(self) -> str:
+        return os.path.join(self.compiled_directory, ModuleLoader.get_module_filename(self.file_name))
+
+    def compiled_is_current(self) -> bool:
+        """True if the template was precompiled after the last change to the .j2 file"""
+        if not os.path.exists(self.compiled_path):
+            return False
+        return os.path.getmtime(self.compiled_path) >= os.path.getmtime(self.template_path)
+
+    def environment(self, loader) -> Environment:
+        env = Environment(loader=loader, **self.environment_options)  # nosec
+        env.filters.update(self.filters)
+        env.tests.update(self.tests)
+        return env
+
+    def load(self) -> Template:
+        if self.compiled_is_current():
+            logger.debug("Loading the precompiled template %s", self.name)
+            env = self.environment(ModuleLoader(self.compiled_directory))
+        else:
+            env = self.environment(FileSystemLoader(self.directory))
+        return env.get_template(self.file_name)
+
+
+_template_specs = {}
+_templates = {}
+_lock = threading.Lock()
+
+
+def register_template(name: str, template_path: str, filters: dict = None, tests: dict = None, **environment_options):
+    """Register a template under a name. Extra keyword arguments are passed to the Jinja2 Environment."""
+    with _lock:
+        _template_specs[name] = TemplateSpec(
+            name=name, template_path=template_path, filters=filters, tests=tests, **environment_options
+        )
+        _templates.pop(name, None)
+
+
+def get_template(name: str) -> Template:
+    """Get a registered template, compiling it the first time it is used"""
+    template = _templates.get(name)
+    if template is None:
+        with _lock:
+            template = _templates.get(name)
+            if template is None:
+                template_spec = _template_specs.get(name)
+                if not template_spec:
+                    raise Exception(f"The template {name} is not registered")
+                template = template_spec.load()
+                _templates[name] = template
+    return template
+
+
+def clear_template_cache():
+    """Forget the compiled templates, so they are loaded again the next time they are used"""
+    with _lock:
+        _templates.clear()
+
+
+def precompile_templates(target_directory: str = COMPILED_TEMPLATES_DIRECTORY) -> list:
+    """Compile every registered template to a Python module under target_directory, and byte-compile those modules"""
+    for module_name in TEMPLATE_MODULES:
+        importlib.import_module(module_name)
+    compiled = []
+    for name, template_spec in sorted(_template_specs.items()):
+        env = template_spec.environment(FileSystemLoader(template_spec.directory))
+        env.compile_templates(
+            os.path.join(target_directory, name),
+            filter_func=lambda template_name, file_name=template_spec.file_name: template_name == file_name,
+            zip=None,
+            ignore_errors=False,
+        )
+        compiled.append(name)
+    compileall.compile_dir(target_directory, quiet=1)
+    clear_template_cache()
+    return compiled
@@ -6,18 +6,29 @@
 import os
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor, Future
 from colorama import Fore
-from jinja2 import Environment, FileSystemLoader
 from cloud_guardrails.shared import utils
 from cloud_guardrails.terraform.terraform_no_params import TerraformTemplateNoParams
 from cloud_guardrails.terraform.terraform_with_params import TerraformTemplateWithParams
 from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.iam_definition.policy_query import PolicyQuery
 from cloud_guardrails.shared.parameters_categorized import CategorizedParameters
 from cloud_guardrails.shared.config import Config
+from cloud_guardrails.templates.registry import register_template, get_template
 logger = logging.getLogger(__name__)
 
+register_template("provider", os.path.join(os.path.dirname(__file__), "provider", "provider.tf.j2"))
+
+# The rendered Terraform is written out in chunks of this size
+TERRAFORM_WRITE_BUFFER_SIZE = 64 * 1024
+
 
 class TerraformGuardrails:
+    """
+    The service and config are fixed once the object is created: the AzurePolicies built from them, and the policy
+    selection cached below, are never rebuilt. Create a new TerraformGuardrails to use a different service or config.
+    """
     def __init__(
         self,
         service: str,
@@ -30,7 +41,8 @@ class TerraformGuardrails:
         params_required: bool,
         enforcement_mode: bool,
         verbosity: int,
-        category: str = "Testing"
+        category: str = "Testing",
+        where: PolicyQuery = None
     ):
         self.service = service
         self.config = config
@@ -50,10 +62,19 @@ class TerraformGuardrails:
 
         self.audit_only = False
         self.enforcement_mode = enforcement_mode
+        # Optional query that narrows the selection down further
+        self.where = where
 
         self.category = category
         self.verbosity = verbosity
 
+        # The policy selection is computed once and shared by the Terraform, summary and success message output
+        self._policy_id_pairs = None
+        self._policy_id_pairs_key = None
+        # Same for the rows behind the Markdown and CSV summaries
+        self._summary_rows = None
+        self._summary_rows_key = None
+
     def set_iam_definition(self) -> AzurePolicies:
         # Initialize the IAM Definition
         if self.service == "all":
@@ -86,16 +107,24 @@ class TerraformGuardrails:
         elif self.params_required:
             return f"params_required{service_string}.tf"
 
+    def _selection_key(self) -> tuple:
+        """
+        The options the policy selection depends on, besides the service and config. If any of them changes, the
+        cached selection is thrown away.
+        """
+        return (
+            self.no_params, self.params_optional, self.params_required, self.audit_only, self.enforcement_mode,
+            self.where.text if self.where else None
+        )
+
     def policy_id_pairs(self) -> dict:
-        if self.no_params:
-            policy_ids_sorted_by_service = self.azure_policies.get_all_policy_ids_sorted_by_service(
-                no_params=True, params_optional=self.params_optional, params_required=self.params_required,
-                audit_only=self.audit_only, enforce=self.enforcement_mode)
-        else:
-            policy_ids_sorted_by_service = self.azure_policies.get_all_policy_ids_sorted_by_service(
+        selection_key = self._selection_key()
+        if self._policy_id_pairs is None or self._policy_id_pairs_key != selection_key:
+            self._policy_id_pairs = self.azure_policies.get_all_policy_ids_sorted_by_service(
                 no_params=self.no_params, params_optional=self.params_optional, params_required=self.params_required,
-                audit_only=self.audit_only, enforce=self.enforcement_mode)
-        return policy_ids_sorted_by_service
+                audit_only=self.audit_only, enforce=self.enforcement_mode, where=self.where)
+            self._policy_id_pairs_key = selection_key
+        return self._policy_id_pairs
 
     def policy_names(self) -> list:
         policy_id_pairs = self.policy_id_pairs()
@@ -113,11 +142,14 @@ class TerraformGuardrails:
                 policies.append(service_policy_content.get("display_name"))
         return policies
 
-    def generate_terraform(self):
-        # Generate the Terraform file content
+    def terraform_template(self):
+        """The Terraform template for the selected policies, ready to be rendered"""
+        policy_id_pairs = self.policy_id_pairs()
+        if not policy_id_pairs:
+            raise Exception("The configuration you've provided does not match any Azure Policies. Consider opening up your configuration and try again.")
         if self.no_params:
             terraform_template = TerraformTemplateNoParams(
-                policy_id_pairs=self.policy_id_pairs(),
+                policy_id_pairs=policy_id_pairs,
                 subscription_name=self.subscription,
                 management_group=self.management_group,
                 enforcement_mode=self.enforcement_mode,
@@ -130,11 +162,12 @@ class TerraformGuardrails:
                 params_required=self.params_required,
                 params_optional=self.params_optional,
                 audit_only=self.audit_only,
-                enforce=self.enforcement_mode
+                enforce=self.enforcement_mode,
+                policy_id_pairs=policy_id_pairs
             )
 
             terraform_template = TerraformTemplateWithParams(
-                policy_id_pairs=self.policy_id_pairs(),
+                policy_id_pairs=policy_id_pairs,
                 parameter_requirement_str=self.parameter_requirement_str,
                 categorized_parameters=categorized_parameters,
                 subscription_name=self.subscription,
@@ -142,28 +175,36 @@ class TerraformGuardrails:
                 enforcement_mode=self.enforcement_mode,
                 category=self.category
             )
-        result = terraform_template.rendered()
-        if not self.policy_id_pairs():
-            raise Exception("The configuration you've provided does not match any Azure Policies. Consider opening up your configuration and try again.")
-            # return False
-        # else:
-        return result
+        return terraform_template
+
+    def generate_terraform(self) -> str:
+        # Generate the Terraform file content
+        return self.terraform_template().rendered()
 
     def create_terraform_file(self, output_file: str):
-        terraform_content = self.generate_terraform()
+        # Stream the rendered Terraform into a temporary file next to the output file, then move it into place.
+        # That way the whole file is never held in memory, and a failed render doesn't leave a partial file behind.
+        terraform_template = self.terraform_template()
         if os.path.exists(output_file):
             logger.info("%s exists. Removing the file and replacing its contents." % output_file)
-            os.remove(output_file)
-        with open(output_file, "w") as f:
-            f.write(terraform_content)
+        temporary_file = os.path.join(
+            os.path.dirname(os.path.abspath(output_file)), f".{os.path.basename(output_file)}.{os.getpid()}.tmp"
+        )
+        try:
+            with open(temporary_file, "w", buffering=TERRAFORM_WRITE_BUFFER_SIZE) as f:
+                for chunk in terraform_template.generate():
+                    f.write(chunk)
+            os.replace(temporary_file, output_file)
+        except BaseException:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+            raise
 
     def create_terraform_provider_file(self, output_file: str):
         template_contents = dict(
             provider_version="=2.56.0"
         )
-        template_path = os.path.join(os.path.dirname(__file__), "provider")
-        env = Environment(loader=FileSystemLoader(template_path))  # nosec
-        template = env.get_template("provider.tf.j2")
+        template = get_template("provider")
         rendered_template = template.render(t=template_contents)
         if os.path.exists(output_file):
             logger.info("%s exists. Removing the file and replacing its contents." % output_file)
@@ -171,10 +212,22 @@ class TerraformGuardrails:
         with open(output_file, "w") as f:
             f.write(rendered_template)
 
+    def summary_rows(self) -> list:
+        """The rows behind the Markdown and CSV summaries, computed once and shared by both files"""
+        selection_key = self._selection_key()
+        if self._summary_rows is None or self._summary_rows_key != selection_key:
+            self._summary_rows = self.azure_policies.summary_rows(
+                no_params=self.no_params, params_optional=self.params_optional, params_required=self.params_required,
+                where=self.where
+            )
+            self._summary_rows_key = selection_key
+        return self._summary_rows
+
     def create_markdown_summary_file(self, directory: str = None):
         # Write Markdown summary
         markdown_table = self.azure_policies.markdown_table(
-            no_params=self.no_params, params_optional=self.params_optional, params_required=self.params_required
+            no_params=self.no_params, params_optional=self.params_optional, params_required=self.params_required,
+            summary_rows=self.summary_rows()
         )
         markdown_file = f"{self.parameter_requirement_str}-{self.service}-table.md"
         if directory:
@@ -196,9 +249,31 @@ class TerraformGuardrails:
             verbosity=self.verbosity,
             no_params=self.no_params,
             params_optional=self.params_optional,
-            params_required=self.params_required
+            params_required=self.params_required,
+            summary_rows=self.summary_rows()
         )
 
+    def create_summary_files(self, directory: str = None, background: bool = False) -> Future:
+        """
+        Write the Markdown and CSV summaries from the same rows.
+
+        With background=True, the files are written on a separate thread so the caller can render the Terraform
+        in the meantime. Call result() on the returned Future to wait for them and to raise any errors.
+        """
+        def write_summary_files():
+            self.create_markdown_summary_file(directory=directory)
+            self.create_csv_summary_file(directory=directory)
+
+        if background:
+            executor = ThreadPoolExecutor(max_workers=1)
+            future = executor.submit(write_summary_files)
+            executor.shutdown(wait=False)
+        else:
+            future = Future()
+            write_summary_files()
+            future.set_result(None)
+        return future
+
     def green_policy_count(self) -> str:
         return f"{Fore.GREEN}{len(self.policy_names())}{utils.END}"
 
@@ -6,8 +6,13 @@
 import os
 import json
 from typing import Union
-from jinja2 import Environment, FileSystemLoader
 from cloud_guardrails.shared import utils
+from cloud_guardrails.templates.registry import register_template, get_template
+
+register_template(
+    "policy-initiative-no-params",
+    os.path.join(os.path.dirname(__file__), "no-parameters", "policy-initiative-no-params.tf.j2"),
+)
 
 
 class TerraformTemplateNoParams:
@@ -65,10 +70,9 @@ class TerraformTemplateNoParams:
                 }
             }
         }
-        all_valid_services = utils.get_service_names()
         # Just validate the input, that's all
         for service_name, service_policies in policy_id_pairs.items():
-            if service_name not in all_valid_services:
+            if not utils.is_supported_service(service_name):
                 raise Exception("The service provided is not a valid service")
             for policy_id, policy_details in service_policies.items():
                 if not policy_details.get("display_name", None):
@@ -77,7 +81,8 @@ class TerraformTemplateNoParams:
                     raise Exception("There should be a short_id")
         return policy_id_pairs
 
-    def rendered(self) -> str:
+    @property
+    def template_contents_json(self) -> dict:
         template_contents = dict(
             label=self.label,
             initiative_name=self.initiative_name,
@@ -87,10 +92,16 @@ class TerraformTemplateNoParams:
             enforcement_mode=self.enforcement_string,
             category=self.category
         )
-        template_path = os.path.join(os.path.dirname(__file__), "no-parameters")
-        env = Environment(loader=FileSystemLoader(template_path))  # nosec
-        template = env.get_template("policy-initiative-no-params.tf.j2")
-        return template.render(t=template_contents)
+        return template_contents
+
+    def rendered(self) -> str:
+        template = get_template("policy-initiative-no-params")
+        return template.render(t=self.template_contents_json)
+
+    def generate(self):
+        """Render the template in chunks, so it can be written out as it is rendered"""
+        template = get_template("policy-initiative-no-params")
+        return template.generate(t=self.template_contents_json)
 
 
 class TerraformParameter:
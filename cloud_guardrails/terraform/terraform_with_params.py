@@ -6,8 +6,9 @@
 import os
 import json
 import logging
-from jinja2 import Environment, FileSystemLoader
+from functools import partial
 from cloud_guardrails.shared import utils
+from cloud_guardrails.templates.registry import register_template, get_template
 from cloud_guardrails.shared.parameters_categorized import CategorizedParameters
 
 logger = logging.getLogger(__name__)
@@ -36,7 +37,7 @@ class TerraformTemplateWithParams:
         self.category = category
         self.policy_id_pairs = self._policy_id_pairs(policy_id_pairs)
         self.categorized_parameters = categorized_parameters
-        self.policy_definition_reference_parameters = self._policy_definition_reference_parameters()
+        self._policy_definition_reference_parameters_cache = None
         if enforcement_mode:
             self.enforcement_string = "true"
             self.enforce = True
@@ -62,9 +63,8 @@ class TerraformTemplateWithParams:
     @staticmethod
     def _policy_id_pairs(policy_id_pairs) -> dict:
         # Just validate the input, that's all
-        all_valid_services = utils.get_service_names()
         for service_name, service_policies in policy_id_pairs.items():
-            if service_name not in all_valid_services:
+            if not utils.is_supported_service(service_name):
                 raise Exception("The service provided is not a valid service")
             for policy_id, policy_details in service_policies.items():
                 if not policy_details.get("display_name", None):
@@ -73,68 +73,98 @@ class TerraformTemplateWithParams:
                     raise Exception("There should be a short_id")
         return policy_id_pairs
 
+    @property
+    def policy_definition_reference_parameters(self) -> dict:
+        if self._policy_definition_reference_parameters_cache is None:
+            self._policy_definition_reference_parameters_cache = self._policy_definition_reference_parameters()
+        return self._policy_definition_reference_parameters_cache
+
     def _policy_definition_reference_parameters(self) -> dict:
         results = {}
-        for service_name, service_policies in self.categorized_parameters.service_categorized_parameters.items():
-            results[service_name] = {}
-            # results["Kubernetes"] = {  "Do not allow privileged containers in Kubernetes cluster": { "excludedNamespaces": {stuff} }}
-            for policy_definition_name, policy_definition_details in service_policies.items():
-                results[service_name][policy_definition_name] = {}
-                for parameter_name, parameter_value in policy_definition_details.items():
-                    if parameter_name == "policy_id":
-                        continue
-                    # TODO: Here is where we should supply the revised effect
-                    # TODO: Determine if the user hasn't supplied certain parameters? You will have to determine the parameters they supplied vs the policies requested.
-                    value = self.categorized_parameters.get_parameter_value_from_config(
-                        display_name=policy_definition_name, parameter_name=parameter_name
-                    )
-                    if "\\" in value:
-                        value = value.replace("\\", "\\\\")
-                    # if parameter_name == "effect" or parameter_name == "Effect":  # This is faster than using .lower()
-                    #     if self.enforce:
-                    #         # It could be Capitalized or lowercase in allowed_values
-                    #         if "Deny" in parameter_value["allowed_values"]:
-                    #             value["value"] = "Deny"
-                    #         lowercase = [x.lower() for x in parameter_value["allowed_values"]]
-                    #         if "deny" in lowercase:
-                    #             value["value"] = "deny"
-                    if not value:
-                        logger.critical("No value supplied by the user. Check it.")
-                    # TODO: This is where it's randomly returning a string or a dict?. Gotta figure that out
-                    parameter = dict(
-                        parameter_name=parameter_name,
-                        parameter_value=value,
-                    )
-                    results[service_name][policy_definition_name][parameter_name] = parameter
+        for service_name, service_policies in self._iter_policy_definition_reference_parameters():
+            results[service_name] = dict(service_policies.items())
         return results
 
+    def _iter_policy_definition_reference_parameters(self):
+        """Yield the reference parameters service by service, computing each policy's parameters only when it is reached"""
+        for service_name, service_policies in self.categorized_parameters.service_categorized_parameters.items():
+            yield service_name, StreamedMapping(
+                partial(self._iter_service_reference_parameters, service_name=service_name, service_policies=service_policies)
+            )
+
+    def _iter_service_reference_parameters(self, service_name: str, service_policies: dict):
+        # results["Kubernetes"] = {  "Do not allow privileged containers in Kubernetes cluster": { "excludedNamespaces": {stuff} }}
+        for policy_definition_name, policy_definition_details in service_policies.items():
+            policy_results = {}
+            for parameter_name, parameter_value in policy_definition_details.items():
+                if parameter_name == "policy_id":
+                    continue
+                # TODO: Here is where we should supply the revised effect
+                # TODO: Determine if the user hasn't supplied certain parameters? You will have to determine the parameters they supplied vs the policies requested.
+                value = self.categorized_parameters.get_parameter_value_from_config(
+                    display_name=policy_definition_name, parameter_name=parameter_name
+                )
+                if "\\" in value:
+                    value = value.replace("\\", "\\\\")
+                # if parameter_name == "effect" or parameter_name == "Effect":  # This is faster than using .lower()
+                #     if self.enforce:
+                #         # It could be Capitalized or lowercase in allowed_values
+                #         if "Deny" in parameter_value["allowed_values"]:
+                #             value["value"] = "Deny"
+                #         lowercase = [x.lower() for x in parameter_value["allowed_values"]]
+                #         if "deny" in lowercase:
+                #             value["value"] = "deny"
+                if not value:
+                    logger.critical("No value supplied by the user. Check it.")
+                # TODO: This is where it's randomly returning a string or a dict?. Gotta figure that out
+                parameter = dict(
+                    parameter_name=parameter_name,
+                    parameter_value=value,
+                )
+                policy_results[parameter_name] = parameter
+            yield policy_definition_name, policy_results
+
     @property
     def template_contents_json(self) -> dict:
+        return self._template_contents(
+            policy_definition_reference_parameters=self.policy_definition_reference_parameters
+        )
+
+    def _template_contents(self, policy_definition_reference_parameters) -> dict:
         template_contents = dict(
             name=self.name,
             subscription_name=self.subscription_name,
             management_group=self.management_group,
             enforcement_mode=self.enforcement_string,
             policy_id_pairs=self.policy_id_pairs,
-            policy_definition_reference_parameters=self.policy_definition_reference_parameters,
+            policy_definition_reference_parameters=policy_definition_reference_parameters,
             category=self.category
         )
         return template_contents
 
     def rendered(self) -> str:
-        template_path = os.path.join(os.path.dirname(__file__), "with-parameters")
-        env = Environment(loader=FileSystemLoader(template_path))  # nosec
-        env.filters["debug"] = print
-        env.filters['tojson'] = json.dumps
-        env.filters['format_parameter_value'] = format_parameter_value
-        env.filters['get_placeholder_value_given_type'] = get_placeholder_value_given_type
-        env.filters['normalize_display_name_string'] = utils.normalize_display_name_string
-        env.filters['strip_special_characters'] = utils.strip_special_characters
-        env.tests['is_none_instance'] = utils.is_none_instance
-        template = env.get_template("policy-initiative-with-parameters.tf.j2")
+        template = get_template("policy-initiative-with-parameters")
         result = template.render(t=self.template_contents_json)
         return result
 
+    def generate(self):
+        """Render the template in chunks, without building the reference parameters for every policy up front"""
+        template_contents = self._template_contents(
+            policy_definition_reference_parameters=StreamedMapping(self._iter_policy_definition_reference_parameters)
+        )
+        template = get_template("policy-initiative-with-parameters")
+        return template.generate(t=template_contents)
+
+
+class StreamedMapping:
+    """Stands in for a dict that a template only loops over once, producing each item when the template reaches it"""
+
+    def __init__(self, items_function):
+        self._items_function = items_function
+
+    def items(self):
+        return self._items_function()
+
 
 def format_parameter_value(value):
     """Formats policy_definition_reference.parameter_values.value properly"""
@@ -185,6 +215,22 @@ def get_placeholder_value_given_type(value):
         return "2021-04-01T00:00:00.fffffffZ"
 
 
+register_template(
+    "policy-initiative-with-parameters",
+    os.path.join(os.path.dirname(__file__), "with-parameters", "policy-initiative-with-parameters.tf.j2"),
+    filters={
+        "debug": print,
+        "tojson": json.dumps,
+        "format_parameter_value": format_parameter_value,
+        "get_placeholder_value_given_type": get_placeholder_value_given_type,
+        "normalize_display_name_string": utils.normalize_display_name_string,
+        "strip_special_characters": utils.strip_special_characters,
+    },
+    tests={
+        "is_none_instance": utils.is_none_instance,
+    },
+)
+
 # def handle_exception_has_no_keys_error(parameter_details_dict):
 #     try:
 #         tmp = parameter_details_dict.keys()
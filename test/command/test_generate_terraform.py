@@ -1,9 +1,14 @@
 import os
+import re
+import csv
 import json
+import tempfile
 import unittest
+from unittest import mock
 from click.testing import CliRunner
 from cloud_guardrails.command.generate_terraform import generate_terraform
 from cloud_guardrails.shared import utils
+from cloud_guardrails.terraform.guardrails import TerraformGuardrails
 
 test_files_directory = os.path.abspath(os.path.join(
     os.path.dirname(__file__),
@@ -32,6 +37,37 @@ class GenerateTerraformClickUnitTests(unittest.TestCase):
         self.assertTrue("Audit VMs that do not use managed disks" in contents)
         # os.remove(output_file)
 
+    def test_generate_terraform_command_with_where(self):
+        """command.generate_terraform: --where narrows down the selected policies"""
+        with tempfile.TemporaryDirectory() as output_directory:
+            args = ["--subscription", "example", "--params-optional", "-n", "--where", "service = 'Key Vault'",
+                    "--output", output_directory]
+            result = self.runner.invoke(generate_terraform, args)
+            self.assertTrue(result.exit_code == 0)
+            contents = utils.read_file(os.path.join(output_directory, "params_optional.tf"))
+            self.assertTrue("Key Vault" in contents)
+            self.assertTrue("Storage" not in contents)
+        result = self.runner.invoke(generate_terraform, args[:-2] + ["--where", "effect ="])
+        self.assertTrue(result.exit_code == 2)
+
+    def test_generate_terraform_summaries_follow_where(self):
+        """command.generate_terraform: the Markdown and CSV summaries list the same policies as the Terraform"""
+        with tempfile.TemporaryDirectory() as output_directory:
+            args = ["--subscription", "example", "--params-optional", "--where", "service = Storage",
+                    "--output", output_directory]
+            result = self.runner.invoke(generate_terraform, args)
+            self.assertTrue(result.exit_code == 0)
+            contents = utils.read_file(os.path.join(output_directory, "params_optional.tf"))
+            terraform_policy_ids = set(re.findall(r"policyDefinitions/([\w-]+)\"", contents))
+            self.assertTrue(terraform_policy_ids)
+            with open(os.path.join(output_directory, "PO-all-table.csv")) as csv_file:
+                summary_rows = list(csv.DictReader(csv_file))
+            self.assertSetEqual({row["ID"] for row in summary_rows}, terraform_policy_ids)
+            self.assertSetEqual({row["Service"] for row in summary_rows}, {"Storage"})
+            markdown = utils.read_file(os.path.join(output_directory, "PO-all-table.md"))
+            for policy_id in terraform_policy_ids:
+                self.assertTrue(policy_id in markdown)
+
     def test_generate_terraform_command_with_config(self):
         """command.generate_terraform: with config file that is overly restrictive"""
         args = ["--service", "all", "--subscription", "example", "--no-params", "-n", "--config", default_config_file]
@@ -133,3 +169,31 @@ class GenerateTerraformClickUnitTests(unittest.TestCase):
         contents = utils.read_file(output_file)
         self.assertTrue(expected in contents)
         # os.remove(output_file)
+
+    def test_generate_terraform_waits_for_summaries_when_rendering_fails(self):
+        """command.generate_terraform: the background summary writer is waited for, and its errors are raised"""
+        summary_files = []
+        create_summary_files = TerraformGuardrails.create_summary_files
+
+        def recording_create_summary_files(terraform, **kwargs):
+            summary_files.append(create_summary_files(terraform, **kwargs))
+            return summary_files[-1]
+
+        args = ["--service", "all", "--subscription", "example", "--params-optional"]
+        with tempfile.TemporaryDirectory() as output_directory:
+            with mock.patch.object(TerraformGuardrails, "create_summary_files", recording_create_summary_files), \
+                    mock.patch.object(TerraformGuardrails, "create_terraform_file",
+                                      side_effect=Exception("render failed")):
+                result = self.runner.invoke(generate_terraform, args + ["--output", output_directory])
+                self.assertEqual(str(result.exception), "render failed")
+                self.assertTrue(summary_files[0].done())
+                # If both fail, the error from the summary writer is raised too
+                with mock.patch.object(TerraformGuardrails, "create_csv_summary_file",
+                                       side_effect=Exception("summary failed")):
+                    result = self.runner.invoke(generate_terraform, args + ["--output", output_directory])
+                    self.assertEqual(str(result.exception), "summary failed")
+            # And so is an error from the summary writer alone
+            with mock.patch.object(TerraformGuardrails, "create_csv_summary_file",
+                                   side_effect=Exception("summary failed")):
+                result = self.runner.invoke(generate_terraform, args + ["--output", output_directory])
+                self.assertEqual(str(result.exception), "summary failed")
@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import importlib
+import subprocess
+from cloud_guardrails.bin.cli import COMMANDS
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+# 'make benchmark-import-time' holds 'cloud-guardrails --help' to 250 ms. This limit is four times that, so that noisy
+# CI runners pass, but importing the commands or loading the catalog at startup still fails.
+IMPORT_TIME_LIMIT_MS = float(os.environ.get("CLOUD_GUARDRAILS_IMPORT_TIME_LIMIT_MS", 1000))
+# Modules that the subcommands need, but listing the commands should not import
+HEAVY_MODULES = [
+    "jinja2",
+    "tabulate",
+    "yaml",
+    "ruamel.yaml",
+    "click_option_group",
+    "cloud_guardrails.shared.config",
+    "cloud_guardrails.iam_definition.policy_catalog",
+    "cloud_guardrails.command.generate_terraform",
+]
+
+
+def cli_import_time(*args) -> float:
+    """Run the CLI under python -X importtime and return the time spent importing modules, in ms"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "cloud_guardrails.bin.cli", *args],
+        capture_output=True, text=True, cwd=REPO_ROOT, check=True
+    )
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative_time, module_name = line[len("import time:"):].split("|")
+        # Nested imports are indented, and are already counted in the cumulative time of their parents
+        if not module_name.startswith("  "):
+            total += int(cumulative_time) / 1000
+    return total
+
+
+def cli_loaded_modules(*args) -> list:
+    """Run the CLI and return the names of every module it loaded"""
+    script = (
+        "import sys\n"
+        "from cloud_guardrails.bin.cli import cloud_guardrails\n"
+        "cloud_guardrails.main(args=sys.argv[1:], standalone_mode=False)\n"
+        "print('LOADED MODULES')\n"
+        "print('\\n'.join(sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script, *args], capture_output=True, text=True, cwd=REPO_ROOT, check=True
+    )
+    return result.stdout.split("LOADED MODULES\n", 1)[1].splitlines()
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    def test_help_does_not_import_heavy_modules(self):
+        loaded_modules = cli_loaded_modules("--help")
+        for module_name in HEAVY_MODULES:
+            self.assertNotIn(module_name, loaded_modules, f"{module_name} is imported by 'cloud-guardrails --help'")
+
+    def test_subcommand_is_imported_when_invoked(self):
+        loaded_modules = cli_loaded_modules("list-services", "--help")
+        self.assertIn("cloud_guardrails.command.list_services", loaded_modules)
+        self.assertNotIn("cloud_guardrails.command.generate_terraform", loaded_modules)
+
+    def test_help_import_time_limit(self):
+        total = cli_import_time("--help")
+        message = f"'cloud-guardrails --help' spent {total:.1f} ms importing modules"
+        self.assertLess(total, IMPORT_TIME_LIMIT_MS, message)
+
+    def test_lazy_short_help_matches_the_commands(self):
+        for cmd_name, (module_name, attribute_name, short_help) in COMMANDS.items():
+            command = getattr(importlib.import_module(module_name), attribute_name)
+            self.assertEqual(command.name, cmd_name)
+            self.assertEqual(command.short_help, short_help, f"The short help of {cmd_name} in COMMANDS is stale")
@@ -53,3 +53,15 @@ class ListPoliciesClickUnitTests(unittest.TestCase):
         # self.assertTrue("Key Vault" in yaml_results.keys())
         # self.assertTrue("Key vaults should have purge protection enabled" in yaml_results.get("Key Vault"))
         #
+
+    def test_list_policies_command_with_explain_file(self):
+        with self.runner.isolated_filesystem():
+            result = self.runner.invoke(
+                list_policies, ["--service", "all", "--all-policies", "--explain", "--explain-file", "excluded.json"]
+            )
+            self.assertTrue(result.exit_code == 0)
+            self.assertTrue("Excluded " in result.output)
+            with open("excluded.json") as json_file:
+                report = json.load(json_file)
+        self.assertEqual(sum(report.get("counts").values()), len(report.get("policies")))
+        self.assertTrue("deprecated" in report.get("counts"))
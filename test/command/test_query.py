@@ -0,0 +1,33 @@
+import json
+import unittest
+from click.testing import CliRunner
+from cloud_guardrails.command.query import query
+from cloud_guardrails.iam_definition.policy_query import compile_query
+from cloud_guardrails.iam_definition.policy_table import BOOLEAN_COLUMNS
+
+
+class QueryClickUnitTests(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+
+    def test_query_command_with_click_help(self):
+        result = self.runner.invoke(query, ["--help"])
+        self.assertTrue(result.exit_code == 0)
+
+    def test_query_help_lists_every_flag(self):
+        result = self.runner.invoke(query, ["--help"])
+        flags_help = result.output.split("Flags:", 1)[1].split("Combine them", 1)[0]
+        flag_names = [name.strip() for name in flags_help.split(",")]
+        # Every listed flag is accepted, and every flag the parser accepts is listed
+        self.assertSetEqual({compile_query(name).plan.column for name in flag_names}, set(BOOLEAN_COLUMNS))
+
+    def test_query_command_with_click_output_json(self):
+        result = self.runner.invoke(query, ["service = 'Key Vault' and not params_required", "--format", "json"])
+        self.assertTrue(result.exit_code == 0)
+        results = json.loads(result.output)
+        self.assertListEqual(list(results.keys()), ["Key Vault"])
+
+    def test_query_command_with_invalid_query(self):
+        result = self.runner.invoke(query, ["service ="])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("Expected a value", result.output)
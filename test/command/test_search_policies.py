@@ -0,0 +1,51 @@
+import json
+import unittest
+from click.testing import CliRunner
+from cloud_guardrails.command.search_policies import search_policies
+from cloud_guardrails.iam_definition.policy_catalog import get_policy_catalog
+
+
+class SearchPoliciesClickUnitTests(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+
+    def test_search_policies_command_with_click_help(self):
+        result = self.runner.invoke(search_policies, ["--help"])
+        self.assertTrue(result.exit_code == 0)
+
+    def test_search_policies_command_with_click_output_json(self):
+        result = self.runner.invoke(search_policies, ["encrypt", "--service", "Key Vault", "--format", "json"])
+        self.assertTrue(result.exit_code == 0)
+        results = json.loads(result.output)
+        for policy in results:
+            self.assertEqual(policy.get("service_name"), "Key Vault")
+            self.assertIn("encrypt", f"{policy.get('display_name')} {policy.get('description')}".lower())
+
+    def test_search_policies_command_with_click_output_stdout(self):
+        result = self.runner.invoke(search_policies, ["encrypt", "--limit", "3"])
+        self.assertTrue(result.exit_code == 0)
+        self.assertTrue(0 < len(result.output.splitlines()) <= 3)
+
+    def test_search_policies_command_skips_policies_that_modify_resources(self):
+        args = ["Activity log should be retained", "--format", "json"]
+        result = self.runner.invoke(search_policies, args)
+        self.assertTrue(result.exit_code == 0)
+        display_names = [policy.get("display_name") for policy in json.loads(result.output)]
+        self.assertNotIn("Activity log should be retained for at least one year", display_names)
+        result = self.runner.invoke(search_policies, args + ["--include-skipped"])
+        self.assertTrue(result.exit_code == 0)
+        display_names = [policy.get("display_name") for policy in json.loads(result.output)]
+        self.assertIn("Activity log should be retained for at least one year", display_names)
+
+    def test_search_policies_command_with_parameter(self):
+        args = ["should", "--parameter", "effect", "--limit", "1000", "--format", "json"]
+        result = self.runner.invoke(search_policies, args)
+        self.assertTrue(result.exit_code == 0)
+        results = json.loads(result.output)
+        self.assertTrue(len(results) > 0)
+        catalog = get_policy_catalog()
+        for policy in results:
+            self.assertIn("effect", catalog.policy_summary(policy.get("short_id")).get("parameter_names"))
+        result = self.runner.invoke(search_policies, ["should", "--parameter", "not_a_parameter", "--format", "json"])
+        self.assertTrue(result.exit_code == 0)
+        self.assertListEqual(json.loads(result.output), [])
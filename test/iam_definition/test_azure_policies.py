@@ -315,3 +315,48 @@ class AzurePoliciesTestCase(unittest.TestCase):
             print("Removing")
             os.remove(path)
         results = self.azure_policies.markdown_table()
+
+    def test_summary_rows_shared_by_markdown_and_csv(self):
+        summary_rows = self.azure_policies.summary_rows()
+        # The shared rows give the same tables as building them from scratch
+        self.assertListEqual(
+            self.azure_policies.table_summary(hyperlink_format=False, summary_rows=summary_rows),
+            self.azure_policies.table_summary(hyperlink_format=False)
+        )
+        self.assertEqual(self.azure_policies.markdown_table(summary_rows=summary_rows), self.azure_policies.markdown_table())
+        # Formatting the hyperlinks doesn't touch the shared rows
+        for row in summary_rows:
+            self.assertFalse(row["Policy Definition"].startswith("["))
+
+    def test_summary_rows_are_joined_by_policy_id(self):
+        for row in self.azure_policies.summary_rows():
+            # Each row describes the policy of its own service, even if another service has the same display name
+            policy_details = self.azure_policies.service_definitions[row["Service"]][row["ID"]]
+            self.assertEqual(policy_details.get("display_name").replace("[Preview]: ", ""), row["Policy Definition"])
+
+    def test_policy_definition_cache(self):
+        azure_policies = AzurePolicies(cache_size=2)
+        policy_ids = azure_policies.policy_ids()[:3]
+        first = azure_policies.get_policy_definition(policy_id=policy_ids[0])
+        self.assertIs(first, azure_policies.get_policy_definition(policy_id=policy_ids[0]))
+        self.assertEqual(azure_policies.cache_info()["hits"], 1)
+        self.assertEqual(azure_policies.cache_info()["misses"], 1)
+        # The least recently used entry is evicted once the cache is full
+        azure_policies.get_policy_definition(policy_id=policy_ids[1])
+        azure_policies.get_policy_definition(policy_id=policy_ids[2])
+        self.assertEqual(azure_policies.cache_info()["size"], 2)
+        self.assertIsNot(first, azure_policies.get_policy_definition(policy_id=policy_ids[0]))
+        self.assertEqual(azure_policies.cache_info()["misses"], 4)
+
+    def test_no_params_selection_uses_precomputed_fields(self):
+        # Selecting policies without parameters only needs the catalog summary, not the policy definitions
+        azure_policies = AzurePolicies()
+        azure_policies.get_all_policy_ids_sorted_by_service(no_params=True, params_optional=False, params_required=False)
+        azure_policies.get_all_display_names_sorted_by_service()
+        self.assertEqual(azure_policies.cache_info()["misses"], 0)
+        for policy_id in azure_policies.policy_ids():
+            policy_details = azure_policies.policy_definitions.get(policy_id)
+            policy_definition = azure_policies.get_policy_definition(policy_id=policy_id)
+            self.assertEqual(policy_details.get("deny_effect_value"), policy_definition.deny_effect_value)
+            self.assertEqual(policy_details.get("deploy_prefixed"), policy_definition.deploy_prefixed)
+            self.assertEqual(policy_details.get("id"), policy_definition.id)
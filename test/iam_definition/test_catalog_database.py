@@ -0,0 +1,88 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.iam_definition.catalog_database import CatalogDatabase, write_catalog_database
+from cloud_guardrails.iam_definition.compliance_index import get_compliance_index
+from cloud_guardrails.iam_definition.policy_catalog import get_policy_catalog
+from cloud_guardrails.shared.config import get_default_config
+
+
+class CatalogDatabaseTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.catalog = get_policy_catalog()
+        self.database = CatalogDatabase.from_catalog(
+            self.catalog.service_definitions, compliance_index=get_compliance_index()
+        )
+
+    def tearDown(self) -> None:
+        self.database.close()
+
+    def test_filters(self):
+        results = self.database.search("vault", service_names=["Key Vault"], effect="Deny", no_params=False, limit=1000)
+        self.assertTrue(len(results) > 0)
+        for result in results:
+            self.assertEqual(result.get("service_name"), "Key Vault")
+            summary = self.catalog.service_definitions["Key Vault"][result.get("short_id")]
+            self.assertIn("deny", summary.get("allowed_effects"))
+            self.assertFalse(summary.get("no_params"))
+        results = self.database.search("vault", parameter="effect", limit=1000)
+        self.assertTrue(len(results) > 0)
+        for result in results:
+            self.assertIn("effect", self.catalog.policy_summary(result.get("short_id")).get("parameter_names"))
+
+    def test_search(self):
+        results = self.database.search("encrypt", limit=1000)
+        self.assertTrue(len(results) > 0)
+        for result in results:
+            text = f"{result.get('display_name')} {result.get('description')}".lower()
+            self.assertIn("encrypt", text)
+        results = self.database.search("encrypt", service_names=["Key Vault"])
+        self.assertTrue(all(result.get("service_name") == "Key Vault" for result in results))
+        self.assertEqual(len(self.database.search("encrypt", limit=2)), 2)
+        # FTS5 syntax in the query is treated as plain words
+        self.assertListEqual(self.database.search('"'), [])
+        self.database.search("encrypt OR NOT (")
+
+    def test_search_skips_what_the_other_commands_skip(self):
+        config = get_default_config(exclude_services=["Storage"])
+        azure_policies = AzurePolicies(config=config)
+        results = self.database.search("should", limit=1000, config=config)
+        self.assertTrue(len(results) > 0)
+        for result in results:
+            self.assertIsNone(azure_policies.policy_exclusion_reason(result.get("short_id")))
+        # With include_skipped and no config, the deprecated, modify and deploy policies are searched too
+        all_results = self.database.search("should", limit=1000, include_skipped=True)
+        skipped = [
+            result for result in all_results
+            if self.catalog.policy_summary(result.get("short_id")).get("modifies_resources")
+        ]
+        self.assertTrue(skipped)
+        self.assertTrue(all(result not in results for result in skipped))
+        self.assertTrue(any(result.get("service_name") == "Storage" for result in all_results))
+        self.assertEqual(len(self.database.search("should", limit=2, config=config)), 2)
+
+    def test_search_without_fts5(self):
+        self.database.has_fts5 = False
+        results = self.database.search("Encrypted variables", limit=1000)
+        self.assertTrue(len(results) > 0)
+        for result in results:
+            text = f"{result.get('display_name')} {result.get('description')}".lower()
+            self.assertIn("encrypted", text)
+            self.assertIn("variables", text)
+
+    def test_written_database(self):
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            path = os.path.join(temporary_directory, "iam-definition.sqlite")
+            write_catalog_database(self.catalog.service_definitions, path, compliance_index=get_compliance_index())
+            database = CatalogDatabase.open(path)
+            self.assertListEqual(database.search("encrypt"), self.database.search("encrypt"))
+            compliance_rows = database.connection.execute("SELECT COUNT(*) FROM compliance").fetchone()[0]
+            self.assertTrue(compliance_rows > 0)
+            database.close()
+            connection = sqlite3.connect(path)
+            connection.execute("PRAGMA user_version = 0")
+            connection.close()
+            with self.assertRaises(Exception):
+                CatalogDatabase.open(path)
@@ -0,0 +1,80 @@
+import unittest
+import os
+import json
+import struct
+import tempfile
+from cloud_guardrails.iam_definition.compact_catalog import write_compact_catalog, read_compact_catalog, \
+    is_compact_catalog, MAGIC, SCHEMA_VERSION
+from cloud_guardrails.iam_definition.policy_catalog import PolicyCatalog, IAM_DEFINITION_PATH
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.shared.config import get_empty_config
+from cloud_guardrails.scrapers.parse_builtin_definitions import create_azure_builtin_definition
+
+
+class CompactCatalogTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.iam_definition = create_azure_builtin_definition()
+        self.path = os.path.join(self.temporary_directory.name, "iam-definition.pickle")
+        write_compact_catalog(self.iam_definition, self.path)
+
+    def tearDown(self) -> None:
+        self.temporary_directory.cleanup()
+
+    def test_round_trip(self):
+        self.assertTrue(is_compact_catalog(self.path))
+        self.assertFalse(is_compact_catalog(IAM_DEFINITION_PATH))
+        compact_catalog = read_compact_catalog(self.path)
+        self.assertEqual(
+            json.dumps(dict(compact_catalog.service_definitions)), json.dumps(self.iam_definition["service_definitions"])
+        )
+        for short_id, policy_details in self.iam_definition["policy_definitions"].items():
+            self.assertDictEqual(compact_catalog.policy_contents[short_id], policy_details["policy_content"])
+            self.assertEqual(compact_catalog.policy_summaries[short_id].get("file_name"), policy_details["file_name"])
+
+    def test_repeated_strings_are_shared(self):
+        service_definitions = read_compact_catalog(self.path).service_definitions
+        service_names = set()
+        for service_name, service_policies in service_definitions.items():
+            for short_id, policy_details in service_policies.items():
+                service_names.add(id(policy_details["service_name"]))
+        self.assertEqual(len(service_names), len([x for x in service_definitions.values() if x]))
+
+    def test_catalog_reads_either_format(self):
+        json_path = os.path.join(self.temporary_directory.name, "iam-definition.json")
+        with open(json_path, "w") as file:
+            json.dump(self.iam_definition, file)
+        json_catalog = PolicyCatalog(json_path)
+        compact_catalog = PolicyCatalog(self.path)
+        self.assertEqual(
+            json.dumps(dict(compact_catalog.service_definitions)), json.dumps(json_catalog.service_definitions)
+        )
+        for short_id in json_catalog.policy_definitions:
+            self.assertDictEqual(compact_catalog.policy_content(short_id), json_catalog.policy_content(short_id))
+            display_name = json_catalog.policy_summary(short_id).get("display_name")
+            self.assertEqual(
+                compact_catalog.get_policy_id_by_display_name(display_name),
+                json_catalog.get_policy_id_by_display_name(display_name)
+            )
+
+    def test_only_the_requested_services_are_loaded(self):
+        catalog = PolicyCatalog(self.path)
+        azure_policies = AzurePolicies(service_names=["Key Vault"], config=get_empty_config(), catalog=catalog)
+        policy_id_pairs = azure_policies.get_all_policy_ids_sorted_by_service()
+        self.assertListEqual(list(policy_id_pairs.keys()), ["Key Vault"])
+        self.assertIn("Storage", catalog.service_names)
+        self.assertListEqual(catalog.service_definitions.loaded_services, ["Key Vault"])
+        # Looking up a policy by display name or ID only reads the shard of its service
+        storage_policy = self.iam_definition["service_definitions"]["Storage"]
+        short_id, policy_details = list(storage_policy.items())[0]
+        self.assertEqual(catalog.get_policy_id_by_display_name(policy_details.get("display_name")), short_id)
+        self.assertListEqual(catalog.service_definitions.loaded_services, ["Key Vault"])
+        self.assertEqual(catalog.policy_summary(short_id).get("service_name"), "Storage")
+        self.assertListEqual(catalog.service_definitions.loaded_services, ["Key Vault", "Storage"])
+
+    def test_schema_version_is_checked(self):
+        with open(self.path, "r+b") as file:
+            file.seek(len(MAGIC))
+            file.write(struct.pack(">H", SCHEMA_VERSION + 1))
+        with self.assertRaises(Exception):
+            read_compact_catalog(self.path)
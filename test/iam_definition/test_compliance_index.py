@@ -0,0 +1,38 @@
+import unittest
+import json
+from cloud_guardrails.iam_definition.compliance_index import ComplianceIndex, COMPLIANCE_DATA_PATH, get_compliance_index
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+
+
+class ComplianceIndexTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        with open(COMPLIANCE_DATA_PATH, "r") as file:
+            self.compliance_data = json.load(file)
+        self.display_name = list(self.compliance_data.keys())[0]
+        self.compliance_metadata = self.compliance_data[self.display_name]
+
+    def test_compliance_index_is_loaded_on_first_use(self):
+        compliance_index = ComplianceIndex()
+        self.assertIsNone(compliance_index._by_policy_id)
+        self.assertIsNotNone(compliance_index.get(policy_id=self.compliance_metadata.get("policy_id")))
+        self.assertIsNotNone(compliance_index._by_policy_id)
+
+    def test_get_by_policy_id(self):
+        compliance_index = ComplianceIndex()
+        result = compliance_index.get(policy_id=self.compliance_metadata.get("policy_id"), display_name="Renamed policy")
+        self.assertDictEqual(result, self.compliance_metadata)
+
+    def test_get_by_display_name(self):
+        compliance_index = ComplianceIndex()
+        # The policy ID is not in the compliance data, so the display name is used
+        result = compliance_index.get(policy_id="not-a-policy-id", display_name=self.display_name)
+        self.assertDictEqual(result, self.compliance_metadata)
+        # Display names that drifted a bit between the docs and the catalog still match
+        drifted_display_name = f"[Preview]: {self.display_name.upper()}."
+        result = compliance_index.get(policy_id="not-a-policy-id", display_name=drifted_display_name)
+        self.assertDictEqual(result, self.compliance_metadata)
+        self.assertIsNone(compliance_index.get(policy_id="not-a-policy-id", display_name="This policy does not exist"))
+
+    def test_azure_policies_uses_shared_compliance_index(self):
+        azure_policies = AzurePolicies()
+        self.assertIs(azure_policies.compliance_index, get_compliance_index())
@@ -0,0 +1,66 @@
+import unittest
+from cloud_guardrails.iam_definition.policy_catalog import PolicyCatalog, get_policy_catalog
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.shared.config import get_default_config
+from cloud_guardrails.shared import utils
+
+
+class PolicyCatalogTestCase(unittest.TestCase):
+    def test_catalog_is_loaded_on_first_use(self):
+        catalog = PolicyCatalog()
+        # Nothing is read from disk until a policy is looked up
+        self.assertIsNone(catalog._service_definitions)
+        self.assertIsNone(catalog._policy_contents)
+        self.assertTrue(len(catalog.service_definitions) > 0)
+        self.assertIsNotNone(catalog._policy_contents)
+
+    def test_policy_summary_and_content(self):
+        catalog = PolicyCatalog()
+        service_name = list(catalog.service_definitions.keys())[0]
+        policy_id = list(catalog.service_definitions[service_name].keys())[0]
+        summary = catalog.policy_summary(policy_id)
+        self.assertEqual(summary.get("short_id"), policy_id)
+        # The summary does not carry the full policy content
+        self.assertNotIn("policy_content", summary)
+        policy_content = catalog.policy_content(policy_id)
+        self.assertEqual(policy_content.get("name"), policy_id)
+
+    def test_azure_policies_uses_shared_catalog(self):
+        azure_policies = AzurePolicies()
+        self.assertIs(azure_policies.catalog, get_policy_catalog())
+        catalog = PolicyCatalog()
+        azure_policies = AzurePolicies(catalog=catalog)
+        self.assertIs(azure_policies.catalog, catalog)
+
+    def test_get_policy_id_by_display_name(self):
+        catalog = PolicyCatalog()
+        for policy_id, policy_details in catalog.policy_definitions.items():
+            display_name = policy_details.get("display_name")
+            self.assertIsNotNone(catalog.get_policy_id_by_display_name(display_name))
+            # The '[Preview]: ' prefix is optional when looking up a policy
+            if display_name.startswith("[Preview]: "):
+                self.assertIsNotNone(catalog.get_policy_id_by_display_name(display_name.replace("[Preview]: ", "")))
+        self.assertIsNone(catalog.get_policy_id_by_display_name("This policy does not exist"))
+
+    def test_service_names(self):
+        catalog = PolicyCatalog()
+        service_names = catalog.service_names
+        self.assertIsInstance(service_names, tuple)
+        self.assertEqual(list(service_names), sorted(catalog.service_definitions.keys()))
+        # Computed once
+        self.assertIs(catalog.service_names, service_names)
+        self.assertTrue(catalog.is_supported_service("Key Vault"))
+        self.assertFalse(catalog.is_supported_service("Azure Government"))
+        self.assertFalse(catalog.is_supported_service("all"))
+
+    def test_azure_policies_does_not_change_the_shared_service_names(self):
+        expected = utils.get_service_names()
+        config = get_default_config(exclude_services=["Key Vault"])
+        service_names = ["Key Vault", "Storage"]
+        azure_policies = AzurePolicies(service_names=service_names, config=config)
+        self.assertListEqual(azure_policies.service_names, ["Storage"])
+        self.assertListEqual(service_names, ["Key Vault", "Storage"])
+        azure_policies = AzurePolicies(service_names=["all"], config=config)
+        self.assertNotIn("Key Vault", azure_policies.service_names)
+        self.assertEqual(utils.get_service_names(), expected)
+        self.assertIn("Key Vault", utils.get_service_names())
@@ -0,0 +1,51 @@
+import unittest
+import os
+import json
+import tempfile
+from unittest import mock
+from cloud_guardrails.iam_definition import policy_content_store
+from cloud_guardrails.iam_definition.policy_content_store import PolicyContentStore, write_policy_content_store
+from cloud_guardrails.scrapers.parse_builtin_definitions import create_azure_builtin_definition
+
+
+class PolicyContentStoreTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temporary_directory.name, "contents.jsonl")
+        self.policy_contents = {
+            short_id: policy_details.get("policy_content")
+            for short_id, policy_details in create_azure_builtin_definition()["policy_definitions"].items()
+        }
+        self.content_sha256 = write_policy_content_store(self.policy_contents, self.path)
+
+    def tearDown(self) -> None:
+        self.temporary_directory.cleanup()
+
+    def test_every_policy_can_be_read(self):
+        store = PolicyContentStore(self.path, content_sha256=self.content_sha256)
+        self.assertEqual(len(store), len(self.policy_contents))
+        for short_id, policy_content in self.policy_contents.items():
+            self.assertIn(short_id, store)
+            self.assertDictEqual(store.get(short_id), policy_content)
+            self.assertDictEqual(store[short_id], policy_content)
+        self.assertIsNone(store.get("does-not-exist"))
+        with self.assertRaises(KeyError):
+            store["does-not-exist"]
+        store.close()
+
+    def test_only_the_requested_policy_is_parsed(self):
+        store = PolicyContentStore(self.path)
+        # Open the index first, so only the lookup itself is counted
+        store.records
+        short_id = list(self.policy_contents.keys())[-1]
+        with mock.patch.object(policy_content_store.json, "loads", wraps=json.loads) as loads:
+            policy_content = store.get(short_id)
+        self.assertEqual(loads.call_count, 1)
+        self.assertEqual(len(loads.call_args[0][0]), store.records[short_id][1])
+        self.assertEqual(policy_content.get("name"), short_id)
+        store.close()
+
+    def test_store_must_match_the_catalog(self):
+        store = PolicyContentStore(self.path, content_sha256="0" * 64)
+        with self.assertRaises(Exception):
+            store.get(list(self.policy_contents.keys())[0])
@@ -316,3 +316,20 @@ class PolicyDefinitionV2TestCase(unittest.TestCase):
         }
         print(json.dumps(results, indent=4))
         self.assertDictEqual(results, expected_results)
+
+    def test_allowed_effects_structural_walk(self):
+        """PolicyDefinition.allowed_effects: field names in the 'if' block do not count as effects"""
+        policy_content = json.loads(json.dumps(no_params_definition))
+        policy_content["properties"]["policyRule"]["if"] = {
+            "field": "Microsoft.Automation/automationAccounts/variables/lastModifyAppendDeployIfNotExists",
+            "exists": "true"
+        }
+        policy_definition = PolicyDefinition(policy_content=policy_content, service_name="Automation")
+        self.assertListEqual(policy_definition.allowed_effects, ['audit', 'deny', 'disabled'])
+        self.assertFalse(policy_definition.modifies_resources)
+
+        # The effects are only computed once per policy definition
+        policy_definition.properties.policy_rule["then"]["effect"] = "modify"
+        self.assertListEqual(policy_definition.allowed_effects, ['audit', 'deny', 'disabled'])
+        # The effect parameter's allowed values are left untouched
+        self.assertListEqual(policy_definition.parameters["effect"].allowed_values, ['Audit', 'Deny', 'Disabled'])
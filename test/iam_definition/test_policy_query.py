@@ -0,0 +1,74 @@
+import unittest
+from cloud_guardrails.iam_definition.policy_query import compile_query
+from cloud_guardrails.iam_definition.policy_catalog import PolicyCatalog
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.shared.config import get_default_config
+
+
+def version_at_least(version: str, minimum: tuple) -> bool:
+    numbers = []
+    for part in version.split("-")[0].split("."):
+        numbers.append(int(part))
+    return tuple(numbers) >= minimum
+
+
+class PolicyQueryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.catalog = PolicyCatalog()
+        self.table = self.catalog.policy_table
+        self.rows = []
+        for service_name, service_policies in self.catalog.service_definitions.items():
+            for short_id, policy_details in service_policies.items():
+                self.rows.append(policy_details)
+
+    def assertQueryMatches(self, query: str, predicate):
+        expected = [row for row, policy_details in enumerate(self.rows) if predicate(policy_details)]
+        results = self.table.rows(compile_query(query).mask(self.table))
+        self.assertListEqual(results, expected, query)
+
+    def test_queries_match_the_summaries(self):
+        self.assertQueryMatches(
+            "service = 'key vault' and effect = DENY",
+            lambda p: p["service_name"] == "Key Vault" and "deny" in p["allowed_effects"]
+        )
+        self.assertQueryMatches(
+            'service in ("Key Vault", Storage) and not params_required',
+            lambda p: p["service_name"] in ("Key Vault", "Storage") and not p["params_required"]
+        )
+        self.assertQueryMatches(
+            "parameter = effect or mode = Indexed",
+            lambda p: "effect" in p["parameter_names"] or p["mode"] == "Indexed"
+        )
+        self.assertQueryMatches(
+            "category ~ kube and version >= 2 and not preview",
+            lambda p: "kube" in p["category"].lower() and version_at_least(p["version"], (2,)) and not p["preview"]
+        )
+        self.assertQueryMatches("version != 1.0.0", lambda p: p["version"] != "1.0.0")
+        self.assertQueryMatches("name ~ 'should be'", lambda p: "should be" in p["display_name"].lower())
+        self.assertQueryMatches(
+            "audit_only or (deprecated and not no_params)",
+            lambda p: p["audit_only"] or (p["is_deprecated"] and not p["no_params"])
+        )
+
+    def test_and_evaluates_the_cheapest_operands_first(self):
+        query = compile_query("name ~ vault and not preview and service = 'Key Vault'")
+        self.assertEqual(str(query), "(not preview and service = 'Key Vault' and name ~ 'vault')")
+
+    def test_invalid_queries(self):
+        for text in ["", "service =", "unknown = 1", "(service = SQL", "service < 2", "version > abc", "service = a b"]:
+            with self.assertRaises(Exception):
+                compile_query(text)
+
+    def test_where_narrows_the_selection(self):
+        azure_policies = AzurePolicies(service_names=["all"], config=get_default_config())
+        where = compile_query("effect = deny")
+        results = azure_policies.get_all_policy_ids_sorted_by_service(where=where)
+        everything = azure_policies.get_all_policy_ids_sorted_by_service()
+        self.assertTrue(results)
+        for service_name, service_policies in results.items():
+            for display_name, policy_details in service_policies.items():
+                self.assertIn(display_name, everything[service_name])
+                summary = azure_policies.policy_definitions.get(policy_details.get("short_id"))
+                self.assertIn("deny", summary.get("allowed_effects"))
+        display_names = azure_policies.get_display_names_by_query(where, service_names=["Key Vault"])
+        self.assertListEqual(list(display_names.keys()), ["Key Vault"])
@@ -0,0 +1,82 @@
+import unittest
+import os
+import json
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.shared.config import get_default_config
+from cloud_guardrails.shared.parameters_categorized import CategorizedParameters
+from cloud_guardrails.terraform.terraform_no_params import TerraformTemplateNoParams
+from cloud_guardrails.terraform.terraform_with_params import TerraformTemplateWithParams
+
+
+# The output of get_all_policy_ids_sorted_by_service before the single-pass selection, over the policies in the
+# azure-policy submodule, with the default config. Regenerate it with the old implementation if the submodule changes.
+LEGACY_RESULTS_FILE = os.path.join(os.path.dirname(__file__), os.path.pardir, "files", "policy_id_pairs_legacy.json")
+LEGACY_CASES = {
+    "no_params": dict(no_params=True, params_optional=False, params_required=False, enforce=False),
+    "params_optional": dict(no_params=False, params_optional=True, params_required=False, enforce=False),
+    "params_optional_enforce": dict(no_params=False, params_optional=True, params_required=False, enforce=True),
+    "params_required": dict(no_params=False, params_optional=False, params_required=True, enforce=False),
+}
+
+
+def legacy_policy_ids_sorted_by_service(case: str) -> dict:
+    with open(LEGACY_RESULTS_FILE) as json_file:
+        return json.load(json_file)[case]
+
+
+class PolicySelectionTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.config = get_default_config(exclude_services=None)
+        self.azure_policies = AzurePolicies(service_names=["all"], config=self.config)
+
+    def test_single_pass_selection_matches_legacy(self):
+        for case, arguments in LEGACY_CASES.items():
+            expected = legacy_policy_ids_sorted_by_service(case)
+            results = self.azure_policies.get_all_policy_ids_sorted_by_service(**arguments)
+            self.assertEqual(json.dumps(results), json.dumps(expected), case)
+
+    def test_only_requested_services_are_returned(self):
+        service_names = list(self.azure_policies.service_definitions.keys())[:2]
+        azure_policies = AzurePolicies(service_names=service_names, config=self.config)
+        results = azure_policies.get_all_policy_ids_sorted_by_service()
+        self.assertTrue(set(results.keys()).issubset(set(service_names)))
+
+    def test_audit_only_selects_audit_only_policies(self):
+        results = self.azure_policies.get_all_policy_ids_sorted_by_service(audit_only=True)
+        for service_name, service_policies in results.items():
+            for display_name, policy_details in service_policies.items():
+                summary = self.azure_policies.catalog.policy_summary(policy_details.get("short_id"))
+                self.assertTrue(summary.get("audit_only"))
+
+    def test_rendered_terraform_is_identical_no_params(self):
+        expected = legacy_policy_ids_sorted_by_service("no_params")
+        results = self.azure_policies.get_all_policy_ids_sorted_by_service(**LEGACY_CASES["no_params"])
+        for enforce in (False, True):
+            expected_rendered = TerraformTemplateNoParams(
+                policy_id_pairs=expected, subscription_name="example", enforcement_mode=enforce).rendered()
+            rendered = TerraformTemplateNoParams(
+                policy_id_pairs=results, subscription_name="example", enforcement_mode=enforce).rendered()
+            self.assertEqual(rendered.encode("utf-8"), expected_rendered.encode("utf-8"))
+
+    def test_rendered_terraform_is_identical_with_params(self):
+        categorized_parameters = CategorizedParameters(
+            azure_policies=self.azure_policies,
+            params_required=False,
+            params_optional=True,
+            audit_only=False,
+            enforce=True
+        )
+        expected = legacy_policy_ids_sorted_by_service("params_optional_enforce")
+        results = self.azure_policies.get_all_policy_ids_sorted_by_service(**LEGACY_CASES["params_optional_enforce"])
+        rendered = []
+        for policy_id_pairs in (expected, results):
+            rendered.append(TerraformTemplateWithParams(
+                policy_id_pairs=policy_id_pairs,
+                parameter_requirement_str="PO",
+                categorized_parameters=categorized_parameters,
+                subscription_name="example",
+                management_group="",
+                enforcement_mode=True,
+                category="Testing"
+            ).rendered().encode("utf-8"))
+        self.assertEqual(rendered[1], rendered[0])
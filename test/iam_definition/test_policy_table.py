@@ -0,0 +1,67 @@
+import unittest
+import os
+import tempfile
+from cloud_guardrails.iam_definition.policy_table import PolicyTable, BOOLEAN_COLUMNS, mask_of, count
+from cloud_guardrails.iam_definition.policy_catalog import PolicyCatalog
+from cloud_guardrails.iam_definition.compact_catalog import write_compact_catalog
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.shared.config import get_default_config, get_empty_config
+from cloud_guardrails.scrapers.parse_builtin_definitions import create_azure_builtin_definition
+
+
+class PolicyTableTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.catalog = PolicyCatalog()
+        self.table = self.catalog.policy_table
+
+    def test_rows_follow_the_catalog(self):
+        rows = []
+        for service_name, service_policies in self.catalog.service_definitions.items():
+            for short_id, policy_details in service_policies.items():
+                rows.append((service_name, short_id, policy_details))
+        self.assertEqual(len(self.table), len(rows))
+        for row, (service_name, short_id, policy_details) in enumerate(rows):
+            self.assertEqual(self.table.short_ids[row], short_id)
+            self.assertEqual(self.table.service_name(row), service_name)
+            self.assertEqual(self.table.display_names[row], policy_details.get("display_name"))
+            for column in BOOLEAN_COLUMNS:
+                self.assertEqual(bool(self.table.column(column) >> row & 1), bool(policy_details.get(column)))
+            for effect in policy_details.get("allowed_effects"):
+                self.assertIn(row, self.table.rows(self.table.effects([effect.upper()])))
+
+    def test_mask_operations(self):
+        self.assertListEqual(PolicyTable.rows(mask_of([0, 3, 70])), [0, 3, 70])
+        self.assertListEqual(PolicyTable.rows(0), [])
+        self.assertEqual(count(mask_of([1, 2, 100])), 3)
+        key_vault = self.table.services(["Key Vault"])
+        self.assertEqual(self.table.services(["Key Vault", "Not a service"]), key_vault)
+        self.assertSetEqual(
+            {self.table.service_name(row) for row in self.table.rows(key_vault)}, {"Key Vault"}
+        )
+        self.assertEqual(self.table.parameter_requirements(), self.table.all)
+        with self.assertRaises(Exception):
+            self.table.column("not_a_column")
+
+    def test_compact_catalog_stores_the_table(self):
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            path = os.path.join(temporary_directory, "iam-definition.pickle")
+            iam_definition = create_azure_builtin_definition()
+            write_compact_catalog(iam_definition, path)
+            catalog = PolicyCatalog(path)
+            table = catalog.policy_table
+            expected = PolicyTable.from_service_definitions(iam_definition["service_definitions"])
+            self.assertDictEqual(table.to_dict(), expected.to_dict())
+            # Listing the policies only needs the table, so no service shard is read
+            azure_policies = AzurePolicies(config=get_empty_config(), catalog=catalog)
+            self.assertTrue(azure_policies.get_all_display_names_sorted_by_service())
+            self.assertListEqual(catalog.service_definitions.loaded_services, [])
+
+    def test_audit_only_display_names(self):
+        azure_policies = AzurePolicies(config=get_default_config())
+        results = azure_policies.get_all_display_names_sorted_by_service(audit_only=True)
+        expected = {}
+        for service_name, service_policies in azure_policies.service_definitions.items():
+            for short_id, policy_details in service_policies.items():
+                if policy_details.get("audit_only") and not azure_policies.is_policy_id_excluded(policy_id=short_id):
+                    expected.setdefault(service_name, set()).add(policy_details.get("display_name"))
+        self.assertDictEqual({service_name: set(names) for service_name, names in results.items()}, expected)
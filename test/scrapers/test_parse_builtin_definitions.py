@@ -0,0 +1,102 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from unittest import mock
+from cloud_guardrails.shared import utils
+from cloud_guardrails.scrapers.parse_builtin_definitions import create_azure_builtin_definition, \
+    build_azure_builtin_definition, read_manifest, write_manifest
+from cloud_guardrails.scrapers.policy_source import get_service_policy_files
+
+
+class ParseBuiltinDefinitionsTestCase(unittest.TestCase):
+    def test_parallel_build_matches_serial_build(self):
+        timings = {}
+        serial = create_azure_builtin_definition(jobs=1, timings=timings)
+        self.assertListEqual(list(timings.keys()), ["list files", "parse policies", "merge"])
+        parallel = create_azure_builtin_definition(jobs=2)
+        self.assertEqual(json.dumps(parallel, indent=4), json.dumps(serial, indent=4))
+
+    def test_policy_definitions_carry_the_summary_and_content(self):
+        results = create_azure_builtin_definition()
+        for service_name, service_policies in results.get("service_definitions").items():
+            for short_id, service_definition_entry in service_policies.items():
+                policy_definition_entry = results.get("policy_definitions").get(short_id)
+                self.assertEqual(policy_definition_entry.get("policy_content").get("name"), short_id)
+                policy_definition_entry = dict(policy_definition_entry)
+                policy_definition_entry.pop("policy_content")
+                self.assertDictEqual(policy_definition_entry, service_definition_entry)
+
+
+class IncrementalBuildTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_directory = tempfile.mkdtemp()
+        for service_name in ["Azure Government", "Regulatory Compliance", "Key Vault", "Storage"]:
+            shutil.copytree(
+                os.path.join(utils.AZURE_POLICY_SERVICE_DIRECTORY, service_name),
+                os.path.join(self.temporary_directory, service_name)
+            )
+        self.patcher = mock.patch.object(utils, "AZURE_POLICY_SERVICE_DIRECTORY", self.temporary_directory)
+        self.patcher.start()
+
+    def tearDown(self) -> None:
+        self.patcher.stop()
+        shutil.rmtree(self.temporary_directory)
+
+    def test_incremental_build_matches_full_build(self):
+        previous_results, previous_manifest, changes = build_azure_builtin_definition()
+        previous_results = json.loads(json.dumps(previous_results))
+        self.assertEqual(changes.get("added"), len(previous_manifest.get("files")))
+
+        storage_directory = os.path.join(self.temporary_directory, "Storage")
+        policy_files = get_service_policy_files(storage_directory)
+        # Change one file, add one and remove one
+        changed_file = os.path.join(storage_directory, policy_files[0])
+        policy_content = utils.read_json_file(changed_file)
+        policy_content["properties"]["displayName"] = "A changed display name"
+        with open(changed_file, "w") as file:
+            json.dump(policy_content, file)
+        policy_content["name"] = "00000000-0000-0000-0000-000000000000"
+        policy_content["properties"]["displayName"] = "An added policy"
+        with open(os.path.join(storage_directory, "Storage_Added.json"), "w") as file:
+            json.dump(policy_content, file)
+        os.remove(os.path.join(storage_directory, policy_files[1]))
+
+        results, manifest, changes = build_azure_builtin_definition(
+            previous_results=previous_results, previous_manifest=previous_manifest
+        )
+        self.assertDictEqual(
+            changes, dict(added=1, changed=1, removed=1, unchanged=len(previous_manifest.get("files")) - 2)
+        )
+        expected_results, expected_manifest, expected_changes = build_azure_builtin_definition()
+        self.assertEqual(json.dumps(results, indent=4), json.dumps(expected_results, indent=4))
+        self.assertDictEqual(manifest, expected_manifest)
+
+    def test_touched_files_are_hashed_but_not_parsed(self):
+        previous_results, previous_manifest, changes = build_azure_builtin_definition()
+        for service_name in ["Key Vault", "Storage"]:
+            service_directory = os.path.join(self.temporary_directory, service_name)
+            for policy_file_name in get_service_policy_files(service_directory):
+                os.utime(os.path.join(service_directory, policy_file_name), ns=(0, 0))
+        with mock.patch(
+            "cloud_guardrails.scrapers.parse_builtin_definitions.parse_policy_file", side_effect=AssertionError
+        ):
+            results, manifest, changes = build_azure_builtin_definition(
+                previous_results=previous_results, previous_manifest=previous_manifest
+            )
+        self.assertEqual(changes.get("unchanged"), len(previous_manifest.get("files")))
+        self.assertEqual(json.dumps(results), json.dumps(previous_results))
+
+    def test_manifest_is_tied_to_the_catalog(self):
+        results, manifest, changes = build_azure_builtin_definition()
+        catalog_path = os.path.join(self.temporary_directory, "iam-definition.json")
+        manifest_path = os.path.join(self.temporary_directory, "iam-definition-manifest.json")
+        with open(catalog_path, "w") as file:
+            json.dump(results, file, indent=4)
+        write_manifest(manifest, catalog_path, manifest_path=manifest_path)
+        self.assertDictEqual(read_manifest(catalog_path, manifest_path=manifest_path), manifest)
+        # A catalog that was written without the manifest can't be updated incrementally
+        with open(catalog_path, "a") as file:
+            file.write("\n")
+        self.assertIsNone(read_manifest(catalog_path, manifest_path=manifest_path))
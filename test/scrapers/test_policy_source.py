@@ -0,0 +1,94 @@
+import unittest
+import os
+import json
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import subprocess
+from cloud_guardrails.shared import utils
+from cloud_guardrails.scrapers.parse_builtin_definitions import create_azure_builtin_definition
+from cloud_guardrails.scrapers.policy_source import DirectoryPolicySource, GitPolicySource, ArchivePolicySource, \
+    POLICY_DEFINITIONS_PATH
+
+
+class PolicySourceTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_directory = tempfile.mkdtemp()
+        self.repository = os.path.join(self.temporary_directory, "azure-policy")
+        self.policy_directory = os.path.join(self.repository, *POLICY_DEFINITIONS_PATH.split("/"))
+        for service_name in ["Azure Government", "Key Vault", "Storage"]:
+            shutil.copytree(
+                os.path.join(utils.AZURE_POLICY_SERVICE_DIRECTORY, service_name),
+                os.path.join(self.policy_directory, service_name)
+            )
+        self.expected = create_azure_builtin_definition(source=DirectoryPolicySource(self.policy_directory))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temporary_directory)
+
+    def assert_same_catalog(self, source):
+        with source:
+            self.assertListEqual(source.service_names(), ["Key Vault", "Storage"])
+            results = create_azure_builtin_definition(source=source)
+        self.assertEqual(json.dumps(results, indent=4), json.dumps(self.expected, indent=4))
+
+    def test_git_source(self):
+        def git(*args):
+            subprocess.run(["git", "-C", self.repository, *args], check=True, stdout=subprocess.PIPE)
+        git("init", "-q")
+        git("add", ".")
+        git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "policies")
+        # The working tree is not used
+        shutil.rmtree(os.path.join(self.repository, "built-in-policies"))
+        self.assert_same_catalog(GitPolicySource(self.repository))
+
+    def test_tarball_source(self):
+        archive = os.path.join(self.temporary_directory, "azure-policy.tar.gz")
+        with tarfile.open(archive, "w:gz") as tar:
+            tar.add(self.repository, arcname="azure-policy-master")
+        self.assert_same_catalog(ArchivePolicySource(archive))
+
+    def test_tarball_source_is_streamed(self):
+        archive = os.path.join(self.temporary_directory, "azure-policy.tar.gz")
+        with tarfile.open(archive, "w:gz") as tar:
+            for service_name in ["Key Vault", "Storage"]:
+                service_directory = os.path.join(self.policy_directory, service_name)
+                for file_name in sorted(os.listdir(service_directory)):
+                    tar.add(os.path.join(service_directory, file_name),
+                            arcname=f"azure-policy-master/{POLICY_DEFINITIONS_PATH}/{service_name}/{file_name}")
+        directory_source = DirectoryPolicySource(self.policy_directory)
+        with ArchivePolicySource(archive) as source:
+            # In archive order, nothing is kept in memory between reads
+            for service_name in ["Key Vault", "Storage"]:
+                policy_files = source.policy_files(service_name)
+                self.assertDictEqual(
+                    source.read_policy_files(service_name, policy_files),
+                    directory_source.read_policy_files(service_name, policy_files)
+                )
+                self.assertDictEqual(source._pending, {})
+            # Out of order, the stream starts over and keeps the files it passes until they are asked for
+            storage_files = source.policy_files("Storage")
+            key_vault_files = source.policy_files("Key Vault")
+            self.assertDictEqual(
+                source.read_policy_files("Storage", storage_files[-1:]),
+                directory_source.read_policy_files("Storage", storage_files[-1:])
+            )
+            self.assertDictEqual(
+                source.read_policy_files("Key Vault", key_vault_files),
+                directory_source.read_policy_files("Key Vault", key_vault_files)
+            )
+            # Only the Storage files that were passed on the way, and not asked for yet, are still kept
+            self.assertSetEqual(
+                {member_name.rsplit("/", 1)[1] for member_name in source._pending}, set(storage_files[:-1])
+            )
+        self.assertDictEqual(source._pending, {})
+
+    def test_zip_source(self):
+        archive = os.path.join(self.temporary_directory, "azure-policy.zip")
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            for directory, directory_names, file_names in os.walk(self.repository):
+                for file_name in file_names:
+                    path = os.path.join(directory, file_name)
+                    zip_file.write(path, os.path.relpath(path, self.repository).replace(os.sep, "/"))
+        self.assert_same_catalog(ArchivePolicySource(archive))
@@ -5,7 +5,8 @@ import json
 from yaml.constructor import ConstructorError
 import logging
 from cloud_guardrails.shared import utils
-from cloud_guardrails.shared.config import get_config_template, Config, get_config_from_file, get_default_config
+from cloud_guardrails.shared.config import get_config_template, Config, get_config_from_file, get_default_config, \
+    KeywordMatcher
 
 logger = logging.getLogger(__name__)
 example_config_file = os.path.abspath(os.path.join(
@@ -88,6 +89,49 @@ class ConfigTestCase(unittest.TestCase):
         self.assertTrue(config.is_excluded("App Configuration", "App Configuration should use private link"))
         self.assertTrue(config.is_excluded("Cosmos DB", "CosmosDB accounts should use private link"))
 
+    def test_keyword_matcher_reports_the_keyword(self):
+        matcher = KeywordMatcher(["Private Link", "link", "", "encrypt"])
+        self.assertTrue(matcher)
+        self.assertFalse(KeywordMatcher([]))
+        self.assertEqual(matcher.match("App Configuration should use PRIVATE LINK"), "private link")
+        self.assertEqual(matcher.match("Automation account variables should be encrypted"), "encrypt")
+        self.assertIsNone(matcher.match("Audit VMs that do not use managed disks"))
+        # Regex characters in keywords are matched literally
+        self.assertEqual(KeywordMatcher(["[preview]: "]).match("[Preview]: Something"), "[preview]: ")
+        config = get_default_config(match_only_keywords=["Encrypt"], exclude_keywords=["automation"])
+        self.assertEqual(config.matching_keyword("Disks should be encrypted"), "encrypt")
+        self.assertEqual(config.excluding_keyword("Automation account variables should be encrypted"), "automation")
+        self.assertTrue(config.is_excluded("Automation", "Automation account variables should be encrypted"))
+        self.assertFalse(config.is_excluded("Compute", "Disks should be encrypted"))
+        self.assertTrue(config.is_excluded("Compute", "Audit VMs that do not use managed disks"))
+
+    def test_excluded_policies_only_apply_to_their_service(self):
+        config = Config(
+            exclude_policies={
+                "Key Vault": ["Key vaults should have purge protection enabled"],
+                "Storage": ["Storage accounts should restrict network access"],
+            },
+            exclude_services=["Guest Configuration"],
+        )
+        self.assertTrue(config.is_policy_excluded("Key Vault", "Key vaults should have purge protection enabled"))
+        # Listed under Key Vault only, so the same name under Storage is kept
+        self.assertFalse(config.is_policy_excluded("Storage", "Key vaults should have purge protection enabled"))
+        self.assertFalse(config.is_excluded("Storage", "Key vaults should have purge protection enabled"))
+        self.assertTrue(config.is_excluded("Storage", "Storage accounts should restrict network access"))
+        self.assertFalse(config.is_excluded("Key Vault", "Storage accounts should restrict network access"))
+        self.assertTrue(config.is_excluded("Guest Configuration", "Any policy"))
+        self.assertFalse(config.is_policy_excluded("SQL", "Any policy"))
+
+    def test_is_excluded_decisions_are_cached(self):
+        config = get_default_config(exclude_keywords=["private link"])
+        self.assertTrue(config.is_excluded("Cosmos DB", "CosmosDB accounts should use private link"))
+        self.assertEqual(
+            config.exclusion_reason("Cosmos DB", "CosmosDB accounts should use private link"), "excluded_keyword"
+        )
+        self.assertIn(("Cosmos DB", "CosmosDB accounts should use private link"), config._decisions)
+        config._decisions[("Cosmos DB", "CosmosDB accounts should use private link")] = ""
+        self.assertFalse(config.is_excluded("Cosmos DB", "CosmosDB accounts should use private link"))
+
     def test_exclude_services_config(self):
         config = get_default_config(exclude_services=["Guest Configuration"])
         response = config.is_service_excluded(service_name="Guest Configuration")
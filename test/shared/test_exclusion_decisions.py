@@ -0,0 +1,65 @@
+import time
+import threading
+import unittest
+from unittest import mock
+from cloud_guardrails.shared.exclusion_decisions import ExclusionDecisions, REASONS, DEPRECATED, MODIFY, \
+    EXCLUDED_SERVICE
+from cloud_guardrails.iam_definition import azure_policies as azure_policies_module
+from cloud_guardrails.iam_definition.azure_policies import AzurePolicies
+from cloud_guardrails.shared.config import get_default_config
+
+
+class ExclusionDecisionsTestCase(unittest.TestCase):
+    def test_record_and_count(self):
+        decisions = ExclusionDecisions(5)
+        self.assertEqual(len(decisions), 5)
+        self.assertListEqual(decisions.excluded_rows(), [])
+        decisions.record(1, MODIFY)
+        decisions.record(3, DEPRECATED)
+        decisions.record(4, MODIFY)
+        self.assertListEqual(decisions.excluded_rows(), [1, 3, 4])
+        self.assertEqual(decisions.reason(3), DEPRECATED)
+        self.assertIsNone(decisions.reason(0))
+        # Counts follow the order of REASONS
+        self.assertListEqual(list(decisions.counts().items()), [(DEPRECATED, 1), (MODIFY, 2)])
+        with self.assertRaises(KeyError):
+            decisions.record(0, "not a reason")
+
+    def test_exclusion_report_matches_the_policy_checks(self):
+        config = get_default_config(exclude_services=["Key Vault"])
+        azure_policies = AzurePolicies(service_names=["all"], config=config)
+        azure_policies.get_all_display_names_sorted_by_service()
+        report = azure_policies.exclusion_report()
+        self.assertTrue(report.get("policies"))
+        self.assertEqual(sum(report.get("counts").values()), len(report.get("policies")))
+        reference = AzurePolicies(service_names=["all"], config=config)
+        for short_id, decision in report.get("policies").items():
+            self.assertIn(decision.get("reason"), REASONS)
+            self.assertEqual(reference.policy_exclusion_reason(short_id), decision.get("reason"))
+        self.assertIn(EXCLUDED_SERVICE, report.get("counts"))
+        for service_name, service_policies in reference.service_definitions.items():
+            for short_id in service_policies:
+                if short_id not in report.get("policies"):
+                    self.assertIsNone(reference.policy_exclusion_reason(short_id))
+
+    def test_exclusion_decisions_are_allocated_once_across_threads(self):
+        class SlowExclusionDecisions(ExclusionDecisions):
+            def __init__(self, size: int):
+                time.sleep(0.05)
+                super().__init__(size)
+
+        azure_policies = AzurePolicies(service_names=["all"], config=get_default_config())
+        barrier = threading.Barrier(4)
+        allocated = []
+
+        def allocate():
+            barrier.wait()
+            allocated.append(azure_policies.exclusion_decisions)
+
+        with mock.patch.object(azure_policies_module, "ExclusionDecisions", SlowExclusionDecisions):
+            threads = [threading.Thread(target=allocate) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len({id(decisions) for decisions in allocated}), 1)
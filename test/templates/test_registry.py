@@ -0,0 +1,45 @@
+import unittest
+import os
+import tempfile
+from cloud_guardrails.templates import registry
+from cloud_guardrails.templates.registry import register_template, get_template, precompile_templates
+from cloud_guardrails.templates.config_template import get_config_template
+
+
+class TemplateRegistryTestCase(unittest.TestCase):
+    def tearDown(self) -> None:
+        registry.clear_template_cache()
+
+    def test_template_is_compiled_once(self):
+        template = get_template("config-template")
+        self.assertIs(get_template("config-template"), template)
+
+    def test_filters_and_tests_are_registered(self):
+        with tempfile.TemporaryDirectory() as directory:
+            template_path = os.path.join(directory, "example.j2")
+            with open(template_path, "w") as file:
+                file.write("{% if t is shouting %}{{ t | exclaim }}{% endif %}")
+            register_template(
+                "example", template_path,
+                filters={"exclaim": lambda value: f"{value}!"},
+                tests={"shouting": lambda value: value.isupper()},
+            )
+            self.assertEqual(get_template("example").render(t="HELLO"), "HELLO!")
+            self.assertEqual(get_template("example").render(t="hello"), "")
+
+    def test_unregistered_template(self):
+        with self.assertRaises(Exception):
+            get_template("this template does not exist")
+
+    def test_precompiled_templates_render_the_same(self):
+        expected = get_config_template()
+        compiled_templates_directory = registry.COMPILED_TEMPLATES_DIRECTORY
+        with tempfile.TemporaryDirectory() as directory:
+            registry.COMPILED_TEMPLATES_DIRECTORY = directory
+            try:
+                compiled = precompile_templates(target_directory=directory)
+                self.assertIn("config-template", compiled)
+                self.assertTrue(registry._template_specs["config-template"].compiled_is_current())
+                self.assertEqual(get_config_template(), expected)
+            finally:
+                registry.COMPILED_TEMPLATES_DIRECTORY = compiled_templates_directory
@@ -1,5 +1,7 @@
 import unittest
+import os
 import json
+import tempfile
 from cloud_guardrails.shared.config import get_default_config
 from cloud_guardrails.terraform.guardrails import TerraformGuardrails
 
@@ -30,3 +32,97 @@ class AzurePoliciesTestCase(unittest.TestCase):
         print(json.dumps(policy_ids, indent=4))
         self.assertTrue(len(policy_names) == len(policy_ids))
 
+
+    def test_policy_id_pairs_computed_once(self):
+        calls = []
+        get_all_policy_ids_sorted_by_service = self.terraform.azure_policies.get_all_policy_ids_sorted_by_service
+
+        def counting_selection(**kwargs):
+            calls.append(kwargs)
+            return get_all_policy_ids_sorted_by_service(**kwargs)
+
+        self.terraform.azure_policies.get_all_policy_ids_sorted_by_service = counting_selection
+        policy_id_pairs = self.terraform.policy_id_pairs()
+        self.terraform.policy_names()
+        self.terraform.policy_ids()
+        self.terraform.green_policy_count()
+        self.assertIs(self.terraform.policy_id_pairs(), policy_id_pairs)
+        self.assertEqual(len(calls), 1)
+
+        # Changing the mode throws away the cached selection
+        self.terraform.enforcement_mode = False
+        self.terraform.policy_id_pairs()
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(calls[-1].get("enforce"))
+
+    def test_create_summary_files_in_background(self):
+        terraform = TerraformGuardrails(
+            service="all",
+            config=get_default_config(exclude_services=[]),
+            subscription="example",
+            management_group="",
+            parameters_config={},
+            no_params=False,
+            params_optional=True,
+            params_required=False,
+            category="Testing",
+            enforcement_mode=False,
+            verbosity=0
+        )
+        calls = []
+        summary_rows = terraform.azure_policies.summary_rows
+
+        def counting_summary_rows(**kwargs):
+            calls.append(kwargs)
+            return summary_rows(**kwargs)
+
+        terraform.azure_policies.summary_rows = counting_summary_rows
+        with tempfile.TemporaryDirectory() as directory:
+            summary_files = terraform.create_summary_files(directory=directory, background=True)
+            terraform.generate_terraform()
+            summary_files.result()
+            self.assertTrue(os.path.exists(os.path.join(directory, "PO-all-table.md")))
+            self.assertTrue(os.path.exists(os.path.join(directory, "PO-all-table.csv")))
+        # Both files are written from the same rows
+        self.assertEqual(len(calls), 1)
+
+    def test_create_terraform_file_streams_to_disk(self):
+        terraform = TerraformGuardrails(
+            service="all",
+            config=get_default_config(exclude_services=[]),
+            subscription="example",
+            management_group="",
+            parameters_config={},
+            no_params=False,
+            params_optional=True,
+            params_required=False,
+            category="Testing",
+            enforcement_mode=True,
+            verbosity=0
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, terraform.file_name)
+            with open(output_file, "w") as f:
+                f.write("previous contents")
+            terraform.create_terraform_file(output_file=output_file)
+            with open(output_file, "r") as f:
+                self.assertEqual(f.read(), terraform.generate_terraform())
+            # The temporary file was renamed into place
+            self.assertListEqual(os.listdir(directory), [terraform.file_name])
+
+    def test_create_terraform_file_keeps_previous_file_on_failure(self):
+        class FailingTemplate:
+            def generate(self):
+                yield "partial contents"
+                raise Exception("Rendering failed")
+
+        self.terraform.terraform_template = FailingTemplate
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, self.terraform.file_name)
+            with open(output_file, "w") as f:
+                f.write("previous contents")
+            with self.assertRaises(Exception):
+                self.terraform.create_terraform_file(output_file=output_file)
+            with open(output_file, "r") as f:
+                self.assertEqual(f.read(), "previous contents")
+            self.assertListEqual(os.listdir(directory), [self.terraform.file_name])
@@ -48,6 +48,11 @@ class TerraformTemplateWithParamsV5TestCase(unittest.TestCase):
         results = self.terraform_template_with_params.rendered()
         # print(results)
 
+    def test_template_contents_generated(self):
+        # Streaming the template gives the same output as rendering it in one go
+        results = "".join(self.terraform_template_with_params.generate())
+        self.assertEqual(results, self.terraform_template_with_params.rendered())
+
     def test_get_placeholder_value_given_type(self):
         results = get_placeholder_value_given_type("array")
         self.assertListEqual(results, [])
@@ -6,23 +6,98 @@
 import click
 import os
 import json
+import time
 from cloud_guardrails.shared import utils
-from cloud_guardrails.scrapers.parse_builtin_definitions import create_azure_builtin_definition
+from cloud_guardrails.scrapers.parse_builtin_definitions import build_azure_builtin_definition, read_manifest, \
+    write_manifest
+from cloud_guardrails.scrapers.policy_source import get_policy_source
+from cloud_guardrails.iam_definition.compact_catalog import COMPACT_IAM_DEFINITION_PATH, write_compact_catalog
+from cloud_guardrails.iam_definition.catalog_database import CATALOG_DATABASE_PATH, write_catalog_database
+from cloud_guardrails.iam_definition.compliance_index import get_compliance_index
 
 
 @click.command(
     short_help='Update the single file containing data on all the Azure Policy Definitions.'
 )
-def update_iam_definition():
-    results = create_azure_builtin_definition()
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=0),
+    default=1,
+    show_default=True,
+    help="Number of processes that parse the policy files. Use 0 for one process per CPU.",
+)
+@click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Parse every policy file, instead of only the ones that changed since the last update.",
+)
+@click.option(
+    "--git-repository",
+    type=click.Path(exists=True, file_okay=False),
+    required=False,
+    help="Read the policy files from the objects of this local clone of azure-policy, instead of the submodule.",
+)
+@click.option(
+    "--revision",
+    type=str,
+    default="HEAD",
+    show_default=True,
+    help="The revision of --git-repository to read.",
+)
+@click.option(
+    "--archive",
+    type=click.Path(exists=True, dir_okay=False),
+    required=False,
+    help="Read the policy files from this .tar.gz or .zip archive of azure-policy, instead of the submodule.",
+)
+def update_iam_definition(jobs: int, full: bool, git_repository: str, revision: str, archive: str):
+    timings = {}
     results_path = os.path.join(utils.DATA_FILE_DIRECTORY, "iam-definition.json")
+
+    start = time.perf_counter()
+    previous_results = None
+    previous_manifest = None if full else read_manifest(results_path)
+    if previous_manifest:
+        previous_results = utils.read_json_file(results_path)
+    else:
+        print("Parsing every policy file")
+    timings["read previous catalog"] = time.perf_counter() - start
+
+    with get_policy_source(git_repository=git_repository, revision=revision, archive=archive) as source:
+        print(f"Reading the policy files from: {source}")
+        results, manifest, changes = build_azure_builtin_definition(
+            jobs=jobs, timings=timings, previous_results=previous_results, previous_manifest=previous_manifest,
+            source=source
+        )
+
+    start = time.perf_counter()
     if os.path.exists(results_path):
         print("File already exists; removing")
         os.remove(results_path)
     with open(results_path, "w") as file:
         json.dump(results, file, indent=4)
+    write_manifest(manifest, results_path)
+    timings["write JSON"] = time.perf_counter() - start
     print(f"Wrote the new IAM definition to: {results_path}")
 
+    # The compact catalog is what the CLI reads. The JSON above is kept as an export and for incremental updates.
+    start = time.perf_counter()
+    write_compact_catalog(results, COMPACT_IAM_DEFINITION_PATH)
+    timings["write compact catalog"] = time.perf_counter() - start
+    print(f"Wrote the compact IAM definition to: {COMPACT_IAM_DEFINITION_PATH}")
+
+    start = time.perf_counter()
+    write_catalog_database(
+        results["service_definitions"], CATALOG_DATABASE_PATH, compliance_index=get_compliance_index()
+    )
+    timings["write catalog database"] = time.perf_counter() - start
+    print(f"Wrote the catalog database to: {CATALOG_DATABASE_PATH}")
+    print(", ".join(f"{count} {change}" for change, count in changes.items()) + " policy files")
+    for phase, seconds in timings.items():
+        print(f"\t{phase}: {seconds:.2f}s")
+
 
 if __name__ == '__main__':
     update_iam_definition()
@@ -0,0 +1,39 @@
+#! /usr/bin/env python
+"""
+Compare looking up every policy by display name with a linear scan of the catalog vs. the display name index.
+"""
+import time
+from cloud_guardrails.iam_definition.policy_catalog import PolicyCatalog
+
+
+def linear_scan(policy_definitions: dict, display_name: str) -> str:
+    # What AzurePolicies.get_policy_definition_by_display_name used to do
+    for policy_id, policy_details in policy_definitions.items():
+        if policy_details.get("display_name") == display_name:
+            return policy_id
+    return None
+
+
+def benchmark_display_name_lookup():
+    catalog = PolicyCatalog()
+    policy_definitions = catalog.policy_definitions
+    display_names = [policy_details.get("display_name") for policy_details in policy_definitions.values()]
+    print(f"Looking up {len(display_names)} display names")
+
+    start = time.perf_counter()
+    linear_results = [linear_scan(policy_definitions, display_name) for display_name in display_names]
+    linear_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed_results = [catalog.get_policy_id_by_display_name(display_name) for display_name in display_names]
+    indexed_seconds = time.perf_counter() - start
+
+    if linear_results != indexed_results:
+        raise Exception("The indexed lookup returned different policy IDs than the linear scan")
+    print(f"Linear scan:   {linear_seconds * 1000:.2f} ms")
+    print(f"Indexed:       {indexed_seconds * 1000:.2f} ms (includes building the index)")
+    print(f"Speedup:       {linear_seconds / max(indexed_seconds, 1e-9):.0f}x")
+
+
+if __name__ == '__main__':
+    benchmark_display_name_lookup()
@@ -0,0 +1,36 @@
+#! /usr/bin/env python
+"""
+Measure how long 'cloud-guardrails --help' spends importing modules, using python -X importtime.
+
+Exits with an error if the total is over the budget, in milliseconds.
+"""
+import sys
+import subprocess
+
+DEFAULT_BUDGET_MS = 250
+
+
+def benchmark_import_time(budget_ms: float = DEFAULT_BUDGET_MS):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "cloud_guardrails.bin.cli", "--help"],
+        capture_output=True, text=True, check=True
+    )
+    top_level_imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative_time, module_name = line[len("import time:"):].split("|")
+        # Nested imports are indented, and are already counted in the cumulative time of their parents
+        if not module_name.startswith("  "):
+            top_level_imports.append((int(cumulative_time) / 1000, module_name.strip()))
+    total = sum(cumulative for cumulative, module_name in top_level_imports)
+    print("Slowest top-level imports:")
+    for cumulative, module_name in sorted(top_level_imports, reverse=True)[:10]:
+        print(f"  {cumulative:8.2f} ms  {module_name}")
+    print(f"Total: {total:.2f} ms (budget: {budget_ms:.0f} ms)")
+    if total > budget_ms:
+        raise Exception(f"'cloud-guardrails --help' spent {total:.2f} ms importing modules, over the {budget_ms:.0f} ms budget")
+
+
+if __name__ == '__main__':
+    benchmark_import_time(budget_ms=float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS)
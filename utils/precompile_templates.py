@@ -0,0 +1,10 @@
+#! /usr/bin/env python
+"""
+Precompile the Jinja2 templates to Python modules, so they are imported instead of parsed when rendering.
+"""
+from cloud_guardrails.templates.registry import precompile_templates, COMPILED_TEMPLATES_DIRECTORY
+
+
+if __name__ == '__main__':
+    compiled = precompile_templates()
+    print(f"Precompiled {len(compiled)} templates to {COMPILED_TEMPLATES_DIRECTORY}: {', '.join(compiled)}")